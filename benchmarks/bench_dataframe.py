@@ -0,0 +1,99 @@
+################################################################################
+### bench_dataframe.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Benchmark for filling the read-mode dataframe. Compares the per-track .loc
+### assignments used previously with the column-wise build in
+### read.fill_tags_dataframe. Runs offline on synthetic records; no FLAC files
+### are needed.
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+
+import argparse
+import os
+import sys
+import time
+
+## Temporary fix while developing. Will be removed when the project is made into a package.
+# Add the src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import read
+
+################################################################################
+### Define functions
+################################################################################
+
+def make_records(size):
+    """
+    Create synthetic per-track records, as returned by read.get_track_tags.
+
+    Args:
+        size (int): Number of tracks.
+
+    Returns:
+        dict: Maps track paths to dicts of tags.
+    """
+    records = {}
+    for i in range(size):
+        track_path = f"/music/Composer/[1960] Album {i // 10} (Orchestra with Conductor)/{i % 10 + 1:02d} - Track.flac"
+        records[track_path] = {
+            'Album': f"Album {i // 10}", 'Year Recorded': '1960', 'Orchestra': 'Orchestra',
+            'Conductor': 'Conductor', 'DiscNumber': None, 'TrackNumber': f"{i % 10 + 1:02d}",
+            'Work': 'Symphony', 'Work Number': 'No 41', 'InitialKey': 'C', 'Catalog #': 'K 551',
+            'Opus': None, 'Opus Number': None, 'Epithet': 'Jupiter',
+            'Movement': 'I. Allegro vivace', 'Genre': 'Classical', 'Composer': 'Mozart'}
+    return records
+
+def fill_with_loc(tags_df, records):
+    """
+    Fill the dataframe with one scalar .loc assignment per track and column.
+
+    Args:
+        tags_df (pd.DataFrame): DataFrame with track paths as index and columns for tags.
+        records (dict): Maps track paths to dicts of tags.
+
+    Returns:
+        pd.DataFrame: Updated DataFrame.
+    """
+    for track_path in tags_df.index:
+        for column, value in records[track_path].items():
+            tags_df.loc[track_path, column] = value
+    return tags_df
+
+def time_fill(fill_function, records):
+    """
+    Time a fill function on a fresh dataframe.
+
+    Args:
+        fill_function (callable): Function taking (tags_df, records).
+        records (dict): Maps track paths to dicts of tags.
+
+    Returns:
+        float: Elapsed time in seconds.
+    """
+    tags_df = read.create_tags_dataframe(list(records))
+    start = time.perf_counter()
+    fill_function(tags_df, records)
+    return time.perf_counter() - start
+
+################################################################################
+### Define main function
+################################################################################
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark filling the read-mode dataframe.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                        help="Library sizes to benchmark (default: 10000 100000)")
+    args = parser.parse_args()
+
+    print(f"{'Tracks':>10} {'.loc (s)':>12} {'column-wise (s)':>16} {'speedup':>10}")
+    for size in args.sizes:
+        records = make_records(size)
+        loc_time = time_fill(fill_with_loc, records)
+        column_time = time_fill(read.fill_tags_dataframe, records)
+        print(f"{size:>10} {loc_time:>12.3f} {column_time:>16.3f} {loc_time / column_time:>9.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+################################################################################
+### bench_startup.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Benchmark for the startup time of tagger.py. Times `tagger.py --help` and a
+### run which fails argument validation, neither of which should wait for
+### pandas or mutagen to be imported. Each command is run in a fresh
+### interpreter, and the median wall-clock time is compared with the target.
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+################################################################################
+### Define constants
+################################################################################
+
+TAGGER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src', 'tagger.py'))
+
+COMMANDS = {
+    '--help': ['--help'],
+    'invalid arguments': ['read', '--dir', 'missing_directory', '--excel_out', 'tags.xlsx'],
+}
+
+################################################################################
+### Define functions
+################################################################################
+
+def time_command(command, repeat):
+    """
+    Time a command, running it in a fresh interpreter each time.
+
+    Args:
+        command (list): Command and arguments.
+        repeat (int): Number of runs.
+
+    Returns:
+        list: Elapsed time of each run in seconds.
+    """
+    times = []
+    # Run in an empty directory, so that a log file written by mistake does not end up in the repository
+    with tempfile.TemporaryDirectory() as run_dir:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=run_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            times.append(time.perf_counter() - start)
+    return times
+
+################################################################################
+### Define main function
+################################################################################
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup time of tagger.py.")
+    parser.add_argument('--repeat', type=int, default=10, help="Number of runs per command (default: 10)")
+    parser.add_argument('--target', type=float, default=150, help="Target time in ms (default: 150)")
+    args = parser.parse_args()
+
+    # The interpreter alone, for reference
+    baseline = statistics.median(time_command([sys.executable, '-c', 'pass'], args.repeat)) * 1000
+    print(f"{'Command':>20} {'median (ms)':>12} {'max (ms)':>10} {'target':>8}")
+    print(f"{'python -c pass':>20} {baseline:>12.0f}")
+    missed = False
+    for name, arguments in COMMANDS.items():
+        times = [elapsed * 1000 for elapsed in time_command([sys.executable, TAGGER] + arguments, args.repeat)]
+        median = statistics.median(times)
+        status = 'ok' if median < args.target else 'MISSED'
+        missed = missed or median >= args.target
+        print(f"{name:>20} {median:>12.0f} {max(times):>10.0f} {status:>8}")
+    sys.exit(1 if missed else 0)
+
+if __name__ == "__main__":
+    main()
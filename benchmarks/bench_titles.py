@@ -0,0 +1,121 @@
+################################################################################
+### bench_titles.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Benchmark for parsing title tags. Compares the step-by-step parse
+### (read.parse_title_stepwise) with the single-pass grammar in
+### read.parse_title_single_pass, falling back to the step-by-step parse as
+### read.parse_fields_from_title_tag does, and with the vectorized
+### read.parse_titles over a pandas Series. Runs offline on synthetic titles; no
+### FLAC files are needed.
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+
+import argparse
+import os
+import sys
+import time
+
+## Temporary fix while developing. Will be removed when the project is made into a package.
+# Add the src directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+import read
+
+################################################################################
+### Define constants
+################################################################################
+
+# Typical titles, in the hand-tagged format
+TITLES = [
+    "Symphony No 41 in C, 'Jupiter', K 551 - I. Allegro vivace",
+    "Symphony No 3 in E-flat, 'Eroica', Op 55 - II. Marcia funebre. Adagio assai",
+    "Concerto Grosso in G, Op 6 No 1, HWV 319 - I. A tempo giusto",
+    "String Quartet No 75 in G, Op 76 No 1, Hob.III:75 - IV. Finale. Allegro ma non troppo",
+    "Piano Sonata No 14 in C-sharp minor, 'Moonlight', Op 27 No 2 - III. Presto agitato",
+    "Cello Suite No 1 in G, BWV 1007 - I. Prelude",
+    "Symphony No 9 in C, 'Great', D 944 - I. Andante - Allegro ma non troppo",
+    "Mass in B minor, BWV 232 - I. Kyrie eleison",
+    "Requiem in D minor, K 626 - III. Sequentia. Dies irae",
+    "The Four Seasons - I. Allegro",
+]
+
+################################################################################
+### Define functions
+################################################################################
+
+def make_titles(size):
+    """
+    Create synthetic title tags, each one unique so that nothing is cached.
+
+    Args:
+        size (int): Number of titles.
+
+    Returns:
+        list: Title tags.
+    """
+    titles = []
+    for i in range(size):
+        title = TITLES[i % len(TITLES)]
+        # Vary the movement, keeping the layout of the title
+        titles.append(title + f" {i}")
+    return titles
+
+def parse_single_pass(title):
+    fields = read.parse_title_single_pass(title)
+    if fields is None:
+        fields = read.parse_title_stepwise(title)
+    return fields
+
+def time_parse(parse_function, titles):
+    """
+    Time a parse function over a list of titles.
+
+    Args:
+        parse_function (callable): Function taking a title tag.
+        titles (list): Title tags.
+
+    Returns:
+        float: Elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    for title in titles:
+        parse_function(title)
+    return time.perf_counter() - start
+
+################################################################################
+### Define main function
+################################################################################
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing title tags.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                        help="Number of titles to benchmark (default: 10000 100000)")
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    # Speedups are relative to the step-by-step parse
+    print(f"{'Titles':>10} {'stepwise (s)':>14} {'single pass (s)':>16} {'speedup':>8} {'vectorized (s)':>15} "
+          f"{'speedup':>8} {'matched':>8}")
+    for size in args.sizes:
+        titles = make_titles(size)
+        # The parsers must agree before their times are compared
+        expected = [read.parse_title_stepwise(title) for title in titles[:len(TITLES)]]
+        vectorized = read.parse_titles(pd.Series(titles[:len(TITLES)]))
+        if [parse_single_pass(title) for title in titles[:len(TITLES)]] != expected \
+                or list(vectorized.itertuples(index=False, name=None)) != expected:
+            sys.exit("Parsers disagree")
+        matched = sum(read.parse_title_single_pass(title) is not None for title in titles) / size
+        stepwise_time = time_parse(read.parse_title_stepwise, titles)
+        single_pass_time = time_parse(parse_single_pass, titles)
+        series = pd.Series(titles)
+        start = time.perf_counter()
+        read.parse_titles(series)
+        vectorized_time = time.perf_counter() - start
+        print(f"{size:>10} {stepwise_time:>14.3f} {single_pass_time:>16.3f} {stepwise_time / single_pass_time:>7.1f}x "
+              f"{vectorized_time:>15.3f} {stepwise_time / vectorized_time:>7.1f}x {matched:>8.0%}")
+
+if __name__ == "__main__":
+    main()
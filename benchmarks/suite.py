@@ -0,0 +1,498 @@
+################################################################################
+### suite.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Benchmark suite for the read, write, parse and utility pipelines. Each
+### benchmark is timed at several library sizes on synthetic data (see
+### synthetic_library.py), so the suite runs offline. Results are written to a
+### JSON file, and the compare command flags regressions against a stored
+### baseline:
+###   python benchmarks/suite.py run --output results.json
+###   python benchmarks/suite.py compare baseline.json results.json
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+
+import argparse
+import contextlib
+import datetime
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+## Temporary fix while developing. Will be removed when the project is made into a package.
+# Add the src directory to sys.path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'src'))
+import read
+from synthetic_library import ROMAN_NUMERALS, TEMPOS, generate_library, make_title, make_work
+
+################################################################################
+### Define constants
+################################################################################
+
+RESULTS_VERSION = 1
+
+# Files found next to the tracks of an album, for the scanners
+ALBUM_FILES = ['Album.log', 'Album.cue', 'Scans.pdf', 'cover.jpg', 'Thumbs.db']
+
+################################################################################
+### Define functions: setup
+################################################################################
+# Each setup function takes the library size and an empty working directory,
+# prepares the data, and returns the function to time. Setup is not timed, and
+# is run again before each repeat.
+
+def load_script(name):
+    """
+    Import a script from utils/. The scripts are loaded from their files, as src/utils.py
+    shadows the utils/ directory once src/ is on sys.path.
+
+    Args:
+        name (str): Name of the script, without the extension.
+
+    Returns:
+        module: The script.
+    """
+    spec = importlib.util.spec_from_file_location(f"utils_{name}", os.path.join(ROOT_DIR, 'utils', f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def make_titles(size):
+    """
+    Create title tags in the hand-tagged format, without writing any files.
+
+    Args:
+        size (int): Number of titles.
+
+    Returns:
+        list: Title tags.
+    """
+    rng = random.Random(0)
+    titles = []
+    while len(titles) < size:
+        work = make_work(rng)
+        for numeral in ROMAN_NUMERALS[:rng.randint(1, 4)]:
+            work['Movement'] = f"{numeral}. {rng.choice(TEMPOS)}"
+            titles.append(make_title(work))
+    return titles[:size]
+
+def make_library(size, work_dir):
+    """
+    Write a synthetic library, with the log, cue and other files found next to the tracks.
+
+    Args:
+        size (int): Number of tracks.
+        work_dir (str): Working directory; the library is written to work_dir/library.
+
+    Returns:
+        str: Directory of the library.
+    """
+    library_dir = os.path.join(work_dir, 'library')
+    library = generate_library(library_dir, size)
+    for album_dir in {os.path.dirname(track.path) for track in library}:
+        for name in ALBUM_FILES:
+            with open(os.path.join(album_dir, name), 'wb') as f:
+                f.write(b'x' * 100)
+    return library_dir
+
+def make_tags(size, work_dir):
+    """
+    Create the tags of a synthetic library, as returned by mutagen ({tag: [values]}).
+
+    Args:
+        size (int): Number of tracks.
+        work_dir (str): Working directory.
+
+    Returns:
+        dict: Maps track paths to tags.
+    """
+    tags = {}
+    for track in generate_library(os.path.join(work_dir, 'library'), size):
+        tags[track.path] = {}
+        for comment in track.comments:
+            key, value = comment.split('=', 1)
+            tags[track.path].setdefault(key.lower(), []).append(value)
+    return tags
+
+def setup_get_tags(size, work_dir):
+    library_dir = make_library(size, work_dir)
+    tags_df = read.get_tracks_create_dataframe(library_dir)
+    return lambda: read.get_tags(tags_df)
+
+def setup_update_tags(size, work_dir):
+    import write
+    library_dir = make_library(size, work_dir)
+    # As read back from Excel by tagger.py
+    tags_df = read.get_tags(read.get_tracks_create_dataframe(library_dir)).astype(object).fillna('')
+    return lambda: write.update_tags(tags_df)
+
+def setup_update_tags_parallel(workers, worker_type):
+    """Benchmark of write.update_tags with workers, each updating whole albums."""
+    def setup(size, work_dir):
+        import write
+        library_dir = make_library(size, work_dir)
+        tags_df = read.get_tags(read.get_tracks_create_dataframe(library_dir)).astype(object).fillna('')
+        return lambda: write.update_tags(tags_df, workers=workers, worker_type=worker_type)
+    return setup
+
+def setup_update_tags_unchanged(size, work_dir):
+    import write
+    library_dir = make_library(size, work_dir)
+    tags_df = read.get_tags(read.get_tracks_create_dataframe(library_dir)).astype(object).fillna('')
+    write.update_tags(tags_df)
+    # The same tags again, under the new file names: every file is skipped
+    tags_df.index = [write.get_new_file_path(file_path, row, write.build_title(row))
+                     for file_path, row in tags_df.iterrows()]
+    return lambda: write.update_tags(tags_df, skip_unchanged=True)
+
+def setup_parse_step(function):
+    """
+    Create the setup function of one step of the title parse. Each step gets the strings
+    it gets in parse_fields_from_title_tag, i.e., the output of the previous steps.
+
+    Args:
+        function (callable): One of the parse_*_from_title functions of read.py.
+
+    Returns:
+        callable: Setup function.
+    """
+    steps = [read.parse_movement_from_title, read.parse_epithet_from_title,
+             read.parse_opus_opusnumber_worknumber_from_title, read.parse_catalog_from_title,
+             read.parse_initialkey_from_title]
+
+    def setup(size, work_dir):
+        inputs = make_titles(size)
+        for step in steps[:steps.index(function)]:
+            inputs = [step(work)[0] for work in inputs]
+        return lambda: [function(work) for work in inputs]
+    return setup
+
+def setup_parse_title_single_pass(size, work_dir):
+    titles = make_titles(size)
+    return lambda: [read.parse_title_single_pass(title) for title in titles]
+
+def setup_parse_titles(size, work_dir):
+    import pandas as pd
+    titles = pd.Series(make_titles(size))
+    return lambda: read.parse_titles(titles)
+
+def make_records(size):
+    """
+    Create (track_path, tags) records, as yielded by read.iter_tags.
+
+    Args:
+        size (int): Number of tracks.
+
+    Returns:
+        list: (track_path, tags) tuples.
+    """
+    return [(f"/music/Composer/Album {i // 10}/{i % 10 + 1:02d} - Track.flac",
+             {column: f"{column} {i}" for column in read.TAG_COLUMNS}) for i in range(size)]
+
+def setup_write_excel(size, work_dir):
+    import excel
+    records = make_records(size)
+    return lambda: excel.write_excel(records, os.path.join(work_dir, 'tags.xlsx'), read.TAG_COLUMNS)
+
+def setup_excel_reader(size, work_dir):
+    import excel
+    path = os.path.join(work_dir, 'tags.xlsx')
+    excel.write_excel(make_records(size), path, read.TAG_COLUMNS)
+
+    def run():
+        with excel.ExcelReader(path) as reader:
+            for _ in reader:
+                pass
+    return run
+
+def setup_table_reader(ext):
+    """
+    Build the setup of a benchmark reading back a tag table written by read mode.
+
+    Args:
+        ext (str): Table format, e.g., '.parquet'.
+
+    Returns:
+        function: Setup function.
+    """
+    def setup(size, work_dir):
+        import tables
+        path = os.path.join(work_dir, f'tags{ext}')
+        tables.write_table(make_records(size), path, read.TAG_COLUMNS)
+
+        def run():
+            with tables.open_table_reader(path) as reader:
+                for _ in reader:
+                    pass
+        return run
+    return setup
+
+def setup_save_original_tags(size, work_dir):
+    from predict import DataManager
+    tags = make_tags(size, work_dir)
+    data_mgr = DataManager(os.path.join(work_dir, 'tags.db'))
+
+    def run():
+        for track_path, track_tags in tags.items():
+            data_mgr.save_original_tags(track_path, track_tags)
+        data_mgr.close()
+    return run
+
+def setup_save_updated_tags(size, work_dir):
+    from predict import DataManager
+    tags = make_tags(size, work_dir)
+    data_mgr = DataManager(os.path.join(work_dir, 'tags.db'))
+
+    def run():
+        for track_path, track_tags in tags.items():
+            data_mgr.save_updated_tags(track_path, track_tags)
+        data_mgr.close()
+    return run
+
+def setup_sqlite_to_csv(size, work_dir):
+    from predict import DataManager
+    import utils
+    db_file = os.path.join(work_dir, 'tags.db')
+    data_mgr = DataManager(db_file)
+    for track_path, track_tags in make_tags(size, work_dir).items():
+        data_mgr.save_original_tags(track_path, track_tags)
+        # sqlite_to_csv expects the tags written by write.py for each column
+        updated_tags = dict(track_tags)
+        for column in read.TAG_COLUMNS + ['TrackTitle']:
+            updated_tags.setdefault(column.lower(), [column])
+        data_mgr.save_updated_tags(track_path, updated_tags)
+    data_mgr.close()
+    return lambda: utils.sqlite_to_csv(db_file, os.path.join(work_dir, 'tags.csv'))
+
+def setup_scan_files(size, work_dir):
+    import scan
+    library_dir = make_library(size, work_dir)
+    return lambda: scan.scan_files(library_dir, {'.flac'})
+
+def setup_find_files_with_empty_tags(size, work_dir):
+    script = load_script('find_remove_empty_tags')
+    library_dir = make_library(size, work_dir)
+    # The script writes its reports to the working directory
+    return lambda: script.find_files_with_empty_tags(library_dir)
+
+def setup_cleanup(size, work_dir):
+    script = load_script('cleanup')
+    library_dir = make_library(size, work_dir)
+
+    def run():
+        script.get_files_to_process(library_dir)
+        script.generate_missing_files_report(library_dir, work_dir)
+    return run
+
+def setup_convert_get_flac_files(size, work_dir):
+    script = load_script('convert')
+    library_dir = make_library(size, work_dir)
+    return lambda: script.get_flac_files(library_dir)
+
+def setup_structure_collect_files(size, work_dir):
+    script = load_script('structure')
+    library_dir = make_library(size, work_dir)
+    return lambda: script.collect_files(library_dir, {'.jpg', '.pdf'})
+
+# Benchmark name: setup function. Sizes are numbers of tracks, or of titles for the parse benchmarks
+BENCHMARKS = {
+    'read.get_tags': setup_get_tags,
+    'read.parse_movement_from_title': setup_parse_step(read.parse_movement_from_title),
+    'read.parse_epithet_from_title': setup_parse_step(read.parse_epithet_from_title),
+    'read.parse_opus_opusnumber_worknumber_from_title':
+        setup_parse_step(read.parse_opus_opusnumber_worknumber_from_title),
+    'read.parse_catalog_from_title': setup_parse_step(read.parse_catalog_from_title),
+    'read.parse_initialkey_from_title': setup_parse_step(read.parse_initialkey_from_title),
+    'read.parse_title_single_pass': setup_parse_title_single_pass,
+    'read.parse_titles': setup_parse_titles,
+    'write.update_tags': setup_update_tags,
+    'write.update_tags(skip_unchanged)': setup_update_tags_unchanged,
+    'write.update_tags(workers=4, thread)': setup_update_tags_parallel(4, 'thread'),
+    'write.update_tags(workers=4, process)': setup_update_tags_parallel(4, 'process'),
+    'excel.write_excel': setup_write_excel,
+    'excel.ExcelReader': setup_excel_reader,
+    'tables.open_table_reader(.csv)': setup_table_reader('.csv'),
+    'tables.open_table_reader(.parquet)': setup_table_reader('.parquet'),
+    'tables.open_table_reader(.feather)': setup_table_reader('.feather'),
+    'DataManager.save_original_tags': setup_save_original_tags,
+    'DataManager.save_updated_tags': setup_save_updated_tags,
+    'utils.sqlite_to_csv': setup_sqlite_to_csv,
+    'scan.scan_files': setup_scan_files,
+    'utils/find_remove_empty_tags.find_files_with_empty_tags': setup_find_files_with_empty_tags,
+    'utils/cleanup.get_files_to_process+generate_missing_files_report': setup_cleanup,
+    'utils/convert.get_flac_files': setup_convert_get_flac_files,
+    'utils/structure.collect_files': setup_structure_collect_files,
+}
+
+################################################################################
+### Define functions: run and compare
+################################################################################
+
+def time_benchmark(setup, size, repeat):
+    """
+    Time a benchmark, running its setup in a fresh working directory before each repeat.
+
+    Args:
+        setup (callable): Setup function, taking (size, work_dir) and returning the function to time.
+        size (int): Library size.
+        repeat (int): Number of runs.
+
+    Returns:
+        list: Elapsed time of each run in seconds.
+    """
+    times = []
+    cwd = os.getcwd()
+    for _ in range(repeat):
+        work_dir = tempfile.mkdtemp(prefix='bench_')
+        try:
+            # Keep progress bars, status lines and report files out of the way
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                os.chdir(work_dir)
+                run = setup(size, work_dir)
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return times
+
+def get_commit():
+    """Get the current git commit, or None outside of a git repository"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(names, sizes, repeat):
+    """
+    Run benchmarks at each size.
+
+    Args:
+        names (list): Names of the benchmarks to run, from BENCHMARKS.
+        sizes (list): Library sizes.
+        repeat (int): Number of runs of each benchmark at each size.
+
+    Returns:
+        dict: Results, in the format written to JSON.
+    """
+    results = []
+    print(f"{'Benchmark':<66} {'Size':>8} {'median (s)':>11} {'us/item':>9}")
+    for name in names:
+        for size in sizes:
+            try:
+                times = time_benchmark(BENCHMARKS[name], size, repeat)
+            # Scripts with optional dependencies which are not installed are skipped
+            except ImportError as e:
+                print(f"{name:<66} {size:>8} {'skipped':>11} ({e})")
+                results.append({'name': name, 'size': size, 'skipped': str(e)})
+                continue
+            median = statistics.median(times)
+            print(f"{name:<66} {size:>8} {median:>11.4f} {median / size * 1e6:>9.1f}")
+            results.append({'name': name, 'size': size, 'times': times, 'median': median, 'min': min(times)})
+    return {'version': RESULTS_VERSION, 'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': get_commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+            'repeat': repeat, 'results': results}
+
+def compare_results(baseline, current, threshold, min_time):
+    """
+    Compare two sets of results.
+
+    Args:
+        baseline (dict): Results of the baseline run.
+        current (dict): Results of the current run.
+        threshold (float): Relative slowdown of the median which counts as a regression (e.g., 0.2 for 20%).
+        min_time (float): Benchmarks whose baseline and current medians are both below this
+            time, in seconds, are not flagged, as their timings are mostly noise.
+
+    Returns:
+        list: (name, size) of the benchmarks which regressed.
+    """
+    baseline_results = {(result['name'], result['size']): result for result in baseline['results']
+                        if 'median' in result}
+    regressions = []
+    print(f"{'Benchmark':<66} {'Size':>8} {'baseline (s)':>13} {'current (s)':>12} {'change':>8}")
+    for result in current['results']:
+        key = (result['name'], result['size'])
+        if 'median' not in result or key not in baseline_results:
+            continue
+        before = baseline_results[key]['median']
+        after = result['median']
+        change = after / before - 1 if before > 0 else 0
+        status = ''
+        if max(before, after) >= min_time:
+            if change > threshold:
+                status = 'REGRESSION'
+                regressions.append(key)
+            elif change < -threshold:
+                status = 'faster'
+        print(f"{key[0]:<66} {key[1]:>8} {before:>13.4f} {after:>12.4f} {change:>+8.0%} {status}")
+    missing = set(baseline_results) - {(result['name'], result['size']) for result in current['results']}
+    for name, size in sorted(missing):
+        print(f"{name:<66} {size:>8} not in the current results")
+    return regressions
+
+################################################################################
+### Define main function
+################################################################################
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite for the read, write, parse and utility pipelines.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help="Run the benchmarks and write the results to JSON")
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000],
+                            help="Library sizes, in tracks or titles (default: 100 1000)")
+    run_parser.add_argument('--repeat', type=int, default=3, help="Number of runs per benchmark and size (default: 3)")
+    run_parser.add_argument('--filter', '-k', nargs='+',
+                            help="Only run the benchmarks whose names contain one of these strings")
+    run_parser.add_argument('--output', '-o', default='benchmark_results.json',
+                            help="JSON file for the results (default: benchmark_results.json)")
+    run_parser.add_argument('--list', action='store_true', help="List the benchmarks and exit")
+    compare_parser = subparsers.add_parser('compare', help="Compare results with a baseline")
+    compare_parser.add_argument('baseline', help="JSON file with the baseline results")
+    compare_parser.add_argument('current', help="JSON file with the current results")
+    compare_parser.add_argument('--threshold', type=float, default=0.2,
+                                help="Slowdown of the median which counts as a regression (default: 0.2, i.e., 20%%)")
+    compare_parser.add_argument('--min_time', type=float, default=0.001,
+                                help="Do not flag benchmarks faster than this, in seconds (default: 0.001)")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        names = [name for name in BENCHMARKS if not args.filter or any(part in name for part in args.filter)]
+        if args.list:
+            print('\n'.join(names))
+            return
+        # Import the modules which read.py and utils.py import lazily, so the first benchmark does not pay for them
+        import mutagen.flac
+        import pandas
+        import tqdm
+        results = run_suite(names, args.sizes, args.repeat)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare_results(baseline, current, args.threshold, args.min_time)
+        if regressions:
+            print(f"{len(regressions)} regressions above {args.threshold:.0%}")
+            sys.exit(1)
+        print("No regressions")
+
+if __name__ == "__main__":
+    main()
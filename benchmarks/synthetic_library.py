@@ -0,0 +1,445 @@
+################################################################################
+### synthetic_library.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Generator of synthetic FLAC libraries for scale testing. Writes small but
+### valid FLAC files (silent audio, constant subframes) with Vorbis comments in
+### the hand-tagged format, laid out as
+### Composer/[YEAR] Album (Orchestra, Conductor)/Disc N/NN - Title.flac
+### The size of the library, the mix of tags and the share of album folders
+### which do not follow the naming convention can be set, and the output is the
+### same for the same seed. Used by the benchmarks and by the
+### synthetic_library fixture in tests/conftest.py.
+### This module only uses the standard library, so it can be imported by the
+### tests and benchmarks without changing sys.path.
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+
+import argparse
+import collections
+import hashlib
+import os
+import random
+import re
+import struct
+import time
+
+################################################################################
+### Define constants
+################################################################################
+
+COMPOSERS = ['Bach', 'Beethoven', 'Brahms', 'Dvorak', 'Handel', 'Haydn', 'Mendelssohn', 'Mozart',
+             'Schubert', 'Schumann', 'Tchaikovsky', 'Vivaldi']
+# Orchestras have more words than conductors, so "Orchestra, Conductor" is not read the other way round
+ORCHESTRAS = ['Berlin Philharmonic Orchestra', 'Columbia Symphony Orchestra', 'London Symphony Orchestra',
+              'Academy of Ancient Music', 'Concentus Musicus Wien Ensemble', 'English Baroque Soloists Ensemble',
+              'Orchestra of the Age of Enlightenment', 'Vienna Philharmonic Orchestra']
+CONDUCTORS = ['Karajan', 'Bruno Walter', 'Harnoncourt', 'Gardiner', 'Abbado', 'Hogwood', 'Rattle', 'Pinnock']
+ALBUMS = ['Symphonies', 'Concertos', 'Sonatas', 'Quartets', 'Serenades', 'Overtures', 'Sacred Works',
+          'Orchestral Suites', 'Chamber Music', 'Late Works']
+WORKS = ['Symphony', 'Piano Concerto', 'Violin Concerto', 'Violin Sonata', 'String Quartet', 'Piano Trio',
+         'Cello Suite', 'Concerto Grosso', 'Serenade', 'Divertimento', 'Mass', 'Overture']
+# Keys which the title parser returns as written
+KEYS = ['C', 'D', 'F', 'G', 'A', 'E-flat', 'B-flat', 'F-sharp', 'C minor', 'D minor', 'G minor', 'A minor']
+CATALOGS = ['K {}', 'BWV {}', 'Hob.I:{}', 'D {}', 'HWV {}', 'RV {}']
+EPITHETS = ['Jupiter', 'Eroica', 'Pastoral', 'Tragic', 'Surprise', 'Spring', 'Emperor', 'Unfinished']
+TEMPOS = ['Allegro', 'Allegro con brio', 'Andante', 'Andante cantabile', 'Adagio', 'Menuetto', 'Presto',
+          'Largo', 'Rondo. Allegro', 'Finale. Allegro vivace']
+PLAIN_TITLES = ['Clair de lune', 'The Lark Ascending', 'Adagio for Strings', 'Air on the G String',
+                'Ave Maria', 'Fantasia on a Theme', 'Pavane', 'Serenade for Strings']
+ROMAN_NUMERALS = ['I', 'II', 'III', 'IV', 'V', 'VI']
+EXTRA_TAGS = ['ENCODER=reference libFLAC 1.4.3', 'COMMENT=EAC extraction', 'REPLAYGAIN_TRACK_GAIN=-6.50 dB',
+              'REPLAYGAIN_ALBUM_GAIN=-7.10 dB', 'ISRC=USSM19900001', 'LABEL=Sony Classical', 'COUNTRY=US']
+VENDOR = 'reference libFLAC 1.4.3 20230623'
+
+# Fields of the title tag, with the Vorbis comments write.py stores them in
+FIELD_TAGS = {'Work': 'WORK', 'Work Number': 'WORK NUMBER', 'InitialKey': 'INITIALKEY', 'Catalog #': 'CATALOG #',
+              'Opus': 'OPUS', 'Opus Number': 'OPUS NUMBER', 'Epithet': 'EPITHET', 'Movement': 'MOVEMENT'}
+
+BLOCK_SIZE = 4096
+# Sample rates with their own code in the frame header; others are taken from STREAMINFO (code 0)
+SAMPLE_RATE_CODES = {88200: 0b0001, 176400: 0b0010, 192000: 0b0011, 8000: 0b0100, 16000: 0b0101, 22050: 0b0110,
+                     24000: 0b0111, 32000: 0b1000, 44100: 0b1001, 48000: 0b1010, 96000: 0b1011}
+SAMPLE_SIZE_CODES = {8: 0b001, 12: 0b010, 16: 0b100, 20: 0b101, 24: 0b110}
+
+################################################################################
+### Define classes
+################################################################################
+
+# path: full path of the FLAC file
+# comments: Vorbis comments written to the file, as 'KEY=value' strings
+# expected: tags which read.get_track_tags should return, keyed by the dataframe column names
+SyntheticTrack = collections.namedtuple('SyntheticTrack', ['path', 'comments', 'expected'])
+
+################################################################################
+### Define functions: FLAC encoding
+################################################################################
+
+def crc8(data):
+    """CRC-8 of a frame header (polynomial x^8 + x^2 + x + 1)"""
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+def crc16(data):
+    """CRC-16 of a frame (polynomial x^16 + x^15 + x^2 + 1)"""
+    crc = 0
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005) & 0xFFFF if crc & 0x8000 else (crc << 1) & 0xFFFF
+    return crc
+
+def encode_frame_number(number):
+    """Encode a frame number in the UTF-8-like coding of FLAC frame headers"""
+    if number < 0x80:
+        return bytes([number])
+    length = 2
+    while number >= 1 << (5 * length + 1):
+        length += 1
+    data = []
+    for _ in range(length - 1):
+        data.append(0x80 | (number & 0x3F))
+        number >>= 6
+    first = ((0xFF << (8 - length)) & 0xFF) | number
+    return bytes([first] + data[::-1])
+
+def make_silent_frames(total_samples, sample_rate, channels, bits_per_sample):
+    """
+    Encode silent audio as FLAC frames, with one constant subframe per channel.
+
+    Args:
+        total_samples (int): Number of samples per channel.
+        sample_rate (int): Sample rate in Hz.
+        channels (int): Number of channels, 1 to 8.
+        bits_per_sample (int): 8, 16 or 24.
+
+    Returns:
+        bytes: The frames.
+    """
+    frames = []
+    sample_bytes = bits_per_sample // 8
+    for number, start in enumerate(range(0, total_samples, BLOCK_SIZE)):
+        block_size = min(BLOCK_SIZE, total_samples - start)
+        # Block size is given as a 16-bit value after the frame number (code 0b0111)
+        header = bytes([0xFF, 0xF8, (0b0111 << 4) | SAMPLE_RATE_CODES.get(sample_rate, 0),
+                        ((channels - 1) << 4) | (SAMPLE_SIZE_CODES[bits_per_sample] << 1)])
+        header += encode_frame_number(number) + struct.pack('>H', block_size - 1)
+        header += bytes([crc8(header)])
+        # Constant subframe: header byte 0, then the sample value
+        frame = header + (bytes(1) + bytes(sample_bytes)) * channels
+        frames.append(frame + struct.pack('>H', crc16(frame)))
+    return b''.join(frames)
+
+def make_block(block_type, data, last=False):
+    """Build a metadata block: 1 byte flag/type, 3 bytes length, body"""
+    return bytes([block_type | (0x80 if last else 0)]) + len(data).to_bytes(3, 'big') + data
+
+def make_streaminfo(total_samples, sample_rate, channels, bits_per_sample):
+    """Build the STREAMINFO block, including the MD5 of the (silent) audio"""
+    md5 = hashlib.md5(bytes(total_samples * channels * (bits_per_sample // 8))).digest()
+    packed = (sample_rate << 44) | ((channels - 1) << 41) | ((bits_per_sample - 1) << 36) | total_samples
+    # Minimum and maximum frame sizes of 0 mean unknown
+    data = struct.pack('>HH', BLOCK_SIZE, BLOCK_SIZE) + bytes(6) + packed.to_bytes(8, 'big') + md5
+    return make_block(0, data)
+
+def make_vorbis_comment(comments):
+    """Build the VORBIS_COMMENT block"""
+    data = struct.pack('<I', len(VENDOR)) + VENDOR.encode() + struct.pack('<I', len(comments))
+    for comment in comments:
+        encoded = comment.encode('utf-8')
+        data += struct.pack('<I', len(encoded)) + encoded
+    return make_block(4, data)
+
+def make_picture(picture_size):
+    """Build a PICTURE block holding a front cover of picture_size bytes"""
+    mime = b'image/jpeg'
+    data = struct.pack('>II', 3, len(mime)) + mime + struct.pack('>IIIIII', 0, 500, 500, 24, 0, picture_size)
+    return make_block(6, data + b'\xff\xd8' + bytes(max(picture_size - 2, 0)))
+
+def make_flac_file(comments, audio, picture_size=0, padding=1024):
+    """
+    Assemble a FLAC file.
+
+    Args:
+        comments (list): Vorbis comments, as 'KEY=value' strings.
+        audio (tuple): (streaminfo, frames), as built by make_streaminfo and make_silent_frames.
+        picture_size (int): Size of the front cover in bytes, or 0 for no picture.
+        padding (int): Size of the PADDING block in bytes.
+
+    Returns:
+        bytes: Contents of the file.
+    """
+    streaminfo, frames = audio
+    blocks = [streaminfo, make_vorbis_comment(comments)]
+    if picture_size:
+        blocks.append(make_picture(picture_size))
+    blocks.append(make_block(1, bytes(padding), last=True))
+    return b'fLaC' + b''.join(blocks) + frames
+
+################################################################################
+### Define functions: library layout and tags
+################################################################################
+
+def make_work(rng):
+    """
+    Pick the fields of a work in the hand-tagged format.
+
+    Only layouts which the title parser returns as written are used, so that the
+    fields can be compared with what read.py extracts.
+
+    Args:
+        rng (random.Random): Random number generator.
+
+    Returns:
+        dict: Fields of the work, keyed by the dataframe column names.
+    """
+    work = {column: None for column in FIELD_TAGS}
+    work['Work'] = rng.choice(WORKS)
+    if rng.random() < 0.7:
+        work['Work Number'] = f"No {rng.randint(1, 104)}"
+    if rng.random() < 0.7:
+        work['InitialKey'] = rng.choice(KEYS)
+    if rng.random() < 0.5:
+        work['Opus'] = f"Op {rng.randint(1, 135)}"
+        if rng.random() < 0.3:
+            work['Opus Number'] = f"No {rng.randint(1, 6)}"
+    if rng.random() < 0.6 or work['Opus'] is None:
+        work['Catalog #'] = rng.choice(CATALOGS).format(rng.randint(1, 1100))
+    # The parser drops a major key followed by a work number and an opus, unless a catalog # follows
+    if work['Catalog #'] is None and work['Work Number'] and work['InitialKey'] and len(work['InitialKey']) == 1:
+        work['InitialKey'] = None
+    if rng.random() < 0.15:
+        work['Epithet'] = rng.choice(EPITHETS)
+    return work
+
+def make_title(work):
+    """
+    Build the title tag of a track, in the hand-tagged format:
+    Work No N in Key, 'Epithet', Op N No N, Catalog # - I. Movement
+
+    Args:
+        work (dict): Fields of the work and movement.
+
+    Returns:
+        str: Title tag.
+    """
+    title = work['Work']
+    if work['Work Number']:
+        title += f" {work['Work Number']}"
+    if work['InitialKey']:
+        title += f" in {work['InitialKey']}"
+    if work['Epithet']:
+        title += f", '{work['Epithet']}'"
+    if work['Opus']:
+        title += f", {work['Opus']}"
+        if work['Opus Number']:
+            title += f" {work['Opus Number']}"
+    if work['Catalog #']:
+        title += f", {work['Catalog #']}"
+    if work['Movement']:
+        title += f" - {work['Movement']}"
+    return title
+
+def make_track(rng, album, track_number, work, options):
+    """
+    Build the Vorbis comments of a track, and the tags read.py should extract from them.
+
+    Args:
+        rng (random.Random): Random number generator.
+        album (dict): Album fields: Composer, Album, Year Recorded, Orchestra, Conductor,
+            DiscNumber, and Conforming (whether the album folder follows the convention).
+        track_number (int): Track number on the disc.
+        work (dict): Fields of the work and movement.
+        options (dict): Options of generate_library.
+
+    Returns:
+        tuple: (comments, expected, title), where title is the title tag or None.
+    """
+    comments = [f"TRACKNUMBER={track_number:02d}", f"COMPOSER={album['Composer']}", "GENRE=Classical",
+                f"ALBUM={album['Album']}", f"YEAR={album['Year Recorded']}", f"DATE={album['Year Recorded']}",
+                f"ARTIST={album['Orchestra']}"]
+    if album['Orchestra']:
+        comments.append(f"ORCHESTRA={album['Orchestra']}")
+    if album['Conductor']:
+        comments.append(f"CONDUCTOR={album['Conductor']}")
+    comments.extend(rng.sample(EXTRA_TAGS, min(options['extra_tags'], len(EXTRA_TAGS))))
+
+    expected = {column: album[column] for column in ['Album', 'Year Recorded', 'Orchestra', 'Conductor',
+                                                    'DiscNumber']}
+    expected['TrackNumber'] = f"{track_number:02d}"
+
+    draw = rng.random()
+    if draw < options['missing_title_share']:
+        # No title tag: the fields are read from their own tags, except the work, which is read from the title
+        title = None
+        for column, tag in FIELD_TAGS.items():
+            if work[column]:
+                comments.append(f"{tag}={work[column]}")
+        fields = dict(work, Work=None)
+    elif draw < options['missing_title_share'] + options['plain_title_share']:
+        # A title outside the hand-tagged format is kept as the work
+        title = rng.choice(PLAIN_TITLES)
+        comments.append(f"TITLE={title}")
+        fields = {column: None for column in FIELD_TAGS}
+        fields['Work'] = title
+    else:
+        title = make_title(work)
+        comments.append(f"TITLE={title}")
+        # As stored by write.py, alongside the title
+        if options['field_tags']:
+            comments.extend(f"{tag}={work[column]}" for column, tag in FIELD_TAGS.items() if work[column])
+        fields = dict(work)
+    expected.update(fields)
+    expected['Genre'] = 'Classical'
+    expected['Composer'] = album['Composer']
+    return comments, expected, title
+
+def make_album(rng, composer, options):
+    """
+    Pick the fields and the folder name of an album.
+
+    Args:
+        rng (random.Random): Random number generator.
+        composer (str): Composer of the album.
+        options (dict): Options of generate_library.
+
+    Returns:
+        tuple: (album, folder), where album is a dict of album fields and folder is the folder name.
+    """
+    year = str(rng.randint(1950, 2020))
+    name = f"{rng.choice(ALBUMS)} {rng.randint(1, 99)}"
+    orchestra = rng.choice(ORCHESTRAS)
+    conductor = rng.choice(CONDUCTORS) if rng.random() < 0.9 else None
+    album = {'Composer': composer, 'Album': name, 'Year Recorded': year, 'Orchestra': orchestra,
+             'Conductor': conductor, 'Conforming': rng.random() >= options['nonconforming_share']}
+    if not album['Conforming']:
+        # Album fields are then read from the file tags
+        folder = f"{composer} - {name} - {orchestra}"
+    elif conductor is None:
+        folder = f"[{year}] {name} ({orchestra})"
+    elif rng.random() < 0.5:
+        folder = f"[{year}] {name} ({orchestra}, {conductor})"
+    else:
+        folder = f"[{year}] {name} ({orchestra} with {conductor})"
+    return album, folder
+
+def generate_library(root, tracks=1000, seed=0, tracks_per_disc=(4, 12), multi_disc_share=0.2,
+                     nonconforming_share=0.05, missing_title_share=0.05, plain_title_share=0.05,
+                     field_tags=True, extra_tags=3, duration=0.1, sample_rate=44100, channels=2,
+                     bits_per_sample=16, picture_size=0, padding=1024):
+    """
+    Write a synthetic library of FLAC files.
+
+    Args:
+        root (str): Directory to write to. Created if needed.
+        tracks (int): Number of tracks.
+        seed (int): Seed of the random number generator. The same seed gives the same library.
+        tracks_per_disc (tuple): (minimum, maximum) number of tracks per disc.
+        multi_disc_share (float): Share of albums with more than one disc, in Disc N folders.
+        nonconforming_share (float): Share of album folders not following the
+            '[YEAR] Album (Orchestra, Conductor)' convention.
+        missing_title_share (float): Share of tracks without a title tag, whose fields are in separate tags.
+        plain_title_share (float): Share of tracks whose title is not in the hand-tagged format.
+        field_tags (bool): Also store the fields of the title in separate tags, as write.py does.
+        extra_tags (int): Number of unrelated tags per track (e.g., ENCODER, REPLAYGAIN_TRACK_GAIN).
+        duration (float): Length of the silent audio in seconds.
+        sample_rate (int): Sample rate in Hz.
+        channels (int): Number of channels.
+        bits_per_sample (int): 8, 16 or 24.
+        picture_size (int): Size of an embedded front cover in bytes, or 0 for none.
+        padding (int): Size of the PADDING block in bytes.
+
+    Returns:
+        list: SyntheticTrack for each file, sorted by path.
+    """
+    if bits_per_sample not in (8, 16, 24):
+        raise ValueError("Invalid bits per sample. Choose 8, 16 or 24.")
+    options = {'nonconforming_share': nonconforming_share, 'missing_title_share': missing_title_share,
+               'plain_title_share': plain_title_share, 'field_tags': field_tags, 'extra_tags': extra_tags}
+    rng = random.Random(seed)
+    # Every file has the same audio
+    total_samples = max(int(duration * sample_rate), 1)
+    audio = (make_streaminfo(total_samples, sample_rate, channels, bits_per_sample),
+             make_silent_frames(total_samples, sample_rate, channels, bits_per_sample))
+
+    library = []
+    folders = set()
+    while len(library) < tracks:
+        composer = rng.choice(COMPOSERS)
+        album, folder = make_album(rng, composer, options)
+        # Album names are drawn at random, so skip the rare repeat
+        if (composer, folder) in folders:
+            continue
+        folders.add((composer, folder))
+        discs = rng.randint(2, 4) if rng.random() < multi_disc_share else 1
+        for disc in range(1, discs + 1):
+            disc_dir = os.path.join(root, composer, folder)
+            album['DiscNumber'] = None
+            if discs > 1:
+                disc_dir = os.path.join(disc_dir, f"Disc {disc}")
+                album['DiscNumber'] = str(disc)
+            os.makedirs(disc_dir, exist_ok=True)
+            disc_tracks = min(rng.randint(*tracks_per_disc), tracks - len(library))
+            track_number = 1
+            while track_number <= disc_tracks:
+                # Consecutive tracks are the movements of a work
+                work = make_work(rng)
+                for movement in range(min(rng.randint(1, 4), disc_tracks - track_number + 1)):
+                    work['Movement'] = f"{ROMAN_NUMERALS[movement]}. {rng.choice(TEMPOS)}"
+                    comments, expected, title = make_track(rng, album, track_number, work, options)
+                    name = re.sub(r'[\\/:*?"<>|]', '_', title or work['Work'])
+                    path = os.path.join(disc_dir, f"{track_number:02d} - {name}.flac")
+                    with open(path, 'wb') as f:
+                        f.write(make_flac_file(comments, audio, picture_size, padding))
+                    library.append(SyntheticTrack(path, comments, expected))
+                    track_number += 1
+            if len(library) >= tracks:
+                break
+    return sorted(library, key=lambda track: track.path)
+
+################################################################################
+### Define main function
+################################################################################
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic library of FLAC files for scale testing.")
+    parser.add_argument('--dir', '-d', required=True, help="Directory to write the library to")
+    parser.add_argument('--tracks', type=int, default=1000, help="Number of tracks (default: 1000)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the random number generator (default: 0)")
+    parser.add_argument('--multi_disc_share', type=float, default=0.2,
+                        help="Share of albums with more than one disc (default: 0.2)")
+    parser.add_argument('--nonconforming_share', type=float, default=0.05,
+                        help="Share of album folders not following the naming convention (default: 0.05)")
+    parser.add_argument('--missing_title_share', type=float, default=0.05,
+                        help="Share of tracks without a title tag (default: 0.05)")
+    parser.add_argument('--plain_title_share', type=float, default=0.05,
+                        help="Share of tracks whose title is not in the hand-tagged format (default: 0.05)")
+    parser.add_argument('--no_field_tags', action='store_true',
+                        help="Do not store the fields of the title in separate tags")
+    parser.add_argument('--extra_tags', type=int, default=3, help="Number of unrelated tags per track (default: 3)")
+    parser.add_argument('--duration', type=float, default=0.1,
+                        help="Length of the silent audio in seconds (default: 0.1)")
+    parser.add_argument('--picture_size', type=int, default=0,
+                        help="Size of an embedded front cover in bytes (default: no picture)")
+    parser.add_argument('--padding', type=int, default=1024, help="Size of the padding block in bytes (default: 1024)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    library = generate_library(args.dir, args.tracks, args.seed, multi_disc_share=args.multi_disc_share,
+                               nonconforming_share=args.nonconforming_share,
+                               missing_title_share=args.missing_title_share,
+                               plain_title_share=args.plain_title_share, field_tags=not args.no_field_tags,
+                               extra_tags=args.extra_tags, duration=args.duration,
+                               picture_size=args.picture_size, padding=args.padding)
+    albums = {os.path.dirname(track.path) for track in library}
+    print(f"Wrote {len(library)} tracks in {len(albums)} folders to {args.dir} "
+          f"in {time.perf_counter() - start:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+################################################################################
+### excel.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Excel files read and written row by row, so that memory does not grow with
+### the size of the library. Rows are written with xlsxwriter in constant
+### memory mode, which flushes each row to a temporary file, and read with
+### openpyxl in read-only mode. The layout is the one of DataFrame.to_excel:
+### the track path in the first column, under an empty header cell.
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import profiling
+import stream
+
+################################################################################
+### Define constants
+################################################################################
+
+# Excel sheets hold 1,048,576 rows, one of which is the header
+EXCEL_MAX_ROWS = 1048575
+
+################################################################################
+### Define classes
+################################################################################
+
+class ExcelStreamWriter(stream.StreamWriter):
+    """
+    Write records to the first sheet of an Excel file, in constant memory.
+
+    All tags are written as text, so that values such as '=' or URLs are not turned into
+    formulas or links. Missing tags are left empty.
+    """
+
+    def __init__(self, path, columns, batch_size=1000):
+        super().__init__(path, columns, batch_size)
+        import xlsxwriter
+        self._workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        self._worksheet = self._workbook.add_worksheet()
+        # Same header style as DataFrame.to_excel
+        header_format = self._workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        for column_number, column in enumerate(self.columns, start=1):
+            self._worksheet.write_string(0, column_number, column, header_format)
+        self._row_number = 0
+
+    def _write_batch(self, batch):
+        if self._row_number + len(batch) > EXCEL_MAX_ROWS:
+            raise ValueError(f"More than {EXCEL_MAX_ROWS} rows do not fit in an Excel sheet.")
+        with profiling.stage('to_excel'):
+            for record in batch:
+                self._row_number += 1
+                for column_number, value in enumerate(record.values()):
+                    if value is not None and value != '':
+                        self._worksheet.write_string(self._row_number, column_number, str(value))
+
+    def _close(self):
+        with profiling.stage('to_excel'):
+            self._workbook.close()
+
+class ExcelReader:
+    """
+    Read the rows of the first sheet of an Excel file one at a time.
+
+    Values are returned as text, as pd.read_excel(..., dtype=str).fillna('') does: empty cells
+    are '', and whole numbers (e.g., a track number typed into Excel) lose their decimal point.
+
+    Attributes:
+        path (str): Path to the Excel file.
+        columns (list): Tag columns, from the header row. Columns without a header, or in
+            skip_columns, are skipped.
+        row_count (int): Number of rows below the header, as recorded in the file, or None if
+            the file does not record it. Only used for progress reporting.
+    """
+
+    def __init__(self, path, skip_columns=()):
+        try:
+            import openpyxl
+        except ImportError:
+            raise ValueError("Reading Excel files requires openpyxl.")
+        self.path = path
+        with profiling.stage('read_excel'):
+            self._workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        worksheet = self._workbook.worksheets[0]
+        self.row_count = worksheet.max_row - 1 if worksheet.max_row else None
+        # The recorded size may be wrong, and read-only sheets stop at it
+        worksheet.reset_dimensions()
+        self._rows = worksheet.iter_rows(values_only=True)
+        header = next(self._rows, ())
+        self._column_numbers = [(column_number, str(column)) for column_number, column in enumerate(header)
+                                if column_number > 0 and column is not None and str(column) not in skip_columns]
+        self.columns = [column for _, column in self._column_numbers]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        """
+        Yields:
+            tuple: (track_path, tags), where tags maps each column to its text. Rows without a
+                track path are skipped.
+        """
+        while True:
+            with profiling.stage('read_excel'):
+                values = next(self._rows, None)
+            if values is None:
+                return
+            if not values or values[0] is None:
+                continue
+            tags = {column: cell_to_text(values[column_number]) if column_number < len(values) else ''
+                    for column_number, column in self._column_numbers}
+            yield cell_to_text(values[0]), tags
+
+    def close(self):
+        """Close the workbook."""
+        self._workbook.close()
+
+################################################################################
+### Define functions
+################################################################################
+
+def cell_to_text(value):
+    """
+    Convert the value of a cell to text.
+
+    Args:
+        value: Value of the cell, as returned by openpyxl, or a value of a Parquet, Feather or CSV file.
+
+    Returns:
+        str: '' for an empty cell, or NaN. Whole numbers are written without a decimal point.
+    """
+    # NaN is the only value which is not equal to itself
+    if value is None or value != value:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def write_excel(records, path, columns, batch_size=1000):
+    """
+    Write (track_path, tags) records to an Excel file as they are produced.
+
+    Args:
+        records (iterable): Iterable of (track_path, tags) tuples, e.g., from read.iter_tags.
+        path (str): Path to the Excel file.
+        columns (list): Tag columns, written after the path column.
+        batch_size (int): Number of records buffered before they are written.
+
+    Returns:
+        int: Number of records written.
+    """
+    with ExcelStreamWriter(path, columns, batch_size) as writer:
+        for track_path, tags in records:
+            writer.write(track_path, tags)
+    return writer.records_written
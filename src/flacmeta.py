@@ -0,0 +1,344 @@
+################################################################################
+### flacmeta.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Lightweight reader for the metadata blocks at the start of a FLAC file.
+### Only STREAMINFO and VORBIS_COMMENT are decoded; all other blocks (PICTURE,
+### PADDING, SEEKTABLE, ...) are skipped without being copied into memory.
+### Reading stops at the first audio frame. Files the reader cannot handle
+### raise FLACHeaderError, and callers fall back to mutagen.
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import mmap
+import os
+import struct
+import zlib
+import mutagen
+import mutagen.flac
+
+################################################################################
+### Define constants
+################################################################################
+
+FLAC_MARKER = b'fLaC'
+ID3_MARKER = b'ID3'
+
+# Metadata block types
+BLOCK_STREAMINFO = 0
+BLOCK_PADDING = 1
+BLOCK_APPLICATION = 2
+BLOCK_SEEKTABLE = 3
+BLOCK_VORBIS_COMMENT = 4
+BLOCK_CUESHEET = 5
+BLOCK_PICTURE = 6
+BLOCK_INVALID = 127
+
+STREAMINFO_SIZE = 34
+
+# Largest metadata block, as its length is stored in 24 bits
+MAX_BLOCK_SIZE = 0xFFFFFF
+
+# Padding left after the metadata blocks when a file has to be rewritten, so that later edits fit
+DEFAULT_PADDING_RESERVE = 8192
+
+################################################################################
+### Define classes
+################################################################################
+
+class FLACHeaderError(ValueError):
+    """Raised when the metadata blocks of a file cannot be read by the header-only reader."""
+
+################################################################################
+### Define functions
+################################################################################
+
+def _skip_id3(read_at, file_size):
+    """
+    Get the offset of the FLAC marker, skipping a leading ID3v2 tag if present.
+
+    Args:
+        read_at (callable): Function returning `size` bytes at `offset`.
+        file_size (int): Size of the file in bytes.
+
+    Returns:
+        int: Offset of the 'fLaC' marker.
+    """
+    header = read_at(0, 10)
+    if header[:3] != ID3_MARKER:
+        return 0
+    if len(header) < 10:
+        raise FLACHeaderError("Truncated ID3 header.")
+    # The ID3v2 tag size is a 28-bit syncsafe integer, excluding the 10-byte header
+    size = 0
+    for byte in header[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    offset = 10 + size
+    # A footer is present if flag 0x10 is set
+    if header[5] & 0x10:
+        offset += 10
+    if offset > file_size:
+        raise FLACHeaderError("ID3 tag extends past the end of the file.")
+    return offset
+
+def parse_streaminfo(data):
+    """
+    Parse the STREAMINFO block.
+
+    Args:
+        data (bytes): Body of the STREAMINFO block.
+
+    Returns:
+        dict: Stream properties (block and frame sizes, sample_rate, channels,
+            bits_per_sample, total_samples, md5_signature).
+    """
+    if len(data) < STREAMINFO_SIZE:
+        raise FLACHeaderError("STREAMINFO block is too short.")
+    min_blocksize, max_blocksize = struct.unpack('>HH', data[0:4])
+    min_framesize = int.from_bytes(data[4:7], 'big')
+    max_framesize = int.from_bytes(data[7:10], 'big')
+    # 20 bits sample rate, 3 bits channels - 1, 5 bits bits per sample - 1, 36 bits total samples
+    packed = int.from_bytes(data[10:18], 'big')
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x07) + 1
+    bits_per_sample = ((packed >> 36) & 0x1F) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    return {
+        'min_blocksize': min_blocksize,
+        'max_blocksize': max_blocksize,
+        'min_framesize': min_framesize,
+        'max_framesize': max_framesize,
+        'sample_rate': sample_rate,
+        'channels': channels,
+        'bits_per_sample': bits_per_sample,
+        'total_samples': total_samples,
+        'md5_signature': bytes(data[18:34]).hex(),
+    }
+
+def parse_vorbis_comment(data):
+    """
+    Parse the VORBIS_COMMENT block.
+
+    Tag names are lowercased, and the values of repeated tags are kept in the order
+    they appear, matching the lists returned by mutagen.
+
+    Args:
+        data (bytes): Body of the VORBIS_COMMENT block.
+
+    Returns:
+        tuple: (vendor, tags), where tags is a dict mapping tag names to lists of values.
+    """
+    try:
+        offset = 0
+        vendor_length, = struct.unpack_from('<I', data, offset)
+        offset += 4
+        vendor = bytes(data[offset:offset + vendor_length]).decode('utf-8', 'replace')
+        offset += vendor_length
+        count, = struct.unpack_from('<I', data, offset)
+        offset += 4
+        tags = {}
+        for _ in range(count):
+            length, = struct.unpack_from('<I', data, offset)
+            offset += 4
+            comment = bytes(data[offset:offset + length])
+            if len(comment) != length:
+                raise FLACHeaderError("Truncated comment in VORBIS_COMMENT block.")
+            offset += length
+            key, sep, value = comment.decode('utf-8').partition('=')
+            if not sep:
+                raise FLACHeaderError("Comment without '=' in VORBIS_COMMENT block.")
+            tags.setdefault(key.lower(), []).append(value)
+    except (struct.error, UnicodeDecodeError) as e:
+        raise FLACHeaderError(f"Invalid VORBIS_COMMENT block: {e}")
+    return vendor, tags
+
+def _read_blocks(read_at, file_size):
+    """
+    Walk the metadata block headers and decode STREAMINFO and VORBIS_COMMENT.
+
+    Args:
+        read_at (callable): Function returning `size` bytes at `offset`.
+        file_size (int): Size of the file in bytes.
+
+    Returns:
+        dict: See read_flac_metadata.
+    """
+    # Count the bytes read, so that callers can report them
+    bytes_read = 0
+    uncounted_read_at = read_at
+
+    def read_at(offset, size):
+        nonlocal bytes_read
+        data = uncounted_read_at(offset, size)
+        bytes_read += len(data)
+        return data
+
+    offset = _skip_id3(read_at, file_size)
+    id3 = offset > 0
+    if read_at(offset, 4) != FLAC_MARKER:
+        raise FLACHeaderError("Not a FLAC file.")
+    offset += 4
+
+    streaminfo = None
+    vendor = None
+    tags = {}
+    comment_crc = None
+    padding = 0
+    pictures = 0
+    last = False
+    while not last:
+        header = read_at(offset, 4)
+        if len(header) < 4:
+            raise FLACHeaderError("Truncated metadata block header.")
+        last = bool(header[0] & 0x80)
+        block_type = header[0] & 0x7F
+        length = int.from_bytes(header[1:4], 'big')
+        offset += 4
+        if block_type == BLOCK_INVALID:
+            raise FLACHeaderError("Invalid metadata block type.")
+        if offset + length > file_size:
+            raise FLACHeaderError("Metadata block extends past the end of the file.")
+        # Only decode the blocks we need. Everything else, including pictures, is skipped.
+        if block_type == BLOCK_STREAMINFO:
+            streaminfo = parse_streaminfo(read_at(offset, length))
+        elif block_type == BLOCK_VORBIS_COMMENT:
+            if vendor is not None:
+                raise FLACHeaderError("More than one VORBIS_COMMENT block.")
+            data = read_at(offset, length)
+            vendor, tags = parse_vorbis_comment(data)
+            comment_crc = zlib.crc32(data)
+        elif block_type == BLOCK_PADDING:
+            padding += length
+        elif block_type == BLOCK_PICTURE:
+            pictures += 1
+        offset += length
+
+    if streaminfo is None:
+        raise FLACHeaderError("Missing STREAMINFO block.")
+
+    return {
+        'streaminfo': streaminfo,
+        'vendor': vendor,
+        'tags': tags,
+        'comment_crc': comment_crc,
+        'padding': padding,
+        'pictures': pictures,
+        'id3': id3,
+        'audio_offset': offset,
+        'bytes_read': bytes_read,
+    }
+
+def read_flac_metadata(file_path, use_mmap=True):
+    """
+    Read STREAMINFO and VORBIS_COMMENT from a FLAC file without decoding other blocks.
+
+    Args:
+        file_path (str): Path to the FLAC file.
+        use_mmap (bool): Map the file into memory instead of seeking through it.
+            Falls back to regular reads if the file cannot be mapped.
+
+    Returns:
+        dict: With the keys
+            streaminfo (dict): Stream properties, see parse_streaminfo.
+            vendor (str): Vendor string, or None if the file has no VORBIS_COMMENT block.
+            tags (dict): Tag names (lowercase) mapped to lists of values. Empty if the
+                file has no VORBIS_COMMENT block.
+            comment_crc (int): CRC-32 of the VORBIS_COMMENT block, or None if the file has none.
+            padding (int): Total size of the PADDING blocks in bytes.
+            pictures (int): Number of PICTURE blocks.
+            id3 (bool): Whether the file starts with an ID3v2 tag.
+            audio_offset (int): Offset of the first audio frame.
+            bytes_read (int): Number of bytes read from the file. Skipped blocks are not read.
+
+    Raises:
+        FLACHeaderError: If the metadata blocks cannot be read.
+        OSError: If the file cannot be opened.
+    """
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        if use_mmap and file_size > 0:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                buffer = None
+            if buffer is not None:
+                with buffer:
+                    return _read_blocks(lambda offset, size: buffer[offset:offset + size], file_size)
+
+        def read_at(offset, size):
+            f.seek(offset)
+            return f.read(size)
+
+        return _read_blocks(read_at, file_size)
+
+def read_vorbis_tags(file_path, use_mmap=True):
+    """
+    Read the Vorbis comments of a FLAC file, falling back to mutagen if the header-only
+    reader cannot handle the file.
+
+    Args:
+        file_path (str): Path to the FLAC file.
+        use_mmap (bool): Map the file into memory instead of seeking through it.
+
+    Returns:
+        dict: Tag names (lowercase) mapped to lists of values.
+
+    Raises:
+        mutagen.flac.error: If mutagen cannot read the file either.
+    """
+    try:
+        return read_flac_metadata(file_path, use_mmap)['tags']
+    except FLACHeaderError:
+        audio_file = mutagen.flac.FLAC(file_path)
+        return dict(audio_file.tags) if audio_file.tags is not None else {}
+
+def save_flac(audio_file, padding_reserve=DEFAULT_PADDING_RESERVE, deleteid3=False):
+    """
+    Save the metadata blocks of a FLAC file opened with mutagen, reusing the space of the
+    existing blocks and padding.
+
+    If the new blocks fit in the space before the audio, they are written in place, and the
+    rest of the space is left as padding, so only the start of the file is written. Otherwise
+    the audio has to be moved, and padding_reserve bytes of padding are added. mutagen's default
+    policy also moves the audio to shrink padding it finds too large, which this avoids.
+
+    Args:
+        audio_file (mutagen.flac.FLAC): File to save, with its new tags.
+        padding_reserve (int): Bytes of padding to add when the file has to be rewritten.
+        deleteid3 (bool): Also delete ID3 tags. The space of an ID3v2 tag at the start of the
+            file is reused for the metadata blocks.
+
+    Returns:
+        bool: True if the file was saved in place, False if the audio had to be moved.
+    """
+    in_place = None
+
+    def padding(info):
+        # info.padding is the space left over once the new blocks are written in place
+        nonlocal in_place
+        in_place = 0 <= info.padding <= MAX_BLOCK_SIZE
+        return info.padding if in_place else padding_reserve
+
+    audio_file.save(deleteid3=deleteid3, padding=padding)
+    return in_place
+
+def verify_vorbis_comment(file_path, audio_file):
+    """
+    Check that the VORBIS_COMMENT block of a saved file is the one mutagen wrote, by comparing
+    CRC-32 checksums. Only the metadata blocks are read, and only the comment block is decoded.
+
+    Args:
+        file_path (str): Path to the FLAC file.
+        audio_file (mutagen.flac.FLAC): The file as it was saved.
+
+    Returns:
+        int: Number of bytes read from the file.
+
+    Raises:
+        FLACHeaderError: If the comment block differs, or the metadata blocks cannot be read.
+    """
+    metadata = read_flac_metadata(file_path)
+    if metadata['comment_crc'] != zlib.crc32(audio_file.tags.write()):
+        raise FLACHeaderError(f"{file_path}: The saved VORBIS_COMMENT block does not match the tags.")
+    return metadata['bytes_read']
@@ -0,0 +1,313 @@
+################################################################################
+### journal.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Write-ahead journal of write mode. Before a file is changed, its original
+### tags, pictures and name are recorded with the planned tags and new name,
+### and once it has been saved and renamed it is marked as done. An interrupted
+### run can be resumed from the journal, skipping the files which are done,
+### and a run can be rolled back, restoring the original tags and file names.
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import mutagen
+import mutagen.flac
+from tqdm import tqdm  # For better progress tracking
+import flacmeta
+import profiling
+
+################################################################################
+### Define constants
+################################################################################
+
+# Bump when the tables change, so that journals of an older version are refused
+JOURNAL_VERSION = 1
+
+# Status of an operation
+PLANNED = 'planned'
+DONE = 'done'
+FAILED = 'failed'
+ROLLED_BACK = 'rolled_back'
+
+################################################################################
+### Define classes
+################################################################################
+
+class WriteJournal:
+    """
+    Record the operations of a write mode run in a SQLite database.
+
+    Every change is committed before the file is touched, or as soon as it is done, so the
+    journal describes the files up to the one which was being written when the run stopped.
+    The database uses write-ahead logging with synchronous=NORMAL: committed operations
+    survive a crash or kill of the process, but not necessarily a power failure.
+
+    A journal can be shared by worker threads, and opened by several worker processes.
+
+    Attributes:
+        db_file (str): Path to the SQLite database file.
+    """
+
+    def __init__(self, db_file):
+        """
+        Open (or create) the journal.
+
+        Args:
+            db_file (str): Path to the SQLite database file.
+
+        Raises:
+            ValueError: If the file is a journal of another version.
+        """
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        # Worker processes wait for each other's commits
+        self.conn = sqlite3.connect(db_file, timeout=60, check_same_thread=False)
+        self.cursor = self.conn.cursor()
+        self.cursor.execute('PRAGMA journal_mode=WAL')
+        self.cursor.execute('PRAGMA synchronous=NORMAL')
+        self._create_tables()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _create_tables(self):
+        with self._lock:
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS operations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    filepath TEXT UNIQUE,
+                    new_filepath TEXT,
+                    original_tags TEXT,
+                    pictures TEXT,
+                    new_tags TEXT,
+                    status TEXT,
+                    error TEXT
+                )
+            ''')
+            # Pictures are stored once, as the tracks of an album usually share their cover
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pictures (
+                    hash TEXT PRIMARY KEY,
+                    data BLOB
+                )
+            ''')
+            self.cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', ?)",
+                                (str(JOURNAL_VERSION),))
+            self.cursor.execute("SELECT value FROM meta WHERE key = 'version'")
+            version = self.cursor.fetchone()[0]
+            self.conn.commit()
+        if version != str(JOURNAL_VERSION):
+            raise ValueError(f"{self.db_file} is a journal of another version of tagger.py.")
+
+    def _commit(self):
+        profiling.count('journal_commits')
+        self.conn.commit()
+
+    def plan(self, file_path, new_file_path, audio_file, new_tags):
+        """
+        Record the original state of a file, and what it is about to become. A file which is
+        already in the journal keeps the original state of its first entry, so that a file
+        which was half written when a run stopped can still be rolled back.
+
+        Args:
+            file_path (str): Path to the FLAC file.
+            new_file_path (str): Path the file is renamed to.
+            audio_file (mutagen.flac.FLAC): The file as it was opened, before its tags are changed.
+            new_tags (dict): Tags the file is given, from write.get_target_tags.
+
+        Returns:
+            None
+        """
+        original_tags = list(audio_file.tags) if audio_file.tags is not None else []
+        pictures = [picture.write() for picture in audio_file.pictures]
+        hashes = [hashlib.sha1(data).hexdigest() for data in pictures]
+        with self._lock:
+            self.cursor.executemany('INSERT OR IGNORE INTO pictures (hash, data) VALUES (?, ?)',
+                                    zip(hashes, pictures))
+            self.cursor.execute('''
+                INSERT OR IGNORE INTO operations (filepath, new_filepath, original_tags, pictures, new_tags, status)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (os.path.abspath(file_path), os.path.abspath(new_file_path), json.dumps(original_tags),
+                  json.dumps(hashes), json.dumps({tag: str(value) for tag, value in new_tags.items()}), PLANNED))
+            self.cursor.execute('UPDATE operations SET status = ?, error = NULL WHERE filepath = ?',
+                                (PLANNED, os.path.abspath(file_path)))
+            self._commit()
+
+    def set_status(self, file_path, status, error=None):
+        """
+        Record the outcome of an operation.
+
+        Args:
+            file_path (str): Path the file had when it was planned.
+            status (str): DONE, FAILED or ROLLED_BACK.
+            error (Exception): Optional. Error which made the operation fail.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.cursor.execute('UPDATE operations SET status = ?, error = ? WHERE filepath = ?',
+                                (status, f"{type(error).__name__}: {error}" if error is not None else None,
+                                 os.path.abspath(file_path)))
+            self._commit()
+
+    def complete(self, file_path):
+        """Mark a file as done, once it has been saved and renamed."""
+        self.set_status(file_path, DONE)
+
+    def fail(self, file_path, error):
+        """Mark a file as failed. It is written again when the run is resumed."""
+        self.set_status(file_path, FAILED, error)
+
+    def is_done(self, file_path):
+        """
+        Check whether a file was already updated by the run being resumed.
+
+        A file which was planned but not marked as done is done if it was renamed: the
+        rename is the last step of an update. Otherwise it has to be written again.
+
+        Args:
+            file_path (str): Path the file had when it was planned.
+
+        Returns:
+            bool: True if the file is done.
+        """
+        file_path = os.path.abspath(file_path)
+        with self._lock:
+            self.cursor.execute('SELECT new_filepath, status FROM operations WHERE filepath = ?', (file_path,))
+            result = self.cursor.fetchone()
+        if result is None:
+            return False
+        new_file_path, status = result
+        if status == DONE:
+            return True
+        if (status == PLANNED and new_file_path != file_path and os.path.exists(new_file_path)
+                and not os.path.exists(file_path)):
+            self.complete(file_path)
+            return True
+        return False
+
+    def get_counts(self):
+        """
+        Get the number of operations by status.
+
+        Returns:
+            dict: Maps each status to its number of operations.
+        """
+        with self._lock:
+            self.cursor.execute('SELECT status, COUNT(*) FROM operations GROUP BY status')
+            return dict(self.cursor.fetchall())
+
+    def iter_operations(self, reverse=False):
+        """
+        Yield the operations which have not been rolled back, in the order they were planned.
+
+        Args:
+            reverse (bool): Yield the latest operation first.
+
+        Yields:
+            tuple: (file_path, new_file_path, original_tags, pictures), where original_tags is a list
+                of (key, value) pairs, and pictures a list of the PICTURE blocks of the file.
+        """
+        order = 'DESC' if reverse else 'ASC'
+        with self._lock:
+            self.cursor.execute(f'SELECT filepath, new_filepath, original_tags, pictures FROM operations '
+                                f'WHERE status != ? ORDER BY id {order}', (ROLLED_BACK,))
+            operations = self.cursor.fetchall()
+        for file_path, new_file_path, original_tags, hashes in operations:
+            pictures = []
+            for picture_hash in json.loads(hashes):
+                with self._lock:
+                    self.cursor.execute('SELECT data FROM pictures WHERE hash = ?', (picture_hash,))
+                    pictures.append(self.cursor.fetchone()[0])
+            yield file_path, new_file_path, [tuple(tag) for tag in json.loads(original_tags)], pictures
+
+    def close(self):
+        self.conn.close()
+
+################################################################################
+### Define functions
+################################################################################
+
+def restore_file(file_path, new_file_path, original_tags, pictures, padding_reserve=flacmeta.DEFAULT_PADDING_RESERVE):
+    """
+    Restore the original tags, pictures and name of one file.
+
+    Args:
+        file_path (str): Original path of the file.
+        new_file_path (str): Path the file was renamed to.
+        original_tags (list): (key, value) pairs of the original Vorbis comments, in order.
+        pictures (list): Original PICTURE blocks, as bytes.
+        padding_reserve (int): Bytes of padding to add if the file has to be rewritten.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If the file cannot be found, or another file has taken its original name.
+        Exception: If the tags cannot be restored.
+    """
+    # The file was renamed, unless the run stopped before the rename
+    current_path = new_file_path if os.path.exists(new_file_path) else file_path
+    if not os.path.exists(current_path):
+        raise ValueError(f"{file_path}: File not found, neither under its original nor its new name.")
+    if current_path != file_path and os.path.exists(file_path):
+        raise ValueError(f"{file_path}: Another file has the original name of {new_file_path}.")
+    audio_file = mutagen.flac.FLAC(current_path)
+    audio_file.clear_pictures()
+    if audio_file.tags is None:
+        audio_file.add_tags()
+    else:
+        audio_file.tags.clear()
+    audio_file.tags.extend(original_tags)
+    for data in pictures:
+        audio_file.add_picture(mutagen.flac.Picture(data))
+    flacmeta.save_flac(audio_file, padding_reserve)
+    if current_path != file_path:
+        os.rename(current_path, file_path)
+
+def rollback(journal, padding_reserve=flacmeta.DEFAULT_PADDING_RESERVE):
+    """
+    Restore the original tags, pictures and names of the files of a journal, latest first.
+    Files which were planned but failed are restored too, as they may have been saved before
+    the error. ID3 tags, which write mode deletes, are not restored.
+
+    Args:
+        journal (WriteJournal): Journal of the run.
+        padding_reserve (int): Bytes of padding to add to files which have to be rewritten.
+
+    Returns:
+        tuple: (restored_count, failed_count)
+    """
+    restored_count = 0
+    failed_count = 0
+    operations = list(journal.iter_operations(reverse=True))
+    print(f"Rolling back {len(operations)} files...")
+    for file_path, new_file_path, original_tags, pictures in tqdm(operations, desc="Rolling back"):
+        try:
+            restore_file(file_path, new_file_path, original_tags, pictures, padding_reserve)
+        except Exception as e:
+            print(e)
+            failed_count += 1
+        else:
+            journal.set_status(file_path, ROLLED_BACK)
+            restored_count += 1
+    print(f"Completed!")
+    print(f"Restored: {restored_count} files")
+    print(f"Failed: {failed_count} files")
+    return restored_count, failed_count
@@ -0,0 +1,72 @@
+################################################################################
+### memory.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Memory usage of the current process, for the chunked read mode: the
+### resident set size (RSS) now and at its high-water mark, and the peak of
+### the Python allocations traced by tracemalloc, if it is running.
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import os
+import sys
+import tracemalloc
+
+################################################################################
+### Define constants
+################################################################################
+
+MB = 1024 * 1024
+
+################################################################################
+### Define functions
+################################################################################
+
+def get_peak_rss():
+    """
+    Get the high-water mark of the resident set size of the current process.
+
+    Returns:
+        int: Peak RSS in bytes, or None if it cannot be measured on this platform.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def get_rss():
+    """
+    Get the resident set size of the current process.
+
+    Read from /proc on Linux. Elsewhere, the high-water mark is returned instead, which
+    never goes down once a chunk has been written.
+
+    Returns:
+        int: RSS in bytes, or None if it cannot be measured on this platform.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return get_peak_rss()
+
+def format_memory_report():
+    """
+    Format the memory high-water marks of the run.
+
+    Returns:
+        str: Peak RSS, and the peak of the traced Python allocations if tracemalloc is
+            running (e.g., with PYTHONTRACEMALLOC=1).
+    """
+    peak_rss = get_peak_rss()
+    lines = [f"Peak memory (RSS): {peak_rss / MB:.1f} MB" if peak_rss is not None
+             else "Peak memory (RSS): not available on this platform"]
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        lines.append(f"Peak memory (tracemalloc): {peak / MB:.1f} MB, {current / MB:.1f} MB at the end of the run")
+    return '\n'.join(lines)
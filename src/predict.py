@@ -7,6 +7,7 @@
 ### Import packages
 ################################################################################
 import sqlite3
+import profiling
 
 ################################################################################
 ### DataManager Class
@@ -48,6 +49,10 @@ class DataManager:
                 FOREIGN KEY (filename_id) REFERENCES filename (id)
             )
         ''')
+        self._commit()
+
+    def _commit(self):
+        profiling.count('sqlite_commits')
         self.conn.commit()
 
     def _get_filename_id(self, filepath):
@@ -57,7 +62,7 @@ class DataManager:
             return result[0]
         else:
             self.cursor.execute('INSERT INTO filename (filepath) VALUES (?)', (filepath,))
-            self.conn.commit()
+            self._commit()
             return self.cursor.lastrowid
 
     def save_original_tags(self, filepath, tags):
@@ -74,7 +79,7 @@ class DataManager:
                     INSERT INTO original_tags (filename_id, tag_key, tag_value)
                     VALUES (?, ?, ?)
                 ''', (filename_id, key, value))
-        self.conn.commit()
+        self._commit()
 
     def save_updated_tags(self, filepath, tags):
         filename_id = self._get_filename_id(filepath)
@@ -84,7 +89,7 @@ class DataManager:
                 INSERT INTO updated_tags (filename_id, tag_key, tag_value)
                 VALUES (?, ?, ?)
             ''', (filename_id, key, value))
-        self.conn.commit()
+        self._commit()
 
     def get_tags(self, filepath):
         filename_id = self._get_filename_id(filepath)
@@ -0,0 +1,255 @@
+################################################################################
+### profiling.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Stage timers and counters for finding where a slow run spends its time.
+### A Profiler is activated for the duration of read.iter_tags or
+### write.update_tags, and the helpers they call record into it with stage()
+### and count(). Without an active profiler, both are no-ops.
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import collections
+import contextlib
+import threading
+import time
+
+################################################################################
+### Define constants
+################################################################################
+
+# Descriptions of the counters, in the order they are reported
+COUNTERS = {
+    'tracks': 'tracks processed',
+    'flac_opens': 'FLAC files opened',
+    'mutagen_opens': 'FLAC files opened with mutagen',
+    'bytes_read': 'bytes read by the header-only reader',
+    'file_writes': 'FLAC metadata writes',
+    'inplace_saves': 'writes which reused the existing metadata space and padding',
+    'full_rewrites': 'writes which moved the audio to make room for the metadata',
+    'renames': 'files renamed',
+    'unchanged_files': 'files skipped as their tags were unchanged',
+    'resumed_files': 'files skipped as they were done by the resumed run',
+    'sqlite_commits': 'DataManager commits',
+    'scan_cache_commits': 'scan cache commits',
+    'journal_commits': 'write journal commits',
+}
+
+################################################################################
+### Define classes
+################################################################################
+
+class Profiler:
+    """
+    Accumulate the time spent in each stage of a run, and counts of file and database operations.
+
+    Worker threads record into the same profiler. Worker processes record into their own,
+    and the parent adds their snapshots with merge. Stage times of parallel workers are
+    summed, so they may add up to more than the wall time of the run.
+
+    Attributes:
+        times (collections.Counter): Seconds spent in each stage.
+        calls (collections.Counter): Number of times each stage was entered.
+        counters (collections.Counter): Counts by counter name, see COUNTERS.
+        start_time (float): Value of time.perf_counter when the profiler was created.
+    """
+
+    def __init__(self):
+        self.times = collections.Counter()
+        self.calls = collections.Counter()
+        self.counters = collections.Counter()
+        self.start_time = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_time(self, stage, elapsed, calls=1):
+        """
+        Add time to a stage.
+
+        Args:
+            stage (str): Stage name.
+            elapsed (float): Seconds spent in the stage.
+            calls (int): Number of times the stage was entered.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.times[stage] += elapsed
+            self.calls[stage] += calls
+
+    def count(self, name, n=1):
+        """
+        Add to a counter.
+
+        Args:
+            name (str): Counter name.
+            n (int): Amount to add.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.counters[name] += n
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time the body of a with statement as a stage.
+
+        Args:
+            name (str): Stage name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def snapshot(self, reset=False):
+        """
+        Get the times, calls and counters recorded so far.
+
+        Args:
+            reset (bool): Start again from zero, e.g., in a worker process after each directory.
+
+        Returns:
+            dict: With the keys times, calls and counters, each a plain dict.
+        """
+        with self._lock:
+            snapshot = {'times': dict(self.times), 'calls': dict(self.calls), 'counters': dict(self.counters)}
+            if reset:
+                self.times.clear()
+                self.calls.clear()
+                self.counters.clear()
+        return snapshot
+
+    def merge(self, snapshot):
+        """
+        Add a snapshot of another profiler, e.g., one of a worker process.
+
+        Args:
+            snapshot (dict): As returned by snapshot.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.times.update(snapshot['times'])
+            self.calls.update(snapshot['calls'])
+            self.counters.update(snapshot['counters'])
+
+    def format_report(self):
+        """
+        Format the stage times and counters as a table.
+
+        Returns:
+            str: Stages by descending time, with their share of the wall time, followed by
+                the counters and their number per track.
+        """
+        wall_time = time.perf_counter() - self.start_time
+        snapshot = self.snapshot()
+        times, calls, counters = snapshot['times'], snapshot['calls'], snapshot['counters']
+        lines = [f"{'Stage':<20} {'Calls':>10} {'Time (s)':>10} {'Per call (ms)':>14} {'Share':>7}"]
+        for stage in sorted(times, key=times.get, reverse=True):
+            share = times[stage] / wall_time if wall_time else 0
+            per_call = times[stage] / calls[stage] * 1000 if calls[stage] else 0
+            lines.append(f"{stage:<20} {calls[stage]:>10} {times[stage]:>10.3f} {per_call:>14.3f} {share:>7.1%}")
+        # Time outside of the stages, unless the stages of parallel workers add up to more
+        other = wall_time - sum(times.values())
+        if other > 0:
+            lines.append(f"{'(other)':<20} {'':>10} {other:>10.3f} {'':>14} {other / wall_time:>7.1%}")
+        lines.append(f"{'Total (wall)':<20} {'':>10} {wall_time:>10.3f}")
+        if counters:
+            tracks = counters.get('tracks', 0)
+            lines.append("")
+            lines.append(f"{'Counter':<20} {'Value':>12} {'Per track':>10}  Description")
+            # Known counters first, in a fixed order, then any others
+            names = [name for name in COUNTERS if name in counters]
+            names += sorted(name for name in counters if name not in COUNTERS)
+            for name in names:
+                per_track = f"{counters[name] / tracks:.2f}" if tracks else ''
+                lines.append(f"{name:<20} {counters[name]:>12} {per_track:>10}  {COUNTERS.get(name, '')}")
+        return '\n'.join(lines)
+
+################################################################################
+### Define functions
+### The active profiler is shared by all threads of a process
+################################################################################
+
+_active_profiler = None
+
+# Returned by stage when no profiler is active, so that timing costs nothing
+_NO_STAGE = contextlib.nullcontext()
+
+def activate(profiler):
+    """
+    Make a profiler the active one, so that stage and count record into it.
+
+    Args:
+        profiler (Profiler): Profiler to activate, or None to stop recording.
+
+    Returns:
+        Profiler: The previously active profiler, or None, to be restored afterwards.
+    """
+    global _active_profiler
+    previous = _active_profiler
+    _active_profiler = profiler
+    return previous
+
+@contextlib.contextmanager
+def profile(profiler):
+    """
+    Activate a profiler for the body of a with statement.
+
+    Args:
+        profiler (Profiler): Profiler to activate. If None, the active profiler is left as it is,
+            so that functions taking an optional profiler can be nested.
+    """
+    if profiler is None:
+        yield
+        return
+    previous = activate(profiler)
+    try:
+        yield
+    finally:
+        activate(previous)
+
+def get_active():
+    """
+    Get the active profiler.
+
+    Returns:
+        Profiler: The active profiler, or None if not profiling.
+    """
+    return _active_profiler
+
+def stage(name):
+    """
+    Time the body of a with statement as a stage of the active profiler.
+
+    Args:
+        name (str): Stage name.
+
+    Returns:
+        Context manager, which does nothing if no profiler is active.
+    """
+    profiler = _active_profiler
+    if profiler is None:
+        return _NO_STAGE
+    return profiler.stage(name)
+
+def count(name, n=1):
+    """
+    Add to a counter of the active profiler, if there is one.
+
+    Args:
+        name (str): Counter name, see COUNTERS.
+        n (int): Amount to add.
+
+    Returns:
+        None
+    """
+    profiler = _active_profiler
+    if profiler is not None:
+        profiler.count(name, n)
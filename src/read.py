@@ -8,32 +8,90 @@
 ################################################################################
 import os
 import re
+import collections
+import itertools
+import json
 import logging
+import threading
+import concurrent.futures
 import mutagen
 import mutagen.flac
-import pandas as pd
 from tqdm import tqdm  # For better progress tracking
+import excel
+import flacmeta
+import memory
+import profiling
+import scan
 
 ################################################################################
 ### Setup logging
+### Logging is configured by tagger.py. Per-track messages are logged at DEBUG
+### level; at the end of a run, the number of tracks which went through each
+### parsing path is logged instead.
 ################################################################################
 
-# Import the setup_logging function
-from utils import setup_logging
-# Initialize the logger
-logger = setup_logging(os.getcwd())
+logger = logging.getLogger(__name__)
+
+# Parsing paths, counted by count_parse_path, with their descriptions for the summary
+PARSE_PATHS = {
+    'album_from_path': 'album folders following the convention',
+    'album_from_tags': 'album folders read from file tags',
+    'title_parsed': 'tracks parsed from the title tag',
+    'title_missing': 'tracks without a title tag, read from file tags',
+}
+
+# Counts of the current thread, so that worker threads do not share counts
+_parse_path_counts = threading.local()
+
+def start_parse_path_counts():
+    """
+    Start counting parsing paths in the current thread.
+
+    Returns:
+        collections.Counter: Counts by parsing path, updated as tracks are parsed.
+    """
+    _parse_path_counts.counts = collections.Counter()
+    return _parse_path_counts.counts
+
+def count_parse_path(parse_path):
+    """
+    Count a parsing path, if counting was started in the current thread.
+
+    Args:
+        parse_path (str): One of PARSE_PATHS.
+
+    Returns:
+        None
+    """
+    counts = getattr(_parse_path_counts, 'counts', None)
+    if counts is not None:
+        counts[parse_path] += 1
+
+def report_parse_paths(counts):
+    """
+    Log how many tracks and album folders went through each parsing path.
+
+    Args:
+        counts (collections.Counter): Counts by parsing path.
+
+    Returns:
+        None
+    """
+    for parse_path, description in PARSE_PATHS.items():
+        logger.info("Parsing: %d %s", counts[parse_path], description)
 
 ################################################################################
 ### Define functions
 ### Create dataframe to store tags
 ################################################################################
 
-def get_flac_files(search_dir):
+def get_flac_files(search_dir, workers = 1):
     """
     Get a list of FLAC files in the specified directory.
 
     Args:
         search_dir (str): Directory to search for FLAC files.
+        workers (int): Number of threads scanning the top-level directories.
 
     Returns:
         list: List of FLAC file paths.
@@ -41,15 +99,21 @@ def get_flac_files(search_dir):
     Raises:
         ValueError: If no FLAC files are found in the directory.
     """
-    track_path_list = []
-    for dirpath, dirnames, filenames in os.walk(search_dir):
-        for file in filenames:
-            if file.endswith('.flac'):
-                track_path_list.append(os.path.join(dirpath, file))
+    track_path_list = [entry.path for entry in scan.scan_files(search_dir, {'.flac'}, workers)]
     if not track_path_list:
         raise ValueError("No FLAC files found in the specified directory.")
     return sorted(track_path_list)
 
+# Columns of the dataframe, in the order they are written to Excel
+TAG_COLUMNS = ['Composer', 'Album', 'Year Recorded', 'Orchestra', 'Conductor', 'Soloists', 'Arranger', 
+               'Genre', 'DiscNumber', 'TrackNumber', 'Title', 'TrackTitle', 'Work', 'Work Number', 
+               'InitialKey', 'Catalog #', 'Opus', 'Opus Number', 'Epithet', 'Movement']
+
+# Columns filled by get_track_tags, in the order they are extracted
+READ_COLUMNS = ['Album', 'Year Recorded', 'Orchestra', 'Conductor', 'DiscNumber', 'TrackNumber',
+                'Work', 'Work Number', 'InitialKey', 'Catalog #', 'Opus', 'Opus Number',
+                'Epithet', 'Movement', 'Genre', 'Composer']
+
 def create_tags_dataframe(track_path_list):
     """
     Create an empty dataframe to store tags for the given tracks.
@@ -60,28 +124,115 @@ def create_tags_dataframe(track_path_list):
     Returns:
         pd.DataFrame: DataFrame with track paths as index and columns for tags.
     """
-    columns = ['Composer', 'Album', 'Year Recorded', 'Orchestra', 'Conductor', 'Soloists', 'Arranger', 
-               'Genre', 'DiscNumber', 'TrackNumber', 'Title', 'TrackTitle', 'Work', 'Work Number', 
-               'InitialKey', 'Catalog #', 'Opus', 'Opus Number', 'Epithet', 'Movement']
-    return pd.DataFrame(index=track_path_list, columns=columns)
+    # Imported here, as worker processes only parse tags and do not need pandas
+    import pandas as pd
+    return pd.DataFrame(index=track_path_list, columns=TAG_COLUMNS)
 
-def get_tracks_create_dataframe(search_dir):
+def get_tracks_create_dataframe(search_dir, workers = 1):
     """
     Get list of tracks and create an empty dataframe to store tags.
 
     Args:
         search_dir (str): Directory to search for FLAC files.
+        workers (int): Number of threads scanning the top-level directories.
 
     Returns:
         pd.DataFrame: DataFrame with track paths as index and columns for tags.
     """
-    track_path_list = get_flac_files(search_dir)
+    track_path_list = get_flac_files(search_dir, workers)
     return create_tags_dataframe(track_path_list)
 
+################################################################################
+### Read track metadata: open each FLAC file once and share the result
+################################################################################
+
+class TrackMetadata:
+    """
+    Snapshot of the metadata of a single track.
+
+    The FLAC file is opened once, and the snapshot is passed to each of the parsing
+    helpers below so that a track is not re-opened for every group of tags.
+
+    Attributes:
+        track_path (str): Path to the track file.
+        audio_file: Object holding the tags, indexable by tag name. Either a mutagen.flac.FLAC
+            object, or the dict of tags returned by the header-only reader in flacmeta.
+    """
+
+    def __init__(self, track_path, audio_file=None):
+        self.track_path = track_path
+        if audio_file is None:
+            audio_file = mutagen.flac.FLAC(track_path)
+        self.audio_file = audio_file
+
+    def __getitem__(self, key):
+        return self.audio_file[key]
+
+    def __contains__(self, key):
+        # mutagen keeps the tags in an attribute, the header-only reader returns them directly
+        tags = self.audio_file if isinstance(self.audio_file, dict) else self.audio_file.tags
+        return tags is not None and key in tags
+
+    def all_tags(self):
+        """
+        Get all tags of the track, in the format stored by DataManager.
+
+        Returns:
+            dict: Tags of the track.
+        """
+        if isinstance(self.audio_file, dict):
+            return dict(self.audio_file)
+        return dict(self.audio_file.tags)
+
+def get_track_metadata(track):
+    """
+    Get the metadata snapshot for a track.
+
+    The tags are read with the header-only reader, which skips pictures and stops at the
+    first audio frame. Files it cannot handle are opened with mutagen instead.
+
+    Args:
+        track (str or TrackMetadata): Path to the track file, or an existing snapshot.
+
+    Returns:
+        TrackMetadata: Snapshot of the track metadata. An existing snapshot is returned as is.
+    """
+    if isinstance(track, TrackMetadata):
+        return track
+    profiling.count('flac_opens')
+    with profiling.stage('open'):
+        try:
+            metadata = flacmeta.read_flac_metadata(track)
+        # Fall back to mutagen for anything the header-only reader cannot handle
+        except Exception:
+            profiling.count('mutagen_opens')
+            return TrackMetadata(track)
+    profiling.count('bytes_read', metadata['bytes_read'])
+    return TrackMetadata(track, metadata['tags'])
+
+def get_track_path(track):
+    """
+    Get the path of a track.
+
+    Args:
+        track (str or TrackMetadata): Path to the track file, or a snapshot of its metadata.
+
+    Returns:
+        str: Path to the track file.
+    """
+    if isinstance(track, TrackMetadata):
+        return track.track_path
+    return track
+
 ################################################################################
 ### Process track path: get album string, disc number from track path
 ################################################################################
 
+# Patterns are compiled once, rather than for every track
+POSSIBLE_DISC_NAMES = ['Disc', 'Disk', 'CD']
+DISC_PATTERN = re.compile(r'(' + '|'.join(POSSIBLE_DISC_NAMES) + r')\s?(\d+)')
+ALBUM_PATTERN = re.compile(r'\[(\d{4})\]\s(.+)')
+
 def get_album_string_from_track_path(track_path):
     """
     Extract album info by walking up the path to find the album folder.
@@ -116,10 +267,8 @@ def get_disc_number_from_track_path(track_path):
     Returns:
         disc_number (str): Disc number extracted from the album information.
     """
-    possible_disc_names = ['Disc', 'Disk', 'CD']
-    disc_pattern = r'(' + '|'.join(possible_disc_names) + r')\s?(\d+)'
-    if any(keyword in track_path for keyword in possible_disc_names):
-        disc_match = re.search(disc_pattern, track_path)
+    if any(keyword in track_path for keyword in POSSIBLE_DISC_NAMES):
+        disc_match = DISC_PATTERN.search(track_path)
         if disc_match:
             return disc_match.group(2)
     return None
@@ -190,7 +339,8 @@ def parse_fields_from_matching_album_string(match):
 
     # The match object should have two groups: year_recorded and album_string
     year_recorded, album_string = match.groups()
-    logging.info(f"{album_string}: Album info follows the convention. Attempting to extract from file path.")
+    count_parse_path('album_from_path')
+    logger.debug("%s: Album info follows the convention. Attempting to extract from file path.", album_string)
     # Extract the album, orchestra and conductor
     try:
         album_string = album_string.split(' (')
@@ -211,7 +361,7 @@ def get_tags_from_file_with_unmatched_album_string(track_path):
     doesn't follow the expected naming convention.
     
     Args:
-        track_path (str): Path to the FLAC audio file
+        track_path (str or TrackMetadata): Path to the FLAC audio file, or a snapshot of its metadata
         
     Returns:
         tuple: (album, year_recorded, orchestra, conductor)
@@ -220,9 +370,11 @@ def get_tags_from_file_with_unmatched_album_string(track_path):
         Any tag that cannot be read will return None for that field
     """
 
-    logging.info(f"{track_path}: Album info does not follow the convention. Attempting to extract from file tags.")
+    count_parse_path('album_from_tags')
+    logger.debug("%s: Album info does not follow the convention. Attempting to extract from file tags.",
+                 get_track_path(track_path))
     # Extract album, year_recorded, orchestra, conductor
-    audio_file = mutagen.flac.FLAC(track_path)
+    audio_file = get_track_metadata(track_path)
     # Album
     try:
         album = audio_file['album'][0]
@@ -254,19 +406,18 @@ def get_album_fields_from_track_path(track_path):
     Extract album information from the track path
 
     Args:
-        track_path (str): Path to the track file.
+        track_path (str or TrackMetadata): Path to the track file, or a snapshot of its metadata.
     
     Returns:
         tuple: (album, year_recorded, orchestra, conductor)
     """
 
     # Process the path to extract album information
-    album_string = get_album_string_from_track_path(track_path)
+    album_string = get_album_string_from_track_path(get_track_path(track_path))
 
     # Check that the album matches the expected pattern
     # If so, extract the year and album name
-    album_pattern = re.compile(r'\[(\d{4})\]\s(.+)')
-    match = album_pattern.search(album_string)
+    match = ALBUM_PATTERN.search(album_string)
     if match:
         album, year_recorded, orchestra, conductor = parse_fields_from_matching_album_string(match)
 
@@ -276,12 +427,54 @@ def get_album_fields_from_track_path(track_path):
 
     return album, year_recorded, orchestra, conductor
 
+class AlbumFieldCache:
+    """
+    Cache of the album fields and disc number, keyed by the directory of the track.
+
+    The fields are the same for every track in an album or disc folder, so they are
+    computed for the first track of each folder and reused for the others. This includes
+    the fallback to the file tags when the album string does not follow the convention.
+
+    Attributes:
+        fields (dict): Maps directories to (album, year_recorded, orchestra, conductor, disc_number).
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups which computed the fields.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_album_fields(self, track_path):
+        """
+        Get the album fields and disc number for a track.
+
+        Args:
+            track_path (str or TrackMetadata): Path to the track file, or a snapshot of its metadata.
+
+        Returns:
+            tuple: (album, year_recorded, orchestra, conductor, disc_number)
+        """
+        directory = os.path.dirname(get_track_path(track_path))
+        if directory in self.fields:
+            self.hits += 1
+            return self.fields[directory]
+        self.misses += 1
+        album, year_recorded, orchestra, conductor = get_album_fields_from_track_path(track_path)
+        disc_number = get_disc_number_from_track_path(get_track_path(track_path))
+        self.fields[directory] = (album, year_recorded, orchestra, conductor, disc_number)
+        return self.fields[directory]
+
 ################################################################################
 ### Process track tag: Parse title tag into fields: work, work_number, 
 ### initial_key, catalog_number, opus, opus_number, epithet, movement
 ### OR extract from file tags
 ################################################################################
 
+# The movement follows the last ' - ' which is followed by a Roman numeral
+MOVEMENT_PATTERN = re.compile(r'(.+)\s-\s([IVXLCDM]+?\.\s.+)')
+
 def parse_movement_from_title(work):
     """
     Extract movement from a work title string.
@@ -292,7 +485,7 @@ def parse_movement_from_title(work):
     Returns:
         tuple: (work_without_movement, movement), where movement may be None
     """
-    work_match = re.search(r'(.+)\s-\s([IVXLCDM]+?\.\s.+)', work)
+    work_match = MOVEMENT_PATTERN.search(work)
     if work_match:
         work = work_match.group(1)
         movement = work_match.group(2)
@@ -419,7 +612,300 @@ def parse_initialkey_from_title(work):
         initial_key = None
     return work, initial_key
     
-def parse_fields_from_title_tag(track_path):
+def parse_work_fields_stepwise(work):
+    """
+    Parse the fields of a title tag which precede the movement, one field at a time.
+    Handles any title, including those which do not match TITLE_PATTERN.
+
+    Args:
+        work (str): Title tag with the movement removed, see parse_movement_from_title.
+            Looks like: Work, Work Number, in Initial Key, 'Epithet', Catalog #, Opus, Opus Number
+
+    Returns:
+        tuple: (work, work_number, initial_key, catalog_number, opus, opus_number, epithet)
+    """
+
+    # EPITHET - will be in quotes, preceding comma may be optional
+    work, epithet = parse_epithet_from_title(work)
+    # Now looks like: Work, Work Number in Initial Key, Catalog #, Opus, Opus Number
+
+    # NUMBER - begins with NO // OPUS - begins with Op
+    work, work_number, opus, opus_number = parse_opus_opusnumber_worknumber_from_title(work)
+    # Now looks like: Work in Initial Key, Catalog #
+
+    # CATALOG # - variable. But with OPUS, NUMBER, NAME, MOVEMENT all removed, CATALOG # should be what remains after the final comma
+    work, catalog_number = parse_catalog_from_title(work)
+    # Now looks like: Work in Initial Key
+
+    # INITIALKEY - begins with valid keys (A through G) and terminates (major key) or indicates minor key (ends with minor, or -flat, or -sharp)
+    work, initial_key = parse_initialkey_from_title(work)
+    # Now looks like: Work
+
+    # WORK - whatever remains. Strip trailing comma if necessary
+    if work.endswith(','):
+        work = work.rstrip(',')
+
+    return work, work_number, initial_key, catalog_number, opus, opus_number, epithet
+
+# Single-pass grammar for the hand-tagged title format:
+# Work, Work Number, in Initial Key, 'Epithet', Catalog #, Opus, Opus Number - I. Movement
+# Titles which match give the same fields as the step-by-step parse. Layouts where the
+# step-by-step parse gives something else (e.g., an epithet at the end of the title) are
+# not matched, and are left to parse_work_fields_stepwise.
+MOVEMENT_MARK = r"\s-\s[IVXLCDM]+\.\s"
+TITLE_PATTERN = re.compile(r"""
+    (?P<work>(?:(?!\sin\s[A-G](?![^\s,'-])|\sNo\s\d|\sOp\s\d|""" + MOVEMENT_MARK + r""")[^,'])+?)
+    (?:\s(?P<work_number>No\s\d+))?
+    (?:\sin\s(?P<initial_key>[A-G](?:\sminor|-flat|-sharp)?))?
+    (?:,?\s'(?P<epithet>(?:(?!""" + MOVEMENT_MARK + r""")[^'])+)')?
+    (?:,\s(?P<opus>Op\s\d+)(?:\s(?P<opus_number>No\s\d+))?)?
+    (?:,\s(?P<catalog_number>(?!No\s\d|Op\s\d|-\s[IVXLCDM]+\.\s|\s)(?:(?!\sNo\s\d|\sOp\s\d|""" + MOVEMENT_MARK + r""")[^,'])*\d))?
+    (?:\s-\s(?P<movement>[IVXLCDM]+\.(?!""" + MOVEMENT_MARK + r""")\s(?:(?!""" + MOVEMENT_MARK + r""").)+))?
+    """, re.VERBOSE)
+
+def parse_title_single_pass(title):
+    """
+    Parse a title tag into its fields in a single pass with TITLE_PATTERN.
+
+    Args:
+        title (str): Title tag, with or without the movement.
+
+    Returns:
+        tuple: (work, work_number, initial_key, catalog_number, opus, opus_number, epithet, movement),
+            or None if the title is not in a layout handled by TITLE_PATTERN
+    """
+    match = TITLE_PATTERN.fullmatch(title)
+    if match is None:
+        return None
+    fields = match.group('work', 'work_number', 'initial_key', 'catalog_number', 'opus', 'opus_number',
+                         'epithet', 'movement')
+    work, work_number, initial_key, catalog_number, opus, opus_number, epithet, movement = fields
+    # Without a catalog # or opus after it, the step-by-step parse keeps the epithet in the work
+    if epithet is not None and opus is None and catalog_number is None:
+        return None
+    # The step-by-step parse drops a major key followed by a work number and an opus, but no catalog #
+    if initial_key is not None and len(initial_key) == 1 and work_number is not None and opus is not None \
+            and catalog_number is None:
+        return None
+    return fields
+
+def parse_title_stepwise(title):
+    """
+    Parse a title tag into its fields one at a time, as parse_fields_from_title_tag does
+    for titles which do not match TITLE_PATTERN.
+
+    Args:
+        title (str): Title tag.
+
+    Returns:
+        tuple: (work, work_number, initial_key, catalog_number, opus, opus_number, epithet, movement)
+    """
+    work, movement = parse_movement_from_title(title)
+    return parse_work_fields_stepwise(work) + (movement,)
+
+# Dataframe columns of the fields parsed from the title tag, in the order returned by parse_title_single_pass
+TITLE_COLUMNS = ['Work', 'Work Number', 'InitialKey', 'Catalog #', 'Opus', 'Opus Number', 'Epithet', 'Movement']
+TITLE_GROUPS = ['work', 'work_number', 'initial_key', 'catalog_number', 'opus', 'opus_number', 'epithet', 'movement']
+# Series.str.extract searches, so the pattern is anchored at both ends
+TITLE_EXTRACT_PATTERN = re.compile(r"\A(?:" + TITLE_PATTERN.pattern + r")\Z", re.VERBOSE)
+
+def parse_titles(titles):
+    """
+    Parse many title tags at once.
+
+    Vectorized version of parse_fields_from_title_tag, for titles which are already in a
+    Series, e.g., from a previous export or from the original_tags table of DataManager.
+    The movements are split off with Series.str.extract. The rest of the title is the same
+    for every movement of a work, so each distinct work is parsed once: those in the usual
+    layout together with Series.str.extract, and the others one by one with
+    parse_work_fields_stepwise. The fields are the same as those of parse_fields_from_title_tag.
+
+    Args:
+        titles (pd.Series): Title tags. Missing titles (None or NaN) give empty fields.
+
+    Returns:
+        pd.DataFrame: Fields of each title, with the index of titles and TITLE_COLUMNS as
+            columns. Empty fields are None.
+    """
+    import pandas as pd
+    # With the object dtype, str.extract uses the re module, which supports the lookaheads of TITLE_PATTERN
+    titles = titles.astype(object)
+    movements = titles.str.extract(MOVEMENT_PATTERN)
+    works = movements[0].where(movements[0].notna(), titles)
+
+    # Parse each work once
+    unique_works = pd.Series(works.dropna().unique(), dtype=object)
+    work_fields = unique_works.str.extract(TITLE_EXTRACT_PATTERN)[TITLE_GROUPS]
+    work_fields.columns = TITLE_COLUMNS
+    work_fields = work_fields.astype(object).where(work_fields.notna(), None)
+    # Works which parse_work_fields leaves to the step-by-step parse
+    stepwise = work_fields['Work'].isna() | work_fields['Movement'].notna() \
+        | (work_fields['Epithet'].notna() & work_fields['Opus'].isna() & work_fields['Catalog #'].isna()) \
+        | ((work_fields['InitialKey'].str.len() == 1) & work_fields['Work Number'].notna()
+           & work_fields['Opus'].notna() & work_fields['Catalog #'].isna())
+    if stepwise.any():
+        work_fields.loc[stepwise, TITLE_COLUMNS[:7]] = pd.DataFrame(
+            [parse_work_fields_stepwise(work) for work in unique_works[stepwise]],
+            index=work_fields.index[stepwise], columns=TITLE_COLUMNS[:7], dtype=object)
+
+    # Copy the fields of each work to its movements. Missing titles take the last, empty row
+    empty_row = pd.DataFrame([[None] * len(TITLE_COLUMNS)], columns=TITLE_COLUMNS, dtype=object)
+    work_fields = pd.concat([work_fields, empty_row], ignore_index=True)
+    positions = pd.Index(unique_works).get_indexer(works)
+    fields = work_fields.iloc[positions].set_index(titles.index)
+    fields['Movement'] = pd.Series([movement if isinstance(movement, str) else None for movement in movements[1]],
+                                   index=fields.index, dtype=object)
+    return fields
+
+def parse_work_fields(work):
+    """
+    Parse the fields of a title tag which precede the movement.
+
+    Args:
+        work (str): Title tag with the movement removed, see parse_movement_from_title.
+            Looks like: Work, Work Number, in Initial Key, 'Epithet', Catalog #, Opus, Opus Number
+
+    Returns:
+        tuple: (work, work_number, initial_key, catalog_number, opus, opus_number, epithet)
+    """
+    fields = parse_title_single_pass(work)
+    if fields is not None and fields[7] is None:
+        return fields[:7]
+    return parse_work_fields_stepwise(work)
+
+# Bump when parse_work_fields changes, so that saved title caches are discarded
+TITLE_CACHE_VERSION = 1
+
+class TitleCache:
+    """
+    Bounded LRU cache of parse_work_fields, keyed by the title with the movement removed.
+
+    All movements of a work share the same title before the movement, e.g.,
+    "Symphony No 41 in C, 'Jupiter', K 551", so the work is parsed once and the
+    fields are reused for the other movements. The cache can be saved to a JSON
+    file and loaded on the next run. It is safe to share between threads.
+
+    Attributes:
+        maxsize (int): Maximum number of entries. The least recently used entry is dropped first.
+        entries (collections.OrderedDict): Maps titles to the tuples returned by parse_work_fields.
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups which parsed the title.
+        new_entries (list): If not None, (title, fields) pairs are appended here as they are
+            parsed. Used by worker processes to send their entries to the parent.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.new_entries = None
+        self._lock = threading.Lock()
+
+    def parse(self, work):
+        """
+        Get the fields of a title, parsing it if it is not in the cache.
+
+        Args:
+            work (str): Title tag with the movement removed.
+
+        Returns:
+            tuple: (work, work_number, initial_key, catalog_number, opus, opus_number, epithet)
+        """
+        with self._lock:
+            fields = self.entries.get(work)
+            if fields is not None:
+                self.entries.move_to_end(work)
+                self.hits += 1
+                return fields
+        fields = parse_work_fields(work)
+        with self._lock:
+            self.misses += 1
+            if self.new_entries is not None:
+                self.new_entries.append((work, fields))
+            self._add(work, fields)
+        return fields
+
+    def _add(self, work, fields):
+        self.entries[work] = fields
+        self.entries.move_to_end(work)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def update(self, entries, hits=0, misses=0):
+        """
+        Add entries and counts, e.g., those of a worker process.
+
+        Args:
+            entries (iterable): (title, fields) pairs.
+            hits (int): Number of hits to add.
+            misses (int): Number of misses to add.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for work, fields in entries:
+                self._add(work, tuple(fields))
+            self.hits += hits
+            self.misses += misses
+
+    def load(self, cache_file):
+        """
+        Load the entries saved by a previous run. Missing files, unreadable files and
+        files written by a different version of the parser are ignored.
+
+        Args:
+            cache_file (str): Path to the JSON file.
+
+        Returns:
+            int: Number of entries loaded.
+        """
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if not isinstance(data, dict) or data.get('version') != TITLE_CACHE_VERSION:
+            return 0
+        entries = data.get('entries', [])[-self.maxsize:]
+        self.update(entries)
+        return len(entries)
+
+    def save(self, cache_file):
+        """
+        Save the entries, from least to most recently used.
+
+        Args:
+            cache_file (str): Path to the JSON file.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            entries = [[work, list(fields)] for work, fields in self.entries.items()]
+        # Write to a temporary file first, so that an interrupted run does not leave a truncated cache
+        temp_file = cache_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': TITLE_CACHE_VERSION, 'entries': entries}, f, ensure_ascii=False)
+        os.replace(temp_file, cache_file)
+
+def report_title_cache(title_cache):
+    """
+    Log the hit and miss counts of the title cache.
+
+    Args:
+        title_cache (TitleCache): Title cache of the run.
+
+    Returns:
+        None
+    """
+    total = title_cache.hits + title_cache.misses
+    hit_rate = title_cache.hits / total if total else 0
+    logger.info("Title cache: %d hits, %d misses (%.1f%% hit rate), %d entries",
+                title_cache.hits, title_cache.misses, hit_rate * 100, len(title_cache.entries))
+
+def parse_fields_from_title_tag(track_path, title_cache=None):
     """
     Extract track info from the track_path.
 
@@ -444,8 +930,13 @@ def parse_fields_from_title_tag(track_path):
     Finally, the initial key is extracted, leaving:
     Work
 
+    Titles in the usual layout are parsed in a single pass with TITLE_PATTERN instead,
+    which gives the same fields. With a title cache, the title is split at the movement,
+    and the rest is parsed once per work.
+
     Args:
-        track_path (str): Path to the FLAC audio file
+        track_path (str or TrackMetadata): Path to the FLAC audio file, or a snapshot of its metadata
+        title_cache (TitleCache): Optional. Reuse the fields of other movements of the same work.
         
     Returns:
         tuple: track_number, work, work_number, initial_key, catalog_number, opus, opus_number, epithet, movement
@@ -454,46 +945,38 @@ def parse_fields_from_title_tag(track_path):
         Any tag that cannot be read will return None for that field
     """
 
-    logging.info(f"{track_path}: Track tag exists. Attempting to extract fields from title tag.")
+    count_parse_path('title_parsed')
+    logger.debug("%s: Track tag exists. Attempting to extract fields from title tag.", get_track_path(track_path))
 
-    audio_file = mutagen.flac.FLAC(track_path)
+    audio_file = get_track_metadata(track_path)
     work = audio_file['title'][0]
 
-    # Attempt to parse the track string. The hand-tagged format of the 'title' tag is:
-    
+    # Without a cache, most titles are parsed in a single pass
+    if title_cache is None:
+        fields = parse_title_single_pass(work)
+        if fields is not None:
+            return fields
 
     # MOVEMENT - will follow a hyphen and begin with a Roman numeral. Occurs at the end of the string
     work, movement = parse_movement_from_title(work)
     # Now looks like: Work, Work Number, in Initial Key, 'Epithet', Catalog #, Opus, Opus Number
 
-    # EPITHET - will be in quotes, preceding comma may be optional
-    work, epithet = parse_epithet_from_title(work)
-    # Now looks like: Work, Work Number in Initial Key, Catalog #, Opus, Opus Number
-
-    # NUMBER - begins with NO // OPUS - begins with Op
-    work, work_number, opus, opus_number = parse_opus_opusnumber_worknumber_from_title(work)
-    # Now looks like: Work in Initial Key, Catalog #
-
-    # CATALOG # - variable. But with OPUS, NUMBER, NAME, MOVEMENT all removed, CATALOG # should be what remains after the final comma
-    work, catalog_number = parse_catalog_from_title(work)
-    # Now looks like: Work in Initial Key
-
-    # INITIALKEY - begins with valid keys (A through G) and terminates (major key) or indicates minor key (ends with minor, or -flat, or -sharp)
-    work, initial_key = parse_initialkey_from_title(work)
-    # Now looks like: Work
-
-    # WORK - whatever remains. Strip trailing comma if necessary
-    if work.endswith(','):
-        work = work.rstrip(',')
+    # The rest is the same for every movement of the work. Without a cache, the single pass
+    # has already failed on this title, so parse it step by step
+    if title_cache is not None:
+        work, work_number, initial_key, catalog_number, opus, opus_number, epithet = title_cache.parse(work)
+    else:
+        work, work_number, initial_key, catalog_number, opus, opus_number, epithet = parse_work_fields_stepwise(work)
     
     return work, work_number, initial_key, catalog_number, opus, opus_number, epithet, movement
     
 def get_tags_from_file_without_title_tag(track_path):
 
-    logging.info(f"{track_path}: Track tag does not exist. Attempting to extract from file tags.")
+    count_parse_path('title_missing')
+    logger.debug("%s: Track tag does not exist. Attempting to extract from file tags.", get_track_path(track_path))
 
     # Extract album, year_recorded, orchestra, conductor
-    audio_file = mutagen.flac.FLAC(track_path)
+    audio_file = get_track_metadata(track_path)
     # Track number
     try:
         track_number = audio_file['tracknumber'][0]
@@ -544,27 +1027,33 @@ def get_tags_from_file_without_title_tag(track_path):
 
 # Master function that integrates the above functions: get_track_string_from_track_path, 
 # parse_fields_from_matching_track_string, get_tags_from_file_with_unmatched_track_string
-def get_track_fields_from_track_path(track_path):
+def get_track_fields_from_track_path(track_path, title_cache=None, parse_title=True):
     """
     Extract track information from the track path
 
     Args:
-        track_path (str): Path to the track file.
+        track_path (str or TrackMetadata): Path to the track file, or a snapshot of its metadata.
+        title_cache (TitleCache): Optional. Reuse the fields of other movements of the same work.
+        parse_title (bool): If False, the fields of a title tag are left empty, to be parsed
+            later with the titles of other tracks, see parse_titles.
     
     Returns:
         tuple: (track_number, work, work_number, initial_key, catalog_number, opus, opus_number, epithet, movement)
     """
 
     # Attempt to read the title string:
-    audio_file = mutagen.flac.FLAC(track_path)
+    audio_file = get_track_metadata(track_path)
     # If it exists, extract tags from the title tag. Falling back to reading tags directly from the file if necessary
-    if 'title' in audio_file.tags:
+    if 'title' in audio_file and not parse_title:
+        count_parse_path('title_parsed')
+        work, work_number, initial_key, catalog_number, opus, opus_number, epithet, movement = (None,) * 8
+    elif 'title' in audio_file:
         work, work_number, initial_key, catalog_number, opus, \
-            opus_number, epithet, movement = parse_fields_from_title_tag(track_path)
+            opus_number, epithet, movement = parse_fields_from_title_tag(audio_file, title_cache)
     # Otherwise, extract tags directly from the file
     else:
         work, work_number, initial_key, catalog_number, opus, \
-            opus_number, epithet, movement = get_tags_from_file_without_title_tag(track_path)
+            opus_number, epithet, movement = get_tags_from_file_without_title_tag(audio_file)
     # Finally, read the track number from the 'tracknumber' tag
     try:
         track_number = audio_file['tracknumber'][0]
@@ -583,7 +1072,7 @@ def get_genre_composer_tags_from_file(track_path):
     Extract track metadata from FLAC file tags
     
     Args:
-        track_path (str): Path to the FLAC audio file
+        track_path (str or TrackMetadata): Path to the FLAC audio file, or a snapshot of its metadata
         
     Returns:
         tuple: (genre, composer)
@@ -593,7 +1082,7 @@ def get_genre_composer_tags_from_file(track_path):
     """
 
     # Extract genre, composer
-    audio_file = mutagen.flac.FLAC(track_path)
+    audio_file = get_track_metadata(track_path)
     # Album
     try:
         genre = audio_file['genre'][0]
@@ -611,12 +1100,510 @@ def get_genre_composer_tags_from_file(track_path):
 ### Master function to get track- and album-level tags
 ################################################################################
 
-def get_tags(tags_df, data_mgr = None):
+def get_track_tags(track_path, album_cache=None, title_cache=None, parse_title=True):
+    """
+    Extract album- and track-level tags for a single track.
+
+    Args:
+        track_path (str or TrackMetadata): Path to the track file, or a snapshot of its metadata.
+        album_cache (AlbumFieldCache): Optional. Reuse the album fields of other tracks in the same folder.
+        title_cache (TitleCache): Optional. Reuse the fields of other movements of the same work.
+        parse_title (bool): If False, the title tag is not parsed. It is returned as 'Title',
+            and the fields from the title tag are left empty, see parse_titles_in_batches.
+
+    Returns:
+        dict: Tags of the track, keyed by the dataframe column names.
+    """
+
+    # Open the file once and share the metadata with all of the functions below
+    track = get_track_metadata(track_path)
+
+    # Get album info and disc number from path structure
+    with profiling.stage('parse_album'):
+        if album_cache is not None:
+            album, year_recorded, orchestra, conductor, disc_number = album_cache.get_album_fields(track)
+        else:
+            album, year_recorded, orchestra, conductor = get_album_fields_from_track_path(track)
+            disc_number = get_disc_number_from_track_path(track.track_path)
+
+    # Get track info from path structure
+    with profiling.stage('parse_title'):
+        track_number, work, work_number, initial_key, catalog_number, opus, \
+            opus_number, epithet, movement = get_track_fields_from_track_path(track, title_cache, parse_title)
+
+    # Get genre and composer from file tags
+    with profiling.stage('parse_tags'):
+        genre, composer = get_genre_composer_tags_from_file(track)
+
+    # Same order as READ_COLUMNS
+    tags = {'Album': album, 'Year Recorded': year_recorded, 'Orchestra': orchestra,
+            'Conductor': conductor, 'DiscNumber': disc_number, 'TrackNumber': track_number,
+            'Work': work, 'Work Number': work_number, 'InitialKey': initial_key,
+            'Catalog #': catalog_number, 'Opus': opus, 'Opus Number': opus_number,
+            'Epithet': epithet, 'Movement': movement, 'Genre': genre, 'Composer': composer}
+    if not parse_title:
+        tags['Title'] = track['title'][0] if 'title' in track else None
+    return tags
+
+def group_tracks_by_directory(track_path_list):
+    """
+    Group tracks by the directory that contains them, keeping the order of the tracks.
+
+    Args:
+        track_path_list (list): List of track file paths.
+
+    Returns:
+        list: List of lists of track file paths, one per directory.
+    """
+    groups = {}
+    for track_path in track_path_list:
+        groups.setdefault(os.path.dirname(track_path), []).append(track_path)
+    return list(groups.values())
+
+# Title cache of a worker process, set up by init_worker_process
+_worker_title_cache = None
+
+def read_directory(track_path_list, store_all_tags=False, title_cache=None, defer_titles=False):
+    """
+    Extract tags for the tracks of one directory. Runs in a worker of the parallel read mode.
+
+    Errors are caught per track, so that one bad file does not fail the whole directory.
+
+    Args:
+        track_path_list (list): List of track file paths.
+        store_all_tags (bool): Also return all tags of each file, for DataManager.
+        title_cache (TitleCache): Optional. Title cache shared by the worker threads. Worker
+            processes use the cache set up by init_worker_process instead.
+        defer_titles (bool): Return the title tags unparsed, see get_track_tags.
+
+    Returns:
+        tuple: (worker_id, results, cache_counts, parse_path_counts, title_cache_update, profile_update), where
+            results is a list of (track_path, tags, all_tags, error) tuples, and error is None on success.
+            cache_counts is (hits, misses) of the album field cache.
+            parse_path_counts is a dict of counts by parsing path.
+            title_cache_update is (new_entries, hits, misses) of the title cache of a worker
+            process, to be added to the cache of the parent, or None.
+            profile_update is a snapshot of the profiler of a worker process, to be merged
+            into the profiler of the parent, or None.
+    """
+    results = []
+    album_cache = AlbumFieldCache()
+    parse_path_counts = start_parse_path_counts()
+    in_worker_process = title_cache is None and _worker_title_cache is not None
+    if in_worker_process:
+        title_cache = _worker_title_cache
+        title_cache.new_entries = []
+        title_hits, title_misses = title_cache.hits, title_cache.misses
+    for track_path in track_path_list:
+        try:
+            track = get_track_metadata(track_path)
+            all_tags = track.all_tags() if store_all_tags else None
+            tags = get_track_tags(track, album_cache, title_cache, parse_title=not defer_titles)
+            results.append((track_path, tags, all_tags, None))
+        except Exception as e:
+            results.append((track_path, None, None, f"{type(e).__name__}: {e}"))
+    title_cache_update = None
+    profile_update = None
+    if in_worker_process:
+        title_cache_update = (title_cache.new_entries, title_cache.hits - title_hits,
+                              title_cache.misses - title_misses)
+        # Worker threads record into the profiler of the parent directly
+        if profiling.get_active() is not None:
+            profile_update = profiling.get_active().snapshot(reset=True)
+    worker_id = f"{os.getpid()}-{threading.get_ident()}"
+    return worker_id, results, (album_cache.hits, album_cache.misses), dict(parse_path_counts), title_cache_update, \
+        profile_update
+
+def init_worker_logging():
+    """
+    Drop the log handlers a worker process inherits from tagger.py.
+
+    The inherited handler puts records on a queue which is only read in the parent
+    process. Workers return failures and parsing counts to the parent, which logs them.
+
+    Returns:
+        None
+    """
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.NullHandler())
+
+def init_worker_process(title_cache_entries, title_cache_size, profile=False):
+    """
+    Set up a worker process: drop the inherited log handlers, and create a title cache
+    holding the entries of the parent.
+
+    Args:
+        title_cache_entries (list): (title, fields) pairs of the title cache of the parent.
+        title_cache_size (int): Maximum number of entries of the title cache.
+        profile (bool): Record stage times and counters, returned by read_directory.
+
+    Returns:
+        None
+    """
+    global _worker_title_cache
+    init_worker_logging()
+    _worker_title_cache = TitleCache(title_cache_size)
+    _worker_title_cache.update(title_cache_entries)
+    # A forked worker inherits the profiler of the parent; start from zero instead
+    profiling.activate(profiling.Profiler() if profile else None)
+
+def iter_tracks_parallel(track_path_list, workers, worker_type='process', store_all_tags=False, summary=None,
+                         title_cache=None, defer_titles=False):
+    """
+    Extract tags for a list of tracks with a pool of workers, yielding tracks as they are read.
+
+    Tracks are grouped by directory, and each directory is handled by a single worker.
+    Directories are yielded in the order they appear in track_path_list, so the output
+    does not depend on worker timing.
+
+    Args:
+        track_path_list (list): List of track file paths.
+        workers (int): Number of workers.
+        worker_type (str): 'process' or 'thread'. Threads suit file systems where
+            reading is limited by I/O latency (e.g., network shares).
+        store_all_tags (bool): Also return all tags of each file, for DataManager.
+        summary (dict): Optional. Filled with
+            failures (dict): Maps track paths to error messages.
+            worker_counts (dict): Maps worker ids to (tracks read, tracks failed).
+            cache_counts (tuple): (hits, misses) of the album field caches of all workers.
+            parse_path_counts (collections.Counter): Counts by parsing path of all workers.
+        title_cache (TitleCache): Optional. Title cache, shared by worker threads, or copied to
+            each worker process and updated with the entries the workers add.
+        defer_titles (bool): Return the title tags unparsed, see get_track_tags.
+
+    Yields:
+        tuple: (track_path, tags, all_tags) for each track which was read successfully.
+    """
+    if title_cache is None:
+        title_cache = TitleCache()
+    if worker_type == 'process':
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker_process,
+            initargs=(list(title_cache.entries.items()), title_cache.maxsize, profiling.get_active() is not None))
+        # Each worker process has its own copy of the title cache
+        shared_title_cache = None
+    elif worker_type == 'thread':
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        shared_title_cache = title_cache
+    else:
+        raise ValueError("Invalid worker type. Choose 'process' or 'thread'.")
+
+    if summary is None:
+        summary = {}
+    failures = summary.setdefault('failures', {})
+    worker_counts = summary.setdefault('worker_counts', {})
+    cache_hits, cache_misses = summary.setdefault('cache_counts', (0, 0))
+    parse_path_counts = summary.setdefault('parse_path_counts', collections.Counter())
+    groups = group_tracks_by_directory(track_path_list)
+
+    with executor:
+        futures = [executor.submit(read_directory, group, store_all_tags, shared_title_cache, defer_titles)
+                   for group in groups]
+        with tqdm(total=len(track_path_list), desc="Reading tags") as progress:
+            for group, future in zip(groups, futures):
+                try:
+                    worker_id, group_results, (hits, misses), group_parse_path_counts, \
+                        title_cache_update, profile_update = future.result()
+                    parse_path_counts.update(group_parse_path_counts)
+                    if title_cache_update is not None:
+                        title_cache.update(*title_cache_update)
+                    if profile_update is not None and profiling.get_active() is not None:
+                        profiling.get_active().merge(profile_update)
+                    cache_hits += hits
+                    cache_misses += misses
+                    summary['cache_counts'] = (cache_hits, cache_misses)
+                # If the worker itself died, every track of the directory failed
+                except Exception as e:
+                    worker_id = 'unknown'
+                    group_results = [(track_path, None, None, f"{type(e).__name__}: {e}") for track_path in group]
+                read_count, failed_count = worker_counts.get(worker_id, (0, 0))
+                for track_path, tags, all_tags, error in group_results:
+                    if error is None:
+                        read_count += 1
+                    else:
+                        failures[track_path] = error
+                        failed_count += 1
+                worker_counts[worker_id] = (read_count, failed_count)
+                progress.update(len(group))
+                for track_path, tags, all_tags, error in group_results:
+                    if error is None:
+                        yield track_path, tags, all_tags
+    summary['cache_counts'] = (cache_hits, cache_misses)
+
+def read_tracks_parallel(track_path_list, workers, worker_type='process', store_all_tags=False):
+    """
+    Extract tags for a list of tracks with a pool of workers.
+
+    Args:
+        track_path_list (list): List of track file paths.
+        workers (int): Number of workers.
+        worker_type (str): 'process' or 'thread'.
+        store_all_tags (bool): Also return all tags of each file, for DataManager.
+
+    Returns:
+        tuple: (results, failures, worker_counts, cache_counts)
+            results (dict): Maps track paths to (tags, all_tags) for successfully read tracks.
+            failures (dict): Maps track paths to error messages.
+            worker_counts (dict): Maps worker ids to (tracks read, tracks failed).
+            cache_counts (tuple): (hits, misses) of the album field caches of all workers.
+    """
+    summary = {}
+    results = {}
+    for track_path, tags, all_tags in iter_tracks_parallel(track_path_list, workers, worker_type,
+                                                           store_all_tags, summary):
+        results[track_path] = (tags, all_tags)
+    return results, summary['failures'], summary['worker_counts'], summary['cache_counts']
+
+def report_read_failures(failures, worker_counts):
+    """
+    Print and log a summary of the parallel read mode.
+
+    Args:
+        failures (dict): Maps track paths to error messages.
+        worker_counts (dict): Maps worker ids to (tracks read, tracks failed).
+
+    Returns:
+        None
+    """
+    for worker_id, (read_count, failed_count) in sorted(worker_counts.items()):
+        print(f"Worker {worker_id}: {read_count} files read, {failed_count} failed")
+    for track_path in sorted(failures):
+        logger.error("%s: Failed to read tags. %s", track_path, failures[track_path])
+    if failures:
+        print(f"Failed: {len(failures)} files. See the log for details.")
+
+def fill_tags_dataframe(tags_df, records):
+    """
+    Fill the dataframe with the tags of each track.
+
+    The records are turned into one array per column, and each column is assigned once.
+    This avoids a scalar .loc assignment per track and column, which is slow for large libraries.
+
+    Args:
+        tags_df (pd.DataFrame): DataFrame with track paths as index and columns for tags.
+        records (dict): Maps track paths to dicts of tags, as returned by get_track_tags.
+            Tracks without a record (e.g., because they could not be read) are left empty.
+
+    Returns:
+        pd.DataFrame: Updated DataFrame with extracted tags.
+    """
+    import pandas as pd
+    track_records = [records.get(track_path) for track_path in tags_df.index]
+    for column in READ_COLUMNS:
+        values = [record[column] if record is not None else None for record in track_records]
+        # Keep the object dtype, so that missing tags stay None
+        tags_df[column] = pd.Series(values, index=tags_df.index, dtype=object)
+    return tags_df
+
+def report_album_cache(hits, misses):
+    """
+    Log the hit and miss counts of the album field cache.
+
+    Args:
+        hits (int): Number of lookups answered from the cache.
+        misses (int): Number of lookups which computed the fields.
+
+    Returns:
+        None
+    """
+    total = hits + misses
+    hit_rate = hits / total if total else 0
+    logger.info("Album field cache: %d hits, %d misses (%.1f%% hit rate)", hits, misses, hit_rate * 100)
+
+def iter_tracks_serial(track_path_list, store_all_tags=False, title_cache=None, defer_titles=False):
+    """
+    Extract tags for a list of tracks, one after the other.
+
+    Args:
+        track_path_list (list): List of track file paths.
+        store_all_tags (bool): Also return all tags of each file, for DataManager and the scan cache.
+        title_cache (TitleCache): Optional. Title cache to use; a new one is used if not given.
+        defer_titles (bool): Return the title tags unparsed, see get_track_tags.
+
+    Yields:
+        tuple: (track_path, tags, all_tags) for each track.
+    """
+    if title_cache is None:
+        title_cache = TitleCache()
+    album_cache = AlbumFieldCache()
+    parse_path_counts = start_parse_path_counts()
+    for track_path in tqdm(track_path_list, total=len(track_path_list), desc="Reading tags"):
+
+        # Open the file once and share the metadata with all of the functions below
+        track = get_track_metadata(track_path)
+
+        # If requested, read all audio tags
+        all_tags = track.all_tags() if store_all_tags else None
+
+        # Get album, disc, track, genre and composer info
+        yield track_path, get_track_tags(track, album_cache, title_cache, parse_title=not defer_titles), all_tags
+
+    report_album_cache(album_cache.hits, album_cache.misses)
+    report_parse_paths(parse_path_counts)
+
+def merge_tracks_in_order(track_path_list, cached, fresh, failures):
+    """
+    Merge cached tracks and freshly read tracks in the order of track_path_list.
+
+    Args:
+        track_path_list (list): List of track file paths.
+        cached (dict): Maps track paths to (tags, all_tags) for tracks taken from the scan cache.
+        fresh (iterator): Yields (track_path, tags, all_tags) for the other tracks.
+        failures (dict): Maps track paths to error messages. Filled by the fresh iterator
+            as it goes; failed tracks are skipped.
+
+    Yields:
+        tuple: (track_path, tags, all_tags)
+    """
+    pending = {}
+    for track_path in track_path_list:
+        if track_path in cached:
+            tags, all_tags = cached[track_path]
+            yield track_path, tags, all_tags
+            continue
+        # Workers may return tracks slightly out of order, so hold on to those which come early
+        while track_path not in pending and track_path not in failures:
+            try:
+                fresh_path, tags, all_tags = next(fresh)
+            except StopIteration:
+                break
+            pending[fresh_path] = (tags, all_tags)
+        if track_path in pending:
+            tags, all_tags = pending.pop(track_path)
+            yield track_path, tags, all_tags
+    # Let the fresh iterator finish, so that it can report and shut down its workers
+    for _ in fresh:
+        pass
+
+def parse_titles_in_batches(records, batch_size):
+    """
+    Fill in the fields of title tags which were not parsed when the tracks were read,
+    parsing the titles of batch_size tracks at a time with parse_titles.
+
+    Args:
+        records (iterator): Yields (track_path, tags, all_tags), where the tags of tracks read
+            with defer_titles hold the unparsed title tag as 'Title'. Other tracks, e.g., those
+            taken from the scan cache, are passed on unchanged.
+        batch_size (int): Number of tracks per batch.
+
+    Yields:
+        tuple: (track_path, tags, all_tags), in the order of records.
+    """
+    import pandas as pd
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return
+        titles = [tags.pop('Title', None) for _, tags, _ in batch]
+        with profiling.stage('parse_title'):
+            fields = parse_titles(pd.Series(titles, dtype=object))
+        rows = fields.itertuples(index=False, name=None)
+        for (track_path, tags, all_tags), title, values in zip(batch, titles, rows):
+            if title is not None:
+                tags.update(zip(TITLE_COLUMNS, values))
+            yield track_path, tags, all_tags
+
+def iter_tags(track_path_list, data_mgr = None, workers = 1, worker_type = 'process', scan_cache = None,
+              title_cache = None, title_batch_size = None, profiler = None):
+    """
+    Extract tags track by track, yielding each track as soon as it is parsed.
+
+    Nothing is kept in memory after a track has been yielded, so the records can be
+    written out incrementally (see stream.write_stream). Tracks are yielded in the
+    order of track_path_list.
+
+    Args:
+        track_path_list (list): List of track file paths.
+        data_mgr (DataManager): Optional. Archive the original tags of each file.
+        workers (int): Number of workers. With more than one worker, tracks which fail
+            are reported at the end and are not yielded.
+        worker_type (str): 'process' or 'thread', used when workers > 1.
+        scan_cache (ScanCache): Optional. Take unchanged files from the cache without
+            opening them, and store the tags of the files which were read.
+        title_cache (TitleCache): Optional. Title cache to use, e.g., one loaded from a
+            previous run. A new one is used if not given.
+        title_batch_size (int): Optional. Parse the title tags of this many tracks at once with
+            parse_titles, instead of track by track. The title cache is not used.
+        profiler (profiling.Profiler): Optional. Record the time spent in each stage, and counts of
+            file opens, bytes read and commits.
+
+    Yields:
+        tuple: (track_path, tags), where tags is a dict keyed by the dataframe column names.
+    """
+    with profiling.profile(profiler):
+        yield from _iter_tags(track_path_list, data_mgr, workers, worker_type, scan_cache, title_cache,
+                              title_batch_size)
+
+def _iter_tags(track_path_list, data_mgr, workers, worker_type, scan_cache, title_cache, title_batch_size):
+    """
+    Extract tags track by track. See iter_tags, which activates the profiler around this.
+    """
+    track_path_list = list(track_path_list)
+    cached = {}
+    if scan_cache is not None:
+        with profiling.stage('scan_cache'):
+            cached = scan_cache.lookup(track_path_list)
+        print(f"Scan cache: {len(cached)} unchanged files, {len(track_path_list) - len(cached)} files to read")
+    track_paths_to_read = [track_path for track_path in track_path_list if track_path not in cached]
+    store_all_tags = data_mgr is not None or scan_cache is not None
+
+    if title_cache is None:
+        title_cache = TitleCache()
+
+    summary = {'failures': {}}
+    defer_titles = title_batch_size is not None
+    if workers > 1:
+        fresh = iter_tracks_parallel(track_paths_to_read, workers, worker_type, store_all_tags, summary, title_cache,
+                                     defer_titles)
+    else:
+        fresh = iter_tracks_serial(track_paths_to_read, store_all_tags, title_cache, defer_titles)
+
+    records = merge_tracks_in_order(track_path_list, cached, fresh, summary['failures'])
+    if defer_titles:
+        records = parse_titles_in_batches(records, title_batch_size)
+    for track_path, tags, all_tags in records:
+        profiling.count('tracks')
+        # If data_mgr is provided, store all audio tags
+        if data_mgr:
+            with profiling.stage('data_manager'):
+                data_mgr.save_original_tags(track_path, all_tags)
+        if scan_cache is not None and track_path not in cached:
+            with profiling.stage('scan_cache'):
+                scan_cache.save(track_path, tags, all_tags)
+        yield track_path, tags
+
+    if workers > 1:
+        report_read_failures(summary['failures'], summary['worker_counts'])
+        report_album_cache(*summary['cache_counts'])
+        report_parse_paths(summary['parse_path_counts'])
+    report_title_cache(title_cache)
+    if scan_cache is not None:
+        # Directories whose tracks were all read can be skipped next time, if they are unchanged
+        failed_directories = {os.path.dirname(track_path) for track_path in summary['failures']}
+        directories = {os.path.dirname(track_path) for track_path in track_path_list}
+        with profiling.stage('scan_cache'):
+            scan_cache.save_directories(directories - failed_directories)
+
+def get_tags(tags_df, data_mgr = None, workers = 1, worker_type = 'process', scan_cache = None,
+             title_cache = None, title_batch_size = None, profiler = None):
     """
     Extract tags from file paths and update the dataframe.
 
     Args:
         tags_df (pd.DataFrame): DataFrame with track paths as index and columns for tags.
+        data_mgr (DataManager): Optional. Archive the original tags of each file.
+        workers (int): Number of workers. With more than one worker, tracks are read in
+            parallel, and tracks which fail are reported and left empty in the dataframe.
+        worker_type (str): 'process' or 'thread', used when workers > 1.
+        scan_cache (ScanCache): Optional. Take unchanged files from the cache without opening them.
+        title_cache (TitleCache): Optional. Title cache to use; a new one is used if not given.
+        title_batch_size (int): Optional. Collect the title tags and parse this many at once
+            with parse_titles, instead of track by track.
+        profiler (profiling.Profiler): Optional. Record the time spent in each stage, and counts of
+            file opens, bytes read and commits.
 
     Returns:
         pd.DataFrame: Updated DataFrame with extracted tags.
@@ -624,43 +1611,74 @@ def get_tags(tags_df, data_mgr = None):
 
     total_files = len(tags_df)    
     print(f"Processing {total_files} files...")
-    
-    for track_path in tqdm(tags_df.index, total=total_files, desc="Reading tags"):
 
-        # If data_mgr is provided, read and store all audio tags
-        if data_mgr:
-            audio_file = mutagen.flac.FLAC(track_path)
-            all_tags = dict(audio_file.tags)
-            data_mgr.save_original_tags(track_path, all_tags)
-
-        # Get album info from path structure
-        album, year_recorded, orchestra, conductor = get_album_fields_from_track_path(track_path)
-        tags_df.loc[track_path, 'Album'] = album
-        tags_df.loc[track_path, 'Year Recorded'] = year_recorded
-        tags_df.loc[track_path, 'Orchestra'] = orchestra
-        tags_df.loc[track_path, 'Conductor'] = conductor
-
-        # Get disc number from path structure
-        disc_number = get_disc_number_from_track_path(track_path)
-        tags_df.loc[track_path, 'DiscNumber'] = disc_number
-        
-        # Get track info from path structure
-        track_number, work, work_number, initial_key, catalog_number, opus, \
-            opus_number, epithet, movement = get_track_fields_from_track_path(track_path)
-        tags_df.loc[track_path, 'TrackNumber'] = track_number
-        tags_df.loc[track_path, 'Work'] = work
-        tags_df.loc[track_path, 'Work Number'] = work_number
-        tags_df.loc[track_path, 'InitialKey'] = initial_key
-        tags_df.loc[track_path, 'Catalog #'] = catalog_number
-        tags_df.loc[track_path, 'Opus'] = opus
-        tags_df.loc[track_path, 'Opus Number'] = opus_number
-        tags_df.loc[track_path, 'Epithet'] = epithet
-        tags_df.loc[track_path, 'Movement'] = movement
-    
-        # Get genre and composer from file tags
-        genre, composer = get_genre_composer_tags_from_file(track_path)
-        tags_df.loc[track_path, 'Genre'] = genre
-        tags_df.loc[track_path, 'Composer'] = composer
+    records = dict(iter_tags(list(tags_df.index), data_mgr, workers, worker_type, scan_cache, title_cache,
+                             title_batch_size, profiler))
 
+    # Build the columns once, rather than assigning each tag of each track
+    with profiling.profile(profiler), profiling.stage('fill_dataframe'):
+        tags_df = fill_tags_dataframe(tags_df, records)
     return tags_df
 
+################################################################################
+### Read in chunks: split the tracks into album-aligned chunks, so that the
+### tags of a large library do not have to be held in memory at once
+################################################################################
+
+def get_album_directory(track_path):
+    """
+    Get the album folder of a track: the folder containing it, or its parent for tracks
+    in a disc folder (see get_album_string_from_track_path).
+
+    Args:
+        track_path (str): Path to the track file.
+
+    Returns:
+        str: Path to the album folder.
+    """
+    directory = os.path.dirname(track_path)
+    if os.path.basename(directory).startswith(tuple(POSSIBLE_DISC_NAMES)):
+        return os.path.dirname(directory)
+    return directory
+
+def iter_album_chunks(records, chunk_size=None, max_memory=None, max_rows=excel.EXCEL_MAX_ROWS):
+    """
+    Group records into chunks which end at an album boundary.
+
+    A chunk ends once it holds at least chunk_size tracks, or once the resident memory of the
+    process has grown by more than max_memory since the chunk started, whichever comes first.
+    Growth is used rather than the total, as memory freed after a chunk is often not returned
+    to the operating system. The check is made when a new album starts, so the tracks of an
+    album stay together, unless an album on its own would exceed max_rows.
+
+    Args:
+        records (iterable): Yields (track_path, tags), e.g., read.iter_tags, with the tracks of
+            each album next to each other, as returned by get_flac_files.
+        chunk_size (int): Optional. Number of tracks after which a chunk ends.
+        max_memory (int): Optional. Growth of the resident memory in bytes after which a chunk ends.
+        max_rows (int): Maximum number of tracks in a chunk, e.g., the rows of an Excel sheet.
+
+    Yields:
+        list: (track_path, tags) tuples of a chunk.
+    """
+    chunk = []
+    album_directory = None
+    start_rss = memory.get_rss() if max_memory is not None else None
+    for track_path, tags in records:
+        track_album_directory = get_album_directory(track_path)
+        if chunk and track_album_directory != album_directory:
+            full = chunk_size is not None and len(chunk) >= chunk_size
+            if not full and start_rss is not None:
+                full = memory.get_rss() - start_rss > max_memory
+            if full:
+                yield chunk
+                chunk = []
+                start_rss = memory.get_rss() if max_memory is not None else None
+        # A chunk larger than max_rows could not be written, so split the album
+        if len(chunk) >= max_rows:
+            yield chunk
+            chunk = []
+        album_directory = track_album_directory
+        chunk.append((track_path, tags))
+    if chunk:
+        yield chunk
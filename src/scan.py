@@ -0,0 +1,150 @@
+################################################################################
+### scan.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Filesystem scanner shared by tagger.py and the scripts in utils/. Walks a
+### directory tree with os.scandir, keeping the extension (and, if requested,
+### the stat result) of each file, so callers can classify files in a single
+### pass. Top-level (album) directories can be scanned in parallel, which helps
+### on network shares where each directory listing is a round trip.
+### This module does not import its siblings, so it can be imported both from
+### src/ and from the scripts in utils/.
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import collections
+import concurrent.futures
+import os
+
+################################################################################
+### Define classes
+################################################################################
+
+# path: full path, as built by os.path.join(dirpath, name)
+# dirpath: directory containing the file
+# name: file name
+# ext: file extension, lowercase and including the dot (e.g., '.flac')
+# stat: os.stat_result of the file, or None if not requested
+FileEntry = collections.namedtuple('FileEntry', ['path', 'dirpath', 'name', 'ext', 'stat'])
+
+################################################################################
+### Define functions
+################################################################################
+
+def _scan_directory(dirpath, extensions, with_stat):
+    """
+    List the files and subdirectories of a single directory.
+
+    Args:
+        dirpath (str): Directory to list.
+        extensions (set): Lowercase extensions to keep, or None to keep all files.
+        with_stat (bool): Stat each file that is kept.
+
+    Returns:
+        tuple: (files, subdirectories), where files is a list of FileEntry and
+            subdirectories is a list of paths. Unreadable directories are skipped, as in os.walk.
+    """
+    files = []
+    subdirectories = []
+    try:
+        iterator = os.scandir(dirpath)
+    except OSError:
+        return files, subdirectories
+    with iterator:
+        for entry in iterator:
+            try:
+                # Do not follow links to directories, as in os.walk
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+                ext = os.path.splitext(entry.name)[1].lower()
+                if extensions is not None and ext not in extensions:
+                    continue
+                stat = entry.stat() if with_stat else None
+            except OSError:
+                continue
+            files.append(FileEntry(entry.path, dirpath, entry.name, ext, stat))
+    return files, subdirectories
+
+def _scan_tree(top, extensions, with_stat):
+    """
+    Recursively list the files below a directory.
+
+    Args:
+        top (str): Directory to scan.
+        extensions (set): Lowercase extensions to keep, or None to keep all files.
+        with_stat (bool): Stat each file that is kept.
+
+    Returns:
+        list: List of FileEntry, in no particular order.
+    """
+    files = []
+    pending = [top]
+    while pending:
+        directory_files, subdirectories = _scan_directory(pending.pop(), extensions, with_stat)
+        files.extend(directory_files)
+        pending.extend(subdirectories)
+    return files
+
+def scan_files(search_dir, extensions=None, workers=1, with_stat=False):
+    """
+    Recursively list the files in a directory.
+
+    Args:
+        search_dir (str): Directory to scan.
+        extensions (iterable): Optional. Only keep files with these extensions
+            (e.g., {'.flac'}). Extensions are matched case-insensitively.
+        workers (int): Number of threads. With more than one, each top-level
+            subdirectory is scanned by a separate thread.
+        with_stat (bool): Stat each file that is kept, and store the result in FileEntry.stat.
+
+    Returns:
+        list: List of FileEntry, sorted by directory and then by name.
+    """
+    if extensions is not None:
+        extensions = {ext.lower() for ext in extensions}
+
+    if workers > 1:
+        files, subdirectories = _scan_directory(search_dir, extensions, with_stat)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for subdirectory_files in executor.map(lambda top: _scan_tree(top, extensions, with_stat),
+                                                   subdirectories):
+                files.extend(subdirectory_files)
+    else:
+        files = _scan_tree(search_dir, extensions, with_stat)
+
+    # Files in a directory come before the files in its subdirectories, as in os.walk
+    return sorted(files, key=lambda entry: (entry.dirpath, entry.name))
+
+def group_by_extension(entries):
+    """
+    Group scanned files by extension.
+
+    Args:
+        entries (iterable): FileEntry objects, e.g., from scan_files.
+
+    Returns:
+        dict: Maps lowercase extensions to lists of FileEntry, in the order given.
+    """
+    groups = {}
+    for entry in entries:
+        groups.setdefault(entry.ext, []).append(entry)
+    return groups
+
+def group_by_directory(entries):
+    """
+    Group scanned files by the directory containing them.
+
+    Args:
+        entries (iterable): FileEntry objects, e.g., from scan_files.
+
+    Returns:
+        dict: Maps directory paths to lists of FileEntry, in the order given.
+    """
+    groups = {}
+    for entry in entries:
+        groups.setdefault(entry.dirpath, []).append(entry)
+    return groups
@@ -0,0 +1,213 @@
+################################################################################
+### scancache.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import json
+import os
+import sqlite3
+import profiling
+
+################################################################################
+### ScanCache Class
+### This class stores the parsed tags of each track in a SQLite database, so
+### that files which have not changed since the last read are not opened again.
+### A file is unchanged if its size, mtime and inode are the same. Optionally,
+### a directory whose mtime is unchanged, which has had no files added, removed
+### or renamed, has its tracks taken from the cache without checking each file.
+### Tags edited in place do not change the directory mtime, so this is opt-in.
+################################################################################
+
+# Bump when the parsing in read.py changes, so that stale entries are discarded
+SCAN_CACHE_VERSION = 1
+
+class ScanCache:
+    def __init__(self, db_file="scan_cache.db", verify_files=True, commit_interval=500):
+        """
+        Open (or create) the scan cache.
+
+        Args:
+            db_file (str): Path to the SQLite database file.
+            verify_files (bool): Check the size, mtime and inode of every file, even in
+                directories whose mtime is unchanged. Needed to catch tags edited in place,
+                by other programs or by write mode, which do not change the directory mtime.
+                If False, unchanged directories are trusted, which is faster on large libraries.
+            commit_interval (int): Number of new entries between commits.
+        """
+        self.db_file = db_file
+        self.verify_files = verify_files
+        self.commit_interval = commit_interval
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+        self._connect_db()
+
+    def _connect_db(self):
+        self.conn = sqlite3.connect(self.db_file)
+        self.cursor = self.conn.cursor()
+        self._create_tables()
+
+    def _create_tables(self):
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                filepath TEXT PRIMARY KEY,
+                directory TEXT,
+                size INTEGER,
+                mtime_ns INTEGER,
+                inode INTEGER,
+                tags TEXT,
+                all_tags TEXT
+            )
+        ''')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS files_directory ON files (directory)')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS directories (
+                dirpath TEXT PRIMARY KEY,
+                mtime_ns INTEGER
+            )
+        ''')
+        # Discard entries written by a different version of the parser
+        self.cursor.execute("SELECT value FROM meta WHERE key = 'version'")
+        result = self.cursor.fetchone()
+        if result is None or result[0] != str(SCAN_CACHE_VERSION):
+            self.cursor.execute('DELETE FROM files')
+            self.cursor.execute('DELETE FROM directories')
+            self.cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                                (str(SCAN_CACHE_VERSION),))
+        self.conn.commit()
+
+    def _get_directory_entries(self, directory):
+        self.cursor.execute('SELECT filepath, size, mtime_ns, inode, tags, all_tags FROM files WHERE directory = ?',
+                            (directory,))
+        return {row[0]: row[1:] for row in self.cursor.fetchall()}
+
+    def lookup(self, track_path_list):
+        """
+        Get the cached tags of the tracks which have not changed.
+
+        Args:
+            track_path_list (list): List of track file paths.
+
+        Returns:
+            dict: Maps track paths to (tags, all_tags) for the unchanged tracks.
+        """
+        cached = {}
+        groups = {}
+        # Entries are keyed by absolute path, so the cache works from any working directory
+        for track_path in track_path_list:
+            groups.setdefault(os.path.dirname(os.path.abspath(track_path)), []).append(track_path)
+
+        for directory, group in groups.items():
+            entries = self._get_directory_entries(directory)
+            if not entries:
+                self.misses += len(group)
+                continue
+            # If no files were added, removed or renamed, trust the cached entries
+            skip_files = False
+            if not self.verify_files:
+                self.cursor.execute('SELECT mtime_ns FROM directories WHERE dirpath = ?', (directory,))
+                result = self.cursor.fetchone()
+                try:
+                    skip_files = result is not None and result[0] == os.stat(directory).st_mtime_ns
+                except OSError:
+                    skip_files = False
+            for track_path in group:
+                entry = entries.get(os.path.abspath(track_path))
+                if entry is None:
+                    self.misses += 1
+                    continue
+                size, mtime_ns, inode, tags, all_tags = entry
+                if not skip_files:
+                    try:
+                        stat = os.stat(track_path)
+                    except OSError:
+                        self.misses += 1
+                        continue
+                    if (stat.st_size, stat.st_mtime_ns, stat.st_ino) != (size, mtime_ns, inode):
+                        self.misses += 1
+                        continue
+                cached[track_path] = (json.loads(tags), json.loads(all_tags))
+                self.hits += 1
+        return cached
+
+    def save(self, track_path, tags, all_tags):
+        """
+        Store the parsed tags of a track.
+
+        Args:
+            track_path (str): Path to the track file.
+            tags (dict): Tags of the track, keyed by the dataframe column names.
+            all_tags (dict): All tags of the file, as stored by DataManager.
+        """
+        track_path = os.path.abspath(track_path)
+        stat = os.stat(track_path)
+        self.cursor.execute('''
+            INSERT OR REPLACE INTO files (filepath, directory, size, mtime_ns, inode, tags, all_tags)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (track_path, os.path.dirname(track_path), stat.st_size, stat.st_mtime_ns, stat.st_ino,
+              json.dumps(tags), json.dumps(all_tags)))
+        self._pending += 1
+        if self._pending >= self.commit_interval:
+            self.commit()
+
+    def save_directories(self, directories):
+        """
+        Record the current mtime of directories whose tracks are all in the cache.
+
+        Args:
+            directories (iterable): Directory paths.
+        """
+        for directory in directories:
+            directory = os.path.abspath(directory)
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                continue
+            self.cursor.execute('INSERT OR REPLACE INTO directories (dirpath, mtime_ns) VALUES (?, ?)',
+                                (directory, mtime_ns))
+        self.commit()
+
+    def invalidate(self, search_dir=None):
+        """
+        Remove cached entries, so that the files are parsed again on the next read.
+
+        Args:
+            search_dir (str): Optional. Only remove entries at or below this directory.
+                All entries are removed if not given.
+
+        Returns:
+            int: Number of file entries removed.
+        """
+        if search_dir is None:
+            self.cursor.execute('DELETE FROM files')
+            removed = self.cursor.rowcount
+            self.cursor.execute('DELETE FROM directories')
+        else:
+            search_dir = os.path.abspath(search_dir).rstrip(os.sep)
+            # Escape LIKE wildcards in the directory name
+            prefix = search_dir.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + os.sep + '%'
+            self.cursor.execute("DELETE FROM files WHERE directory = ? OR directory LIKE ? ESCAPE '\\'",
+                                (search_dir, prefix))
+            removed = self.cursor.rowcount
+            self.cursor.execute("DELETE FROM directories WHERE dirpath = ? OR dirpath LIKE ? ESCAPE '\\'",
+                                (search_dir, prefix))
+        self.commit()
+        return removed
+
+    def commit(self):
+        profiling.count('scan_cache_commits')
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
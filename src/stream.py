@@ -0,0 +1,320 @@
+################################################################################
+### stream.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Incremental writers for per-track tag records. Records are buffered and
+### flushed to disk in batches, so that memory does not grow with the size of
+### the library. CSV and JSONL files keep every batch flushed so far if the run
+### dies part-way, even if it is killed. Parquet and Feather files are only
+### readable once the writer is closed, which writes their footer.
+### Stream files can be read back all at once, or one record at a time.
+### Supported formats, chosen by file extension: CSV, JSONL, Parquet, Feather.
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import csv
+import json
+import os
+
+################################################################################
+### Define constants
+################################################################################
+
+# Name of the column holding the track path
+PATH_COLUMN = 'Path'
+
+STREAM_FORMATS = ['.csv', '.jsonl', '.parquet', '.feather']
+
+################################################################################
+### Define classes
+################################################################################
+
+class StreamWriter:
+    """
+    Base class for the batch writers. Subclasses implement _write_batch and _close.
+
+    Attributes:
+        path (str): Path to the output file.
+        columns (list): Tag columns, written after the path column.
+        batch_size (int): Number of records buffered before they are flushed.
+        records_written (int): Number of records flushed to disk.
+    """
+
+    def __init__(self, path, columns, batch_size=1000):
+        self.path = path
+        self.columns = list(columns)
+        self.batch_size = batch_size
+        self.records_written = 0
+        self._batch = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Flush what has been parsed so far, even if the run failed
+        self.close()
+
+    def write(self, track_path, tags):
+        """
+        Add the tags of one track. The batch is flushed once it is full.
+
+        Args:
+            track_path (str): Path to the track file.
+            tags (dict): Tags of the track, keyed by column. Missing columns are left empty.
+
+        Returns:
+            None
+        """
+        record = {PATH_COLUMN: track_path}
+        for column in self.columns:
+            record[column] = tags.get(column)
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered records to disk."""
+        if self._batch:
+            self._write_batch(self._batch)
+            self.records_written += len(self._batch)
+            self._batch = []
+
+    def close(self):
+        """Flush the remaining records and close the file."""
+        self.flush()
+        self._close()
+
+    def _write_batch(self, batch):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+class CSVStreamWriter(StreamWriter):
+    """Write records to a CSV file, with a header row. Missing tags are written as empty cells."""
+
+    def __init__(self, path, columns, batch_size=1000):
+        super().__init__(path, columns, batch_size)
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=[PATH_COLUMN] + self.columns)
+        self._writer.writeheader()
+
+    def _write_batch(self, batch):
+        self._writer.writerows(batch)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+class JSONLStreamWriter(StreamWriter):
+    """Write records to a JSON Lines file, one object per track. Missing tags are written as null."""
+
+    def __init__(self, path, columns, batch_size=1000):
+        super().__init__(path, columns, batch_size)
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def _write_batch(self, batch):
+        self._file.writelines(json.dumps(record, ensure_ascii=False) + '\n' for record in batch)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+class ParquetStreamWriter(StreamWriter):
+    """
+    Write records to a Parquet file, one row group per batch. All columns are strings.
+    The footer is written when the writer is closed: the file of a killed run cannot be read.
+    """
+
+    def __init__(self, path, columns, batch_size=1000):
+        super().__init__(path, columns, batch_size)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("Writing Parquet files requires pyarrow.")
+        self._pyarrow = pyarrow
+        schema = pyarrow.schema([(column, pyarrow.string()) for column in [PATH_COLUMN] + self.columns])
+        self._writer = pyarrow.parquet.ParquetWriter(path, schema)
+
+    def _write_batch(self, batch):
+        table = self._pyarrow.Table.from_pylist(batch, schema=self._writer.schema)
+        self._writer.write_table(table)
+
+    def _close(self):
+        self._writer.close()
+
+class FeatherStreamWriter(StreamWriter):
+    """
+    Write records to a Feather (Arrow IPC) file, one record batch per batch. All columns are strings.
+    The footer is written when the writer is closed: the file of a killed run cannot be read.
+    """
+
+    def __init__(self, path, columns, batch_size=1000):
+        super().__init__(path, columns, batch_size)
+        try:
+            import pyarrow
+            import pyarrow.ipc
+        except ImportError:
+            raise ValueError("Writing Feather files requires pyarrow.")
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema([(column, pyarrow.string()) for column in [PATH_COLUMN] + self.columns])
+        self._writer = pyarrow.ipc.new_file(path, self._schema)
+
+    def _write_batch(self, batch):
+        self._writer.write_batch(self._pyarrow.RecordBatch.from_pylist(batch, schema=self._schema))
+
+    def _close(self):
+        self._writer.close()
+
+################################################################################
+### Define functions
+################################################################################
+
+def get_stream_format(path):
+    """
+    Get the stream format from the file extension.
+
+    Args:
+        path (str): Path to the stream file.
+
+    Returns:
+        str: File extension, one of STREAM_FORMATS.
+
+    Raises:
+        ValueError: If the extension is not supported.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in STREAM_FORMATS:
+        raise ValueError(f"Invalid stream file extension '{ext}'. Choose one of {', '.join(STREAM_FORMATS)}.")
+    return ext
+
+def open_stream_writer(path, columns, batch_size=1000):
+    """
+    Open a batch writer for the format given by the file extension.
+
+    Args:
+        path (str): Path to the output file.
+        columns (list): Tag columns, written after the path column.
+        batch_size (int): Number of records buffered before they are flushed.
+
+    Returns:
+        StreamWriter: Writer for the file.
+    """
+    writer_classes = {'.csv': CSVStreamWriter, '.jsonl': JSONLStreamWriter, '.parquet': ParquetStreamWriter,
+                      '.feather': FeatherStreamWriter}
+    return writer_classes[get_stream_format(path)](path, columns, batch_size)
+
+def write_stream(records, path, columns, batch_size=1000):
+    """
+    Write (track_path, tags) records to a stream file as they are produced.
+
+    Args:
+        records (iterable): Iterable of (track_path, tags) tuples, e.g., from read.iter_tags.
+        path (str): Path to the output file.
+        columns (list): Tag columns, written after the path column.
+        batch_size (int): Number of records buffered before they are flushed.
+
+    Returns:
+        int: Number of records written.
+    """
+    with open_stream_writer(path, columns, batch_size) as writer:
+        for track_path, tags in records:
+            writer.write(track_path, tags)
+    return writer.records_written
+
+def iter_stream(path, batch_size=1000):
+    """
+    Read a stream file back one record at a time, e.g., to write it to Excel without
+    holding the whole library in memory.
+
+    Args:
+        path (str): Path to the stream file.
+        batch_size (int): Number of rows read at once from a Parquet file.
+
+    Yields:
+        tuple: (track_path, tags), where tags is a dict keyed by column. Missing tags are None,
+            as in read.iter_tags.
+    """
+    ext = get_stream_format(path)
+    if ext == '.csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            for record in csv.DictReader(f):
+                track_path = record.pop(PATH_COLUMN)
+                # Only empty cells are missing, as in read_stream
+                yield track_path, {column: value if value != '' else None for column, value in record.items()}
+    elif ext == '.jsonl':
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    yield record.pop(PATH_COLUMN), record
+    else:
+        for batch in iter_arrow_batches(path, batch_size=batch_size):
+            for record in batch.to_pylist():
+                yield record.pop(PATH_COLUMN), record
+
+def iter_arrow_batches(path, columns=None, batch_size=1000):
+    """
+    Read a Parquet or Feather file one record batch at a time.
+
+    Args:
+        path (str): Path to the file. The format is chosen by the extension.
+        columns (list): Optional. Read only these columns. Other columns are not loaded.
+        batch_size (int): Number of rows read at once from a Parquet file. Feather files are
+            read in the record batches they were written in.
+
+    Yields:
+        pyarrow.RecordBatch: Next batch of rows.
+
+    Raises:
+        ValueError: If pyarrow is not installed.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.feather':
+        try:
+            import pyarrow
+            import pyarrow.ipc
+        except ImportError:
+            raise ValueError("Reading Feather files requires pyarrow.")
+        # Memory-mapped, so that only the batches, and columns, which are used are loaded
+        with pyarrow.memory_map(path) as source:
+            reader = pyarrow.ipc.open_file(source)
+            for batch_number in range(reader.num_record_batches):
+                batch = reader.get_batch(batch_number)
+                yield batch.select(columns) if columns is not None else batch
+    else:
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("Reading Parquet files requires pyarrow.")
+        yield from pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns)
+
+def read_stream(path):
+    """
+    Read a stream file back into a dataframe, e.g., to export it to Excel.
+
+    Args:
+        path (str): Path to the stream file.
+
+    Returns:
+        pd.DataFrame: DataFrame with track paths as index and columns for tags.
+            Missing tags are None, as in read.get_tags.
+    """
+    # Imported here, as tagger.py imports this module before it has parsed its arguments
+    import pandas as pd
+    ext = get_stream_format(path)
+    if ext == '.csv':
+        # Only empty cells are missing; tags such as 'NA' are kept as text
+        tags_df = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[''])
+    elif ext == '.jsonl':
+        tags_df = pd.read_json(path, lines=True, dtype=False)
+    elif ext == '.feather':
+        tags_df = pd.read_feather(path)
+    else:
+        tags_df = pd.read_parquet(path)
+    tags_df = tags_df.set_index(PATH_COLUMN).astype(object)
+    tags_df = tags_df.where(tags_df.notna(), None)
+    tags_df.index.name = None
+    return tags_df
@@ -0,0 +1,221 @@
+################################################################################
+### tables.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Tag tables in the formats accepted by tagger.py, chosen by file extension:
+### Excel, CSV, Parquet and Feather. Tables are written and read one record at
+### a time, with the path of each track in the first column. Scripted edits can
+### use Parquet, Feather or CSV, and skip the slow Excel round trip.
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import csv
+import os
+import excel
+import profiling
+import stream
+
+################################################################################
+### Define constants
+################################################################################
+
+TABLE_FORMATS = ['.xlsx', '.csv', '.parquet', '.feather']
+
+################################################################################
+### Define classes
+################################################################################
+
+class TableReader:
+    """
+    Base class for the readers of CSV, Parquet and Feather files. Subclasses implement
+    _iter_values, and set columns and row_count.
+
+    Rows are read as excel.ExcelReader reads them: the path column is required, and
+    all values are returned as text, with missing values as ''.
+
+    Attributes:
+        path (str): Path to the file.
+        columns (list): Tag columns which are read. Columns in skip_columns are not loaded.
+        row_count (int): Number of rows, or None if it is not known before the file is read.
+            Only used for progress reporting.
+    """
+
+    def __init__(self, path, skip_columns=()):
+        self.path = path
+        self.skip_columns = skip_columns
+        self.columns = []
+        self.row_count = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __iter__(self):
+        """
+        Yields:
+            tuple: (track_path, tags), where tags maps each column to its text. Rows without a
+                track path are skipped.
+        """
+        values_iter = self._iter_values()
+        while True:
+            with profiling.stage('read_table'):
+                values = next(values_iter, None)
+            if values is None:
+                return
+            track_path = excel.cell_to_text(values[0])
+            if track_path:
+                yield track_path, {column: excel.cell_to_text(value) for column, value in zip(self.columns, values[1:])}
+
+    def close(self):
+        """Close the file."""
+
+    def _select_columns(self, header):
+        """
+        Choose the tag columns to read from the header of the file.
+
+        Args:
+            header (list): Column names of the file.
+
+        Returns:
+            list: Tag columns, in file order.
+
+        Raises:
+            ValueError: If the file has no path column.
+        """
+        if stream.PATH_COLUMN not in header:
+            raise ValueError(f"{self.path} has no '{stream.PATH_COLUMN}' column with the track paths.")
+        # Unnamed columns, and the index of a dataframe saved with pandas, are not tags
+        return [column for column in header
+                if column and column != stream.PATH_COLUMN and column not in self.skip_columns
+                and not column.startswith('__index_level_')]
+
+    def _iter_values(self):
+        """Yield the values of each row: the path, then one value per column."""
+        raise NotImplementedError
+
+class CSVTableReader(TableReader):
+    """Read the rows of a CSV file, such as one written by read mode with --stream_out."""
+
+    def __init__(self, path, skip_columns=()):
+        super().__init__(path, skip_columns)
+        self._file = open(path, newline='', encoding='utf-8')
+        self._reader = csv.reader(self._file)
+        header = next(self._reader, [])
+        self.columns = self._select_columns(header)
+        self._column_numbers = [header.index(column) for column in [stream.PATH_COLUMN] + self.columns]
+
+    def _iter_values(self):
+        for values in self._reader:
+            yield [values[column_number] if column_number < len(values) else ''
+                   for column_number in self._column_numbers]
+
+    def close(self):
+        self._file.close()
+
+class ArrowTableReader(TableReader):
+    """
+    Read the rows of a Parquet or Feather file, one record batch at a time. Only the path
+    and tag columns are loaded. Columns of any type are accepted, e.g., integer track numbers.
+    """
+
+    def __init__(self, path, skip_columns=(), batch_size=1000):
+        super().__init__(path, skip_columns)
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError("Reading Parquet and Feather files requires pyarrow.")
+        self._batch_size = batch_size
+        if get_table_format(path) == '.feather':
+            with pyarrow.memory_map(path) as source:
+                reader = pyarrow.ipc.open_file(source)
+                header = reader.schema.names
+                self.row_count = reader.count_rows()
+        else:
+            metadata = pyarrow.parquet.ParquetFile(path).metadata
+            header = metadata.schema.to_arrow_schema().names
+            self.row_count = metadata.num_rows
+        self.columns = self._select_columns(header)
+
+    def _iter_values(self):
+        for batch in stream.iter_arrow_batches(self.path, [stream.PATH_COLUMN] + self.columns, self._batch_size):
+            # One list of values per column
+            yield from zip(*batch.to_pydict().values())
+
+################################################################################
+### Define functions
+################################################################################
+
+def get_table_format(path):
+    """
+    Get the table format from the file extension.
+
+    Args:
+        path (str): Path to the table file.
+
+    Returns:
+        str: File extension, one of TABLE_FORMATS.
+
+    Raises:
+        ValueError: If the extension is not supported.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in TABLE_FORMATS:
+        raise ValueError(f"Invalid file extension '{ext}'. Choose one of {', '.join(TABLE_FORMATS)}.")
+    return ext
+
+def open_table_writer(path, columns, batch_size=1000):
+    """
+    Open a writer for the format given by the file extension.
+
+    Args:
+        path (str): Path to the output file.
+        columns (list): Tag columns, written after the path column.
+        batch_size (int): Number of records buffered before they are written.
+
+    Returns:
+        stream.StreamWriter: Writer for the file.
+    """
+    if get_table_format(path) == '.xlsx':
+        return excel.ExcelStreamWriter(path, columns, batch_size)
+    return stream.open_stream_writer(path, columns, batch_size)
+
+def write_table(records, path, columns, batch_size=1000):
+    """
+    Write (track_path, tags) records to a table file as they are produced.
+
+    Args:
+        records (iterable): Iterable of (track_path, tags) tuples, e.g., from read.iter_tags.
+        path (str): Path to the output file. The format is chosen by the extension.
+        columns (list): Tag columns, written after the path column.
+        batch_size (int): Number of records buffered before they are written.
+
+    Returns:
+        int: Number of records written.
+    """
+    with open_table_writer(path, columns, batch_size) as writer:
+        for track_path, tags in records:
+            writer.write(track_path, tags)
+    return writer.records_written
+
+def open_table_reader(path, skip_columns=()):
+    """
+    Open a reader for the format given by the file extension.
+
+    Args:
+        path (str): Path to the table file.
+        skip_columns (list): Columns which are not read, e.g., write.UNUSED_COLUMNS.
+
+    Returns:
+        excel.ExcelReader or TableReader: Reader yielding (track_path, tags) tuples.
+    """
+    ext = get_table_format(path)
+    if ext == '.xlsx':
+        return excel.ExcelReader(path, skip_columns)
+    if ext == '.csv':
+        return CSVTableReader(path, skip_columns)
+    return ArrowTableReader(path, skip_columns)
@@ -8,12 +8,11 @@
 ################################################################################
 
 import argparse
+import functools
 import os
 import sys
-import pandas as pd
-import read
-import write
-from predict import DataManager
+import stream
+import tables
 
 ################################################################################
 ### Define functions
@@ -23,9 +22,15 @@ def validate_inputs(args):
     """
     Validate inputs for read and write modes.
     For read mode: ensures that a valid directory path is given
-    For read mode: ensures that the output Excel file path is valid
-    For write mode: ensures that the input Excel file path is valid
-    For write mode: ensures that the output Excel file path is valid
+    For read mode: ensures that the output table and/or stream file paths are valid
+    For read mode: ensures that chunked reading writes to Excel files, and not to a stream file
+    For watch mode: ensures that a valid directory path and output table file path are given
+    For write mode: ensures that the input table file path is valid
+    For write mode: ensures that the output table file path is valid
+    For write mode: ensures that the journal file exists when resuming, and its folder otherwise
+    For rollback mode: ensures that the journal file exists
+    For both modes: ensures that the table files are Excel, CSV, Parquet or Feather files
+    For both modes: ensures that the cProfile output file path is valid, if given
 
     Args:
         args (argparse.Namespace): Parsed command-line arguments.
@@ -34,67 +39,387 @@ def validate_inputs(args):
         ValueError: If any of the input arguments are invalid.
     """
     if args.mode == 'read':
+        if not args.dir or not os.path.isdir(args.dir):
+            raise ValueError("Invalid or missing directory path containing music files.")
+        # The Excel file is optional if tags are streamed to a file
+        stream_out = getattr(args, 'stream_out', None)
+        if stream_out:
+            stream.get_stream_format(stream_out)
+            output_dir = os.path.dirname(stream_out) or '.'
+            if not os.path.isdir(output_dir):
+                raise ValueError("Invalid or missing file path for streaming tag information.")
+        elif not args.excel_out:
+            raise ValueError("Invalid or missing file path for writing tag information.")
+        if args.excel_out:
+            tables.get_table_format(args.excel_out)
+            output_dir = os.path.dirname(args.excel_out) or '.'  # Default to current directory if no directory given
+            if not os.path.isdir(output_dir):
+                raise ValueError("Invalid or missing file path for writing tag information.")
+        # The stream file is already written in batches; chunks are for the Excel output
+        if (getattr(args, 'chunk_size', None) or getattr(args, 'max_memory', None)) and stream_out:
+            raise ValueError("Chunked reading writes Excel files, and cannot be combined with a stream file.")
+    elif args.mode == 'watch':
         if not args.dir or not os.path.isdir(args.dir):
             raise ValueError("Invalid or missing directory path containing music files.")
         if not args.excel_out:
             raise ValueError("Invalid or missing file path for writing tag information.")
-        output_dir = os.path.dirname(args.excel_out) or '.'  # Default to current directory if no directory given
-        if not args.excel_out or not os.path.isdir(output_dir):
+        tables.get_table_format(args.excel_out)
+        output_dir = os.path.dirname(args.excel_out) or '.'
+        if not os.path.isdir(output_dir):
             raise ValueError("Invalid or missing file path for writing tag information.")
+        # One table is kept up to date
+        if getattr(args, 'stream_out', None) or getattr(args, 'chunk_size', None) or getattr(args, 'max_memory', None):
+            raise ValueError("Watch mode keeps a single table up to date, and cannot be combined with a stream "
+                             "file or chunked reading.")
     elif args.mode == 'write':
         if not args.excel_in or not os.path.isfile(args.excel_in):
             raise ValueError("Invalid or missing file path for reading tag information.")
+        tables.get_table_format(args.excel_in)
         if not args.excel_out:
             raise ValueError("Invalid or missing file path for writing failed tags.")
+        tables.get_table_format(args.excel_out)
         output_dir = os.path.dirname(args.excel_out) or '.'  # Default to current directory if no directory given
         if not args.excel_out or not os.path.isdir(output_dir):
             raise ValueError("Invalid or missing file path for writing failed tags.")
+        journal = getattr(args, 'journal', None)
+        if getattr(args, 'resume', False) and (not journal or not os.path.isfile(journal)):
+            raise ValueError("Invalid or missing journal file of the run to resume.")
+        if journal and not os.path.isdir(os.path.dirname(journal) or '.'):
+            raise ValueError("Invalid file path for the journal.")
+    elif args.mode == 'rollback':
+        if not getattr(args, 'journal', None) or not os.path.isfile(args.journal):
+            raise ValueError("Invalid or missing journal file of the run to roll back.")
     else:
-        raise ValueError("Invalid mode. Choose 'read' or 'write'.")
+        raise ValueError("Invalid mode. Choose 'read', 'write', 'watch' or 'rollback'.")
+    profile_out = getattr(args, 'profile_out', None)
+    if profile_out:
+        output_dir = os.path.dirname(profile_out) or '.'
+        if not os.path.isdir(output_dir):
+            raise ValueError("Invalid file path for saving profile statistics.")
     
+def positive_int(value):
+    """
+    Argument type for counts which must be at least one.
+
+    Args:
+        value (str): Command-line value.
+
+    Returns:
+        int: Parsed value.
+
+    Raises:
+        argparse.ArgumentTypeError: If the value is not a positive integer.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid value '{value}'. Must be a positive integer.")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"Invalid value '{value}'. Must be a positive integer.")
+    return number
+
+def non_negative_int(value):
+    """
+    Argument type for sizes which may be zero.
+
+    Args:
+        value (str): Command-line value.
+
+    Returns:
+        int: Parsed value.
+
+    Raises:
+        argparse.ArgumentTypeError: If the value is not an integer of at least zero.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid value '{value}'. Must be zero or a positive integer.")
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"Invalid value '{value}'. Must be zero or a positive integer.")
+    return number
+
+def positive_float(value):
+    """
+    Argument type for durations which must be greater than zero.
+
+    Args:
+        value (str): Command-line value.
+
+    Returns:
+        float: Parsed value.
+
+    Raises:
+        argparse.ArgumentTypeError: If the value is not a positive number.
+    """
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid value '{value}'. Must be a positive number.")
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"Invalid value '{value}'. Must be a positive number.")
+    return number
+
+def get_shard_path(path, shard_number):
+    """
+    Get the path of one of the files the output is split into, e.g., tags_001.xlsx for tags.xlsx.
+
+    Args:
+        path (str): Output file path given on the command line.
+        shard_number (int): Number of the file, starting at 1.
+
+    Returns:
+        str: Path of the file.
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}_{shard_number:03d}{ext}"
+
 def main():
     """Command-line utility to read or write tags from/to music files"""
 
     parser = argparse.ArgumentParser(description='Classical music file tagger')
-    parser.add_argument('mode', choices=['read', 'write'], 
-                        help='Operation mode: read tags or write tags')
+    parser.add_argument('mode', choices=['read', 'write', 'watch', 'rollback'], 
+                        help='Operation mode: read tags, write tags, watch the directory and keep the '
+                             'exported tags up to date, or roll back a write recorded in --journal')
     parser.add_argument('--dir', '-d', required=False, 
                         help='Directory containing music files')
     parser.add_argument('--excel_in', '-i', required=False, 
-                        help='Excel file path for reading tag information')
-    parser.add_argument('--excel_out', '-o', required=True, 
-                        help='Excel file path for writing tag information')
+                        help='Write mode: file path (.xlsx, .csv, .parquet or .feather) for reading tag information')
+    parser.add_argument('--excel_out', '-o', required=False, 
+                        help='File path (.xlsx, .csv, .parquet or .feather) for writing tag information, or the '
+                             'failed tags in write mode. Optional in read mode with --stream_out')
+    parser.add_argument('--stream_out', '-s', required=False,
+                        help='Read mode: file path (.csv, .jsonl, .parquet or .feather) for writing tags as they are read. '
+                             'Only .csv and .jsonl keep the tags written so far if the run is killed')
+    parser.add_argument('--cache_file', default='scan_cache.db',
+                        help='Read and watch modes: scan cache of parsed tags, so unchanged files are not read again '
+                             '(default: scan_cache.db)')
+    parser.add_argument('--no_cache', '--no-cache', action='store_true',
+                        help='Read and watch modes: read every file, without using or updating the scan cache')
+    parser.add_argument('--clear_cache', action='store_true',
+                        help='Read mode: remove the cached entries below --dir before reading')
+    parser.add_argument('--trust_dir_mtime', action='store_true',
+                        help='Read mode: take the tracks of directories whose mtime is unchanged from the cache, '
+                             'without checking each file. Faster, but misses tags edited in place, including by '
+                             'write mode')
+    parser.add_argument('--title_cache', required=False,
+                        help='Read and watch modes: JSON file keeping the parsed titles between runs (default: not kept)')
+    parser.add_argument('--title_batch_size', type=positive_int, required=False,
+                        help='Read and watch modes: parse the title tags of this many tracks at once, instead of '
+                             'track by track (default: track by track)')
+    parser.add_argument('--chunk_size', '--chunk-size', type=positive_int, required=False,
+                        help='Read mode: read the library in chunks of at least this many tracks, ending at an album, '
+                             'and write each chunk to its own Excel file: tags_001.xlsx, tags_002.xlsx, ... '
+                             '(default: one file)')
+    parser.add_argument('--max_memory', '--max-memory', type=positive_int, required=False,
+                        help='Read mode: also end a chunk once the memory of the process has grown by this many MB. '
+                             'Memory of worker processes is not included (default: no limit)')
+    parser.add_argument('--batch_size', type=positive_int, default=1000,
+                        help='Read mode: number of tracks per batch written to --stream_out (default: 1000)')
+    parser.add_argument('--debounce', type=positive_float, default=2.0,
+                        help='Watch mode: seconds without changes after which a changed album is read (default: 2)')
+    parser.add_argument('--poll_interval', type=positive_float, default=5.0,
+                        help='Watch mode: seconds between scans when polling (default: 5)')
+    parser.add_argument('--polling', action='store_true',
+                        help='Watch mode: poll the directory instead of using inotify, e.g., on network shares')
+    parser.add_argument('--skip_unchanged', action='store_true',
+                        help='Write mode: only rewrite the files whose tags, title or name would change')
+    parser.add_argument('--compare_columns', nargs='+', required=False,
+                        help='Write mode: with --skip_unchanged, only compare these tags, e.g., Work Movement. '
+                             'Title is the title built from the row. Implies --skip_unchanged')
+    parser.add_argument('--padding_reserve', type=non_negative_int, default=8192,
+                        help='Write and rollback modes: bytes of padding to leave after the tags when a file has to '
+                             'be rewritten, so that later edits are written in place (default: 8192)')
+    parser.add_argument('--verify_writes', action='store_true',
+                        help='Write mode: after saving each file, check a checksum of the tags on disk against the '
+                             'tags which were written')
+    parser.add_argument('--journal', required=False,
+                        help='Write mode: record the original tags and name of each file before it is changed, in '
+                             'this SQLite file, so that an interrupted run can be resumed with --resume. Rollback '
+                             'mode: journal of the run to undo')
+    parser.add_argument('--resume', action='store_true',
+                        help='Write mode: continue the run recorded in --journal, skipping the files which are done')
     parser.add_argument('--store_data', action='store_true', 
                        help='Archive tag data during operations')
+    parser.add_argument('--workers', type=positive_int, default=1,
+                        help='Number of workers for reading tags, or for writing them album by album (default: 1)')
+    parser.add_argument('--worker_type', choices=['process', 'thread'], default='process',
+                        help='Run workers as processes or threads (default: process)')
+    parser.add_argument('--log_level', '--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO',
+                        type=str.upper, help='Level of the messages written to the log file (default: INFO). '
+                                             'DEBUG adds a message per track')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print the time spent in each stage of the run, and counts of file opens, '
+                             'bytes read, writes and commits')
+    parser.add_argument('--profile_out', required=False,
+                        help='Also save cProfile statistics to this file, for pstats or snakeviz. Implies --profile. '
+                             'Worker processes are not included')
 
     args = parser.parse_args()
 
-    data_mgr = DataManager() if args.store_data else None
+    scan_cache = None
+    title_cache = None
+    write_journal = None
+    profiler = None
+    cprofile = None
 
     try:
         # Validate inputs
         validate_inputs(args)
 
-        if args.mode == 'read':
-            # Create dataframe and get tags
-            tags_df = read.get_tracks_create_dataframe(args.dir)
-            tags_df = read.get_tags(tags_df, data_mgr)
-            # Use XLSXwriter engine to allow for foreign-language characters
-            tags_df.to_excel(args.excel_out, engine = 'xlsxwriter')
+        # Imported once the arguments are valid, so that --help and argument errors are fast
+        from predict import DataManager
+        from scancache import ScanCache
+        from utils import setup_logging
+        import profiling
+
+        if args.profile or args.profile_out:
+            profiler = profiling.Profiler()
+        if args.profile_out:
+            import cProfile
+            cprofile = cProfile.Profile()
+            cprofile.enable()
+
+        # Log to a new file in logs/
+        setup_logging(os.getcwd(), args.log_level)
+        data_mgr = DataManager() if args.store_data else None
+
+        if args.mode in ['read', 'watch'] and not args.no_cache:
+            scan_cache = ScanCache(args.cache_file, verify_files=not args.trust_dir_mtime)
+            if args.clear_cache:
+                removed = scan_cache.invalidate(args.dir)
+                print(f"Removed {removed} files from the scan cache")
+
+        if args.mode in ['read', 'watch']:
+            import read
+            title_cache = read.TitleCache()
+            if args.title_cache:
+                title_cache.load(args.title_cache)
+
+        if args.mode == 'read' and args.stream_out:
+            # Write tags to the stream file in batches, as they are read
+            with profiling.profile(profiler), profiling.stage('find_files'):
+                track_path_list = read.get_flac_files(args.dir, args.workers)
+            print(f"Processing {len(track_path_list)} files...")
+            records = read.iter_tags(track_path_list, data_mgr, args.workers, args.worker_type, scan_cache,
+                                     title_cache, args.title_batch_size, profiler)
+            records_written = stream.write_stream(records, args.stream_out, read.TAG_COLUMNS, args.batch_size)
+            print(f"Tags for {records_written} files saved to {args.stream_out}")
+            # Optionally, build the output table from the stream
+            if args.excel_out:
+                with profiling.profile(profiler):
+                    tables.write_table(stream.iter_stream(args.stream_out), args.excel_out, read.TAG_COLUMNS)
+                print(f"Tags saved to {args.excel_out}")
+
+        elif args.mode == 'read' and (args.chunk_size or args.max_memory):
+            import memory
+            # Read the library in album-aligned chunks, and write each chunk to its own file
+            with profiling.profile(profiler), profiling.stage('find_files'):
+                track_path_list = read.get_flac_files(args.dir, args.workers)
+            print(f"Processing {len(track_path_list)} files...")
+            records = read.iter_tags(track_path_list, data_mgr, args.workers, args.worker_type, scan_cache,
+                                     title_cache, args.title_batch_size, profiler)
+            max_memory = args.max_memory * memory.MB if args.max_memory else None
+            for shard_number, chunk in enumerate(read.iter_album_chunks(records, args.chunk_size, max_memory), 1):
+                shard_path = get_shard_path(args.excel_out, shard_number)
+                with profiling.profile(profiler):
+                    records_written = tables.write_table(chunk, shard_path, read.TAG_COLUMNS)
+                print(f"Tags for {records_written} files saved to {shard_path}")
+                # Free the chunk before the next one is read
+                del chunk
+            print(memory.format_memory_report())
+
+        elif args.mode == 'read':
+            import excel
+            with profiling.profile(profiler), profiling.stage('find_files'):
+                track_path_list = read.get_flac_files(args.dir, args.workers)
+            if tables.get_table_format(args.excel_out) == '.xlsx' and len(track_path_list) > excel.EXCEL_MAX_ROWS:
+                raise ValueError(f"{len(track_path_list)} files do not fit in one Excel sheet. "
+                                 "Use --chunk_size to split the output into several files.")
+            print(f"Processing {len(track_path_list)} files...")
+            # Write each track to the output table as it is read, in constant memory
+            records = read.iter_tags(track_path_list, data_mgr, args.workers, args.worker_type, scan_cache,
+                                     title_cache, args.title_batch_size, profiler)
+            with profiling.profile(profiler):
+                tables.write_table(records, args.excel_out, read.TAG_COLUMNS)
             print(f"Tags saved to {args.excel_out}")
             
+        elif args.mode == 'watch':
+            import watch
+            # Read the whole library once, then only the albums which change
+            read_tags = functools.partial(read.iter_tags, data_mgr=data_mgr, workers=args.workers,
+                                          worker_type=args.worker_type, scan_cache=scan_cache,
+                                          title_cache=title_cache, title_batch_size=args.title_batch_size,
+                                          profiler=profiler)
+            updater = watch.TagTableUpdater(args.dir, args.excel_out, read_tags)
+            watcher = watch.open_watcher(args.dir, args.poll_interval, args.polling)
+            try:
+                updater.read_all()
+                # Tags edited in place do not change the directory, so check each file of a changed album
+                if scan_cache is not None:
+                    scan_cache.verify_files = True
+                print(f"Watching {args.dir} for changes. Press Ctrl+C to stop")
+                watch.watch_library(watcher, updater, args.debounce)
+            except KeyboardInterrupt:
+                print("Stopped watching")
+            finally:
+                watcher.close()
+
         elif args.mode == 'write':
-            # Read tags from Excel and update files
-            tags_df = pd.read_excel(args.excel_in, dtype=str, index_col=0)
-            tags_df = tags_df.fillna('')
-            successful_df, failed_df = write.update_tags(tags_df, data_mgr)
-            # Use XLSXwriter engine to allow for foreign-language characters
-            failed_df.to_excel(args.excel_out, engine = 'xlsxwriter')
+            import write
+            if args.journal:
+                import journal
+                write_journal = journal.WriteJournal(args.journal)
+                counts = write_journal.get_counts()
+                # A journal holds one run, so that it can be rolled back
+                if counts and not args.resume:
+                    raise ValueError(f"{args.journal} already holds a run. Continue it with --resume, undo it "
+                                     f"with rollback mode, or choose another journal file.")
+                if args.resume:
+                    print(f"Resuming: {counts.get(journal.DONE, 0)} files already done")
+            # Read tags row by row, only the columns which are used, and update files,
+            # writing the rows which failed as they occur
+            try:
+                with profiling.profile(profiler), \
+                        tables.open_table_reader(args.excel_in, write.UNUSED_COLUMNS) as reader:
+                    if args.compare_columns:
+                        write.validate_compare_columns(args.compare_columns, reader.columns)
+                    with tables.open_table_writer(args.excel_out, reader.columns) as failed_writer:
+                        write.update_tags_from_rows(reader, failed_writer, data_mgr, profiler, reader.row_count,
+                                                    args.skip_unchanged or bool(args.compare_columns),
+                                                    args.compare_columns, args.padding_reserve, args.workers,
+                                                    args.worker_type, args.verify_writes, write_journal)
+            except KeyboardInterrupt:
+                print(f"Failed tags so far saved to {args.excel_out}")
+                if args.journal:
+                    print(f"Run again with --journal {args.journal} --resume to continue")
+                sys.exit(130)
             print(f"Failed tags saved to {args.excel_out}")
 
+        elif args.mode == 'rollback':
+            import journal
+            # Restore the original tags and names of the files of the run, latest first
+            write_journal = journal.WriteJournal(args.journal)
+            with profiling.profile(profiler):
+                journal.rollback(write_journal, args.padding_reserve)
+
+        if cprofile is not None:
+            cprofile.disable()
+            cprofile.dump_stats(args.profile_out)
+            print(f"cProfile statistics saved to {args.profile_out}")
+        if profiler is not None:
+            print(profiler.format_report())
+
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        if scan_cache is not None:
+            scan_cache.close()
+        if write_journal is not None:
+            write_journal.close()
+        if title_cache is not None and args.title_cache:
+            title_cache.save(args.title_cache)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -8,15 +8,14 @@
 ################################################################################
 
 import argparse
+import atexit
 import os
 import logging
+import logging.handlers
+import queue
 from datetime import datetime
 import json
 import sqlite3
-import pandas as pd
-import mutagen
-import mutagen.flac
-from tqdm import tqdm
 import csv
 
 
@@ -24,16 +23,32 @@ import csv
 ### Define functions
 ################################################################################
 
-def setup_logging(path_to_run_data):
+# Handler added to the root logger by setup_logging, so that it is only added once
+_queue_handler = None
+
+def setup_logging(path_to_run_data, level=logging.INFO):
     """
     Set up logging to a file.
 
+    Records are put on a queue, and a background thread formats them and writes them
+    to the file, so that logging does not wait on file writes. The thread is stopped,
+    and the remaining records are written, when the program exits.
+
+    Like logging.basicConfig, this does nothing if logging is already set up, so that
+    records are not written twice and no other thread is started.
+
     Args:
         path_to_run_data (str): Path to the run data directory
+        level (int or str): Logging level, e.g., logging.INFO or 'DEBUG'
 
     Returns:
         logging.Logger: Configured logger object
     """
+    global _queue_handler
+    root_logger = logging.getLogger()
+    if _queue_handler in root_logger.handlers:
+        return logging.getLogger(__name__)
+
     # Create logs directory if it doesn't exist
     log_dir = os.path.join(path_to_run_data, 'logs')
     os.makedirs(log_dir, exist_ok=True)
@@ -42,14 +57,18 @@ def setup_logging(path_to_run_data):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     log_file = os.path.join(log_dir, f'{timestamp}.log')
 
+    # Write to the file from a background thread
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s: %(message)s'))
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
     # Configure logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s: %(message)s',
-        handlers=[
-            logging.FileHandler(log_file)
-        ]
-    )
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    root_logger.setLevel(level)
+    root_logger.addHandler(_queue_handler)
 
     return logging.getLogger(__name__)
 
@@ -64,6 +83,9 @@ def sqlite_to_csv(sqlite_db, csv_file):
     Returns:
         None
     """
+    # Imported here, so that importing this module for setup_logging stays fast
+    import pandas as pd
+
     # Connect to SQLite database
     conn = sqlite3.connect(sqlite_db)
     cursor = conn.cursor()
@@ -120,23 +142,29 @@ def sqlite_to_csv(sqlite_db, csv_file):
     print('Data successfully written to CSV file')
 
 def find_files_with_empty_tags(search_dir):
+    # The scripts in utils/ import this module as src.utils, with only the project root on the path
+    try:
+        import flacmeta
+        import scan
+    except ImportError:
+        from src import flacmeta, scan
+    import mutagen.flac
+    from tqdm import tqdm
+
     empty_tag_files = []
     corrupt_files = []
-    flac_files = []
 
     # First, obtain the list of all FLAC files
-    for root, _, files in os.walk(search_dir):
-        for file in files:
-            if file.endswith('.flac'):
-                flac_files.append(os.path.join(root, file))
+    flac_files = [entry.path for entry in scan.scan_files(search_dir, {'.flac'})]
 
     print(f"Scanning {len(flac_files)} FLAC files...")
 
     # Iterate over the list of FLAC files with a single progress bar
     for file_path in tqdm(flac_files):
         try:
-            audio_file = mutagen.flac.FLAC(file_path)
-            if any(tag_value == [''] for tag_value in audio_file.tags.values()):
+            # Only the comment block is needed, so use the header-only reader
+            tags = flacmeta.read_vorbis_tags(file_path)
+            if any(tag_value == [''] for tag_value in tags.values()):
                 empty_tag_files.append(file_path)
         except mutagen.flac.error as e:
             print(f"Corrupt file: {file_path} - {e}")
@@ -160,21 +188,36 @@ def find_files_with_empty_tags(search_dir):
 
     return
 
-def remove_empty_tags():
+def remove_empty_tags(padding_reserve=None):
     """
     Function to remove empty tags. That is, the tag is present but has no value.
     In conjunction with find_empty_tags function, used to retroactively fix improper tags 
-    created by an issue that was fixed in commit 1555c62.
+    created by an issue that was fixed in commit 1555c62. Reads a list of files with empty
+    tags from empty_tags.csv.
     
     Args:
-        None (reads a list of files with empty tags from empty_tags.csv)
+        padding_reserve (int): Optional. Bytes of padding to add to files which have to be
+            rewritten. Defaults to flacmeta.DEFAULT_PADDING_RESERVE.
 
     Returns:
         None (writes a list of successes and failures to success.csv and failure.csv)
     
     """
+    # The scripts in utils/ import this module as src.utils, with only the project root on the path
+    try:
+        import flacmeta
+    except ImportError:
+        from src import flacmeta
+    import mutagen.flac
+    from tqdm import tqdm
+
+    if padding_reserve is None:
+        padding_reserve = flacmeta.DEFAULT_PADDING_RESERVE
+
     successful_paths = []
     failed_paths = []
+    inplace_saves = 0
+    full_rewrites = 0
 
     with open('empty_tags.csv', 'r') as csvfile:
         reader = csv.reader(csvfile)
@@ -187,12 +230,16 @@ def remove_empty_tags():
             audio_file = mutagen.flac.FLAC(file_path[0])
             # Extract the comment block
             tags_to_keep = {tag: value for tag, value in audio_file.tags.items() if value != ['']}
-            # Delete all tags
-            audio_file.delete()
-            # Write new comment block with non-empty tags
+            # Delete all tags, in memory, so that the file is only written once
+            audio_file.tags.clear()
+            # Write new comment block with non-empty tags. It is smaller than the old one,
+            # so it is written in place, and the space it frees becomes padding
             for tag, value in tags_to_keep.items():
                 audio_file[tag] = value
-            audio_file.save()
+            if flacmeta.save_flac(audio_file, padding_reserve):
+                inplace_saves += 1
+            else:
+                full_rewrites += 1
             successful_paths.append(file_path)
         except Exception as e:
             failed_paths.append(file_path)
@@ -200,6 +247,7 @@ def remove_empty_tags():
     print(f"Completed!")
     print(f"Successfully processed: {len(successful_paths)} files")
     print(f"Failed: {len(failed_paths)} files")
+    print(f"Saved in place: {inplace_saves} files, rewritten: {full_rewrites} files")
 
     with open('success.csv', 'w', newline='') as csvfile:
         writer = csv.writer(csvfile)
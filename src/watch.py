@@ -0,0 +1,467 @@
+################################################################################
+### watch.py
+### Copyright (c) 2025, Joshua J Hamilton
+### Watch a music library for changed albums, and keep the exported tag table
+### up to date. Changes are detected with inotify on Linux, or by polling the
+### directory tree elsewhere. Changes are debounced per album folder, so that
+### an album being copied in is read once, after the copy has finished, and
+### only the tracks of the changed albums are read again.
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+import read
+import scan
+import tables
+
+################################################################################
+### Define constants
+################################################################################
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DONT_FOLLOW)
+
+# Header of each inotify event: wd, mask, cookie and the length of the name which follows
+INOTIFY_EVENT = struct.Struct('iIII')
+
+################################################################################
+### Define classes
+################################################################################
+
+class InotifyWatcher:
+    """
+    Report changes below a directory with Linux inotify, without polling.
+
+    Each directory of the tree is watched, and directories created or moved into the tree
+    are watched as they appear. Only changes to FLAC files and directories are reported.
+
+    Attributes:
+        root (str): Directory being watched.
+    """
+
+    def __init__(self, root):
+        libc_name = ctypes.util.find_library('c')
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        # Raises AttributeError where there is no inotify, e.g., on macOS
+        self._libc.inotify_init1.restype = ctypes.c_int
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self.root = os.path.normpath(root)
+        self._directories = {}
+        try:
+            self._add_watches(self.root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watches(self, top):
+        """
+        Watch a directory and all of the directories below it.
+
+        Args:
+            top (str): Directory to watch.
+
+        Returns:
+            None
+
+        Raises:
+            OSError: If the watch limit (fs.inotify.max_user_watches) is reached.
+        """
+        for dirpath, _, _ in os.walk(top):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                # The directory may have been removed or replaced in the meantime
+                if error in (errno.ENOENT, errno.ENOTDIR):
+                    continue
+                raise OSError(error, f"Cannot watch {dirpath}: {os.strerror(error)}")
+            self._directories[wd] = dirpath
+
+    def _remove_watches(self, top):
+        """
+        Stop watching a directory moved out of its place, and the directories below it.
+
+        Args:
+            top (str): Former path of the directory.
+
+        Returns:
+            None
+        """
+        for wd, dirpath in list(self._directories.items()):
+            if dirpath == top or dirpath.startswith(top + os.sep):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._directories[wd]
+
+    def get_changes(self, timeout):
+        """
+        Wait for changes.
+
+        Args:
+            timeout (float): Seconds to wait for the first change.
+
+        Returns:
+            set: Directories containing changed FLAC files, and directories which were created,
+                removed or moved. Empty if nothing changed before the timeout.
+        """
+        changes = set()
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return changes
+        data = b''
+        while True:
+            try:
+                chunk = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            data += chunk
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + name_length].rstrip(b'\0'))
+            offset += name_length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, so check the whole tree, and watch any new directories
+                self._add_watches(self.root)
+                changes.add(self.root)
+                continue
+            if mask & IN_IGNORED:
+                self._directories.pop(wd, None)
+                continue
+            directory = self._directories.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & IN_MOVED_FROM:
+                    self._remove_watches(path)
+                elif mask & (IN_CREATE | IN_MOVED_TO):
+                    # Files may have been added before the directory was watched
+                    self._add_watches(path)
+                changes.add(path)
+            elif os.path.splitext(name)[1].lower() == '.flac':
+                changes.add(directory)
+        return changes
+
+    def close(self):
+        """Stop watching."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+class PollingWatcher:
+    """
+    Report changes below a directory by scanning it at regular intervals, where inotify is
+    not available, e.g., on macOS, Windows or some network shares.
+
+    A FLAC file has changed if its size, modification time or inode has changed.
+
+    Attributes:
+        root (str): Directory being watched.
+        interval (float): Seconds between scans.
+    """
+
+    def __init__(self, root, interval=5.0):
+        self.root = os.path.normpath(root)
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + interval
+
+    def _scan(self):
+        """
+        Returns:
+            dict: Maps each directory to a dict of its FLAC files and their (size, mtime, inode).
+        """
+        snapshot = {}
+        for entry in scan.scan_files(self.root, {'.flac'}, with_stat=True):
+            snapshot.setdefault(entry.dirpath, {})[entry.name] = (entry.stat.st_size, entry.stat.st_mtime_ns,
+                                                                  entry.stat.st_ino)
+        return snapshot
+
+    def get_changes(self, timeout):
+        """
+        Wait for changes, scanning the tree when the interval has elapsed.
+
+        Args:
+            timeout (float): Seconds to wait for the next scan.
+
+        Returns:
+            set: Directories whose FLAC files were added, removed or changed since the last scan.
+                Empty if the tree was not scanned before the timeout.
+        """
+        wait = self._next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(wait, 0))
+        snapshot = self._scan()
+        self._next_scan = time.monotonic() + self.interval
+        changes = {directory for directory in snapshot.keys() | self._snapshot.keys()
+                   if snapshot.get(directory) != self._snapshot.get(directory)}
+        self._snapshot = snapshot
+        return changes
+
+    def close(self):
+        """Stop watching."""
+
+class Debouncer:
+    """
+    Collect changed albums until they have been quiet for a while, so that a burst of
+    changes, such as an album being copied in, is handled once.
+
+    Attributes:
+        quiet_period (float): Seconds without changes after which an album is ready.
+    """
+
+    def __init__(self, quiet_period=2.0):
+        self.quiet_period = quiet_period
+        self._last_change = {}
+
+    def __len__(self):
+        return len(self._last_change)
+
+    def add(self, keys, now=None):
+        """
+        Record changes, restarting the quiet period of each key.
+
+        Args:
+            keys (iterable): Changed keys, e.g., album folders.
+            now (float): Optional. Time of the changes, from time.monotonic.
+
+        Returns:
+            None
+        """
+        now = time.monotonic() if now is None else now
+        for key in keys:
+            self._last_change[key] = now
+
+    def pop_ready(self, now=None):
+        """
+        Get the keys which have been quiet for the quiet period, and forget them.
+
+        Args:
+            now (float): Optional. Current time, from time.monotonic.
+
+        Returns:
+            list: Ready keys, sorted.
+        """
+        now = time.monotonic() if now is None else now
+        ready = sorted(key for key, last_change in self._last_change.items()
+                       if now - last_change >= self.quiet_period)
+        for key in ready:
+            del self._last_change[key]
+        return ready
+
+    def get_timeout(self, now=None):
+        """
+        Get the time until the next key is ready.
+
+        Args:
+            now (float): Optional. Current time, from time.monotonic.
+
+        Returns:
+            float: Seconds until the next key is ready, or None if there are no changes.
+        """
+        if not self._last_change:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(min(self._last_change.values()) + self.quiet_period - now, 0)
+
+class TagTableUpdater:
+    """
+    Keep the tags of a library in memory, and the table exported from them up to date,
+    reading only the albums which have changed.
+
+    Attributes:
+        root (str): Directory of the library.
+        output_path (str): Table file the tags are exported to. The format is chosen by the extension.
+        tags (dict): Tags of each track, keyed by track path.
+    """
+
+    def __init__(self, root, output_path, read_tags, columns=read.TAG_COLUMNS):
+        """
+        Args:
+            root (str): Directory of the library.
+            output_path (str): Table file the tags are exported to.
+            read_tags (function): Called with a sorted list of track paths, returns an iterable
+                of (track_path, tags), e.g., read.iter_tags with the options of the run.
+            columns (list): Tag columns of the table.
+        """
+        self.root = os.path.normpath(root)
+        self.output_path = output_path
+        self.read_tags = read_tags
+        self.columns = columns
+        self.tags = {}
+
+    def read_all(self):
+        """
+        Read the whole library, and export the table.
+
+        Returns:
+            None
+        """
+        self.update([self.root])
+
+    def update(self, directories):
+        """
+        Read the tracks below the given directories again, and export the table.
+
+        The tracks of a directory are replaced once they have all been read. If reading
+        fails, e.g., on a file which is still being copied, the directory keeps its
+        previous tracks, and is read again on its next change. With several workers,
+        read.iter_tags leaves out the tracks which fail instead of raising, so each album
+        with a track missing from what was read keeps its previous tracks too.
+
+        Args:
+            directories (iterable): Changed album folders.
+
+        Returns:
+            int: Number of tracks read.
+        """
+        tracks_read = 0
+        tracks_removed = 0
+        updated_directories = []
+        for directory in sorted(directories, key=len):
+            # Directories below one which was already read again are covered by it
+            if any(is_below(directory, updated_directory) for updated_directory in updated_directories):
+                continue
+            updated_directories.append(directory)
+            track_paths = sorted(entry.path for entry in scan.scan_files(directory, {'.flac'}))
+            try:
+                records = dict(self.read_tags(track_paths)) if track_paths else {}
+            except Exception as e:
+                print(f"Error reading {directory}: {e}", file=sys.stderr)
+                continue
+            failed_albums = {read.get_album_directory(track_path) for track_path in track_paths
+                             if track_path not in records}
+            if failed_albums:
+                print(f"Error reading {len(track_paths) - len(records)} tracks below {directory}, keeping the "
+                      f"previous tracks of {len(failed_albums)} albums", file=sys.stderr)
+                records = {track_path: tags for track_path, tags in records.items()
+                           if read.get_album_directory(track_path) not in failed_albums}
+            old_paths = [track_path for track_path in self.tags if is_below(track_path, directory)
+                         and read.get_album_directory(track_path) not in failed_albums]
+            for track_path in old_paths:
+                del self.tags[track_path]
+            self.tags.update(records)
+            tracks_read += len(records)
+            tracks_removed += len(set(old_paths) - records.keys())
+        self.export()
+        print(f"{tracks_read} tracks read, {tracks_removed} removed. Tags for {len(self.tags)} files saved to "
+              f"{self.output_path}")
+        return tracks_read
+
+    def export(self):
+        """
+        Write the table, in the order of read.get_flac_files. The table is written to a temporary
+        file first, so that other programs never see a partly written table.
+
+        Returns:
+            None
+        """
+        root, ext = os.path.splitext(self.output_path)
+        temporary_path = f"{root}.partial{ext}"
+        records = ((track_path, self.tags[track_path]) for track_path in sorted(self.tags))
+        tables.write_table(records, temporary_path, self.columns)
+        os.replace(temporary_path, self.output_path)
+
+################################################################################
+### Define functions
+################################################################################
+
+def is_below(path, directory):
+    """
+    Check whether a path is a directory or inside it.
+
+    Args:
+        path (str): Path to check.
+        directory (str): Directory.
+
+    Returns:
+        bool: True if path is directory, or below it.
+    """
+    return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
+
+def get_album_directory(path, root):
+    """
+    Get the album folder a changed directory belongs to: the directory itself, or its
+    parent for a disc folder, as in read.get_album_directory.
+
+    Args:
+        path (str): Changed directory.
+        root (str): Directory being watched. Albums are never above it.
+
+    Returns:
+        str: Album folder.
+    """
+    if path != root and os.path.basename(path).startswith(tuple(read.POSSIBLE_DISC_NAMES)):
+        return os.path.dirname(path)
+    return path
+
+def open_watcher(root, poll_interval=5.0, polling=False):
+    """
+    Watch a directory with inotify, or by polling where inotify is not available.
+
+    Args:
+        root (str): Directory to watch.
+        poll_interval (float): Seconds between scans when polling.
+        polling (bool): Poll, even if inotify is available, e.g., for network shares, where
+            inotify does not see changes made by other machines.
+
+    Returns:
+        InotifyWatcher or PollingWatcher: Watcher for the directory.
+    """
+    if not polling:
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            print(f"inotify is not available ({e}), polling every {poll_interval:g} seconds instead")
+    return PollingWatcher(root, poll_interval)
+
+def watch_library(watcher, updater, quiet_period=2.0, stop_event=None):
+    """
+    Update the tag table whenever albums change, until stop_event is set or the user presses Ctrl+C.
+
+    Args:
+        watcher (InotifyWatcher or PollingWatcher): Source of the changes.
+        updater (TagTableUpdater): Tags and table to update. Its tags should have been read.
+        quiet_period (float): Seconds without changes after which a changed album is read.
+        stop_event (threading.Event): Optional. Stop watching once set, e.g., from another thread.
+
+    Returns:
+        None
+    """
+    debouncer = Debouncer(quiet_period)
+    while stop_event is None or not stop_event.is_set():
+        timeout = debouncer.get_timeout()
+        # Wake up at least once a second, so that stop_event is noticed
+        changes = watcher.get_changes(min(timeout, 1.0) if timeout is not None else 1.0)
+        debouncer.add(get_album_directory(path, watcher.root) for path in changes)
+        ready = debouncer.pop_ready()
+        if ready:
+            print(f"Changed: {', '.join(os.path.relpath(directory, watcher.root) for directory in ready)}")
+            updater.update(ready)
@@ -10,119 +10,668 @@
 import os
 import pandas as pd
 import re
+import collections
+import concurrent.futures
+import itertools
+import signal
+import threading
 import mutagen
 import mutagen.flac
-import mutagen.easyid3
 from tqdm import tqdm  # For better progress tracking
+import flacmeta
+import profiling
+import read
+
+################################################################################
+### Define constants
+################################################################################
+
+# Columns of the tag table which update_file_tags does not use, and which need not be read:
+# the title is built from the other tags
+UNUSED_COLUMNS = ['Title']
+
+# ID3v1 tags are the last 128 bytes of a file, starting with 'TAG'
+ID3V1_MARKER = b'TAG'
+ID3V1_SIZE = 128
+
+################################################################################
+### Define classes
+################################################################################
+
+class TagRecorder:
+    """
+    Stand-in for DataManager in the workers of the parallel write mode. The database
+    connection cannot be shared with worker processes, so the updated tags are recorded,
+    and archived by the parent with its own DataManager.
+
+    Attributes:
+        records (list): (file_path, tags) for each file which was updated.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def save_updated_tags(self, file_path, tags):
+        self.records.append((file_path, tags))
+
+class InterruptHandler:
+    """
+    Defer Ctrl+C while files are written, so that a file is never left half saved, or saved
+    but not renamed. The first SIGINT sets interrupted, and the loop writing the files stops
+    once the current file, or with workers the albums in progress, are done. A second
+    SIGINT interrupts at once.
+
+    Signal handlers can only be set from the main thread. Elsewhere, SIGINT is left as it is.
+
+    Attributes:
+        interrupted (bool): Whether SIGINT was received.
+    """
+
+    def __init__(self):
+        self.interrupted = False
+        self._installed = False
+        self._previous = None
+
+    def __enter__(self):
+        if threading.current_thread() is threading.main_thread():
+            self._previous = signal.signal(signal.SIGINT, self._handle)
+            self._installed = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._installed:
+            signal.signal(signal.SIGINT, self._get_previous())
+            self._installed = False
+
+    def _get_previous(self):
+        # None if the previous handler was not set from Python
+        return self._previous if self._previous is not None else signal.default_int_handler
+
+    def _handle(self, signum, frame):
+        self.interrupted = True
+        print("Interrupted. Stopping once the files being written are done. Press Ctrl+C again to stop at once")
+        signal.signal(signal.SIGINT, self._get_previous())
 
 ################################################################################
 ### Define functions
 ################################################################################
 
+### Build the new tags and file name
+def build_title(row):
+    """
+    Build the title of a track from its work fields.
+
+    Args:
+        row (pd.Series or dict): Tags of the track, keyed by tag name.
+
+    Returns:
+        str: Title, e.g., "Symphony No. 41, K. 551, in C major, 'Jupiter' - I. Allegro vivace".
+    """
+    # General logic: Start with the work as the initial part of the title.
+    # Append each piece of metadata to the title_parts list if it is not empty.
+    # Join all parts with spaces to form the final title.
+    # Get all the metadata
+    work = row.get('Work', '')
+    work_number = row.get('Work Number', '')
+    catalog_number = row.get('Catalog #', '')
+    opus = row.get('Opus', '')
+    opus_number = row.get('Opus Number', '')
+    initial_key = row.get('InitialKey', '')
+    epithet = row.get('Epithet', '')
+    movement = row.get('Movement', '')
+    title_parts = [work]
+    if work_number:
+        title_parts.append(f", {work_number}")
+    if catalog_number:
+        title_parts.append(f", {catalog_number}")
+    if opus:
+        title_parts.append(f", {opus}")
+    if opus_number:
+        title_parts.append(f", {opus_number}")
+    if initial_key:
+        title_parts.append(f", in {initial_key}")
+    if epithet:
+        title_parts.append(f", '{epithet}'")
+    if movement:
+        title_parts.append(f" - {movement}")
+
+    return ''.join(title_parts)
+
+def get_target_tags(row):
+    """
+    Get the tags a file has once it has been updated.
+
+    Args:
+        row (pd.Series or dict): New tags, keyed by tag name. Empty values are skipped.
+
+    Returns:
+        dict: Tags in the order they are written, with the title built by build_title last.
+    """
+    target_tags = {}
+    for tag, value in row.items():
+        # Check for missing values
+        if pd.notna(value) and value != '':
+            target_tags[tag] = value
+    # The Title tag is replaced by the built title
+    target_tags.pop('Title', None)
+    target_tags['Title'] = build_title(row)
+    return target_tags
+
+def get_new_file_path(file_path, row, title):
+    """
+    Get the path a file is renamed to: "<track number> - <title>.flac", in the same folder.
+
+    Args:
+        file_path (str): Path to the FLAC file.
+        row (pd.Series or dict): New tags, keyed by tag name.
+        title (str): Title built by build_title.
+
+    Returns:
+        str: New path of the file.
+    """
+    track_number = row.get('TrackNumber', '')
+    track_number = track_number.zfill(2)  # Pad the track number to two digits
+    # Sanitize the title
+    safe_title = re.sub(r'[\\/:*?"<>|]', '_', title)
+    new_file_name = f"{track_number} - {safe_title}.flac"
+    return os.path.join(os.path.dirname(file_path), new_file_name)
+
+### Compare with the file
+def has_id3v1(file_path):
+    """
+    Check whether a file ends with an ID3v1 tag, which update_file_tags deletes.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        bool: True if the file has an ID3v1 tag.
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < ID3V1_SIZE:
+            return False
+        f.seek(-ID3V1_SIZE, os.SEEK_END)
+        return f.read(len(ID3V1_MARKER)) == ID3V1_MARKER
+
+def is_file_unchanged(file_path, target_tags, new_file_path, compare_columns = None):
+    """
+    Check whether updating a file would leave it as it is, from its metadata blocks only.
+
+    Without compare_columns, a file is unchanged if its Vorbis comments are exactly the target
+    tags, it has no pictures and no ID3 tags, and it already has its new name. With
+    compare_columns, only those tags are compared, and everything else is ignored.
+
+    Args:
+        file_path (str): Path to the FLAC file.
+        target_tags (dict): Tags of the updated file, from get_target_tags.
+        new_file_path (str): Path of the updated file, from get_new_file_path.
+        compare_columns (list): Optional. Only compare these tags. 'Title' is the built title.
+
+    Returns:
+        bool: True if the file is unchanged. Files the header-only reader cannot handle are
+            reported as changed, and are updated.
+
+    Raises:
+        OSError: If the file cannot be opened.
+    """
+    try:
+        metadata = flacmeta.read_flac_metadata(file_path)
+    except flacmeta.FLACHeaderError:
+        return False
+    profiling.count('bytes_read', metadata['bytes_read'])
+    # Vorbis comment names are not case sensitive, and are read back in lowercase
+    file_tags = metadata['tags']
+    target_tags = {tag.lower(): [str(value)] for tag, value in target_tags.items()}
+    if compare_columns is not None:
+        return all(file_tags.get(column.lower(), []) == target_tags.get(column.lower(), [])
+                   for column in compare_columns)
+    return (file_tags == target_tags and metadata['pictures'] == 0 and not metadata['id3']
+            and new_file_path == file_path and not has_id3v1(file_path))
+
+def validate_compare_columns(compare_columns, columns):
+    """
+    Check that the columns to compare are columns of the tag table. A misspelled column
+    would be missing from both the file and the target tags, and every file would be skipped.
+
+    Args:
+        compare_columns (list): Columns to compare, see is_file_unchanged.
+        columns (list): Columns of the tag table. 'Title' is always allowed.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If any of the columns to compare is not a column of the table.
+    """
+    # Vorbis comment names are not case sensitive
+    known_columns = {column.lower() for column in list(columns) + UNUSED_COLUMNS}
+    unknown_columns = [column for column in compare_columns if column.lower() not in known_columns]
+    if unknown_columns:
+        raise ValueError(f"Columns to compare are not in the tag table: {', '.join(unknown_columns)}. "
+                         f"Choose from: {', '.join(list(columns) + UNUSED_COLUMNS)}.")
+
 ### Update tags
-def update_tags(tags_df, data_mgr = None):
+def update_file_tags(file_path, row, data_mgr = None, skip_unchanged = False, compare_columns = None,
+                     padding_reserve = flacmeta.DEFAULT_PADDING_RESERVE, verify = False, journal = None):
+    """
+    Replace the tags of one file, build its title, and rename it after the title.
+
+    Args:
+        file_path (str): Path to the FLAC file.
+        row (pd.Series or dict): New tags, keyed by tag name. Empty values are skipped.
+        data_mgr (DataManager): Optional. Archive the updated tags of the file.
+        skip_unchanged (bool): Leave the file as it is if updating it would not change it,
+            see is_file_unchanged.
+        compare_columns (list): Optional. With skip_unchanged, only compare these tags.
+        padding_reserve (int): Bytes of padding to add when the metadata no longer fits in
+            the space before the audio, and the file has to be rewritten.
+        verify (bool): After saving, compare a checksum of the comment block on disk with the
+            tags which were written, see flacmeta.verify_vorbis_comment.
+        journal (journal.WriteJournal): Optional. Record the original tags and name of the file
+            before it is changed, and mark it as done once it is renamed. Files which are done
+            in the journal are skipped.
+
+    Returns:
+        bool: True if the file was updated, False if it was skipped as unchanged, or as done
+            by the run being resumed.
+
+    Raises:
+        Exception: If the FLAC tags cannot be updated or verified, or the file cannot be renamed.
+    """
+    # The file was updated by the run being resumed
+    if journal is not None and journal.is_done(file_path):
+        profiling.count('resumed_files')
+        return False
+
+    target_tags = get_target_tags(row)
+    new_file_path = get_new_file_path(file_path, row, target_tags['Title'])
+
+    if skip_unchanged:
+        with profiling.stage('compare'):
+            unchanged = is_file_unchanged(file_path, target_tags, new_file_path, compare_columns)
+        if unchanged:
+            profiling.count('unchanged_files')
+            return False
+
+    # Update FLAC tags
+    profiling.count('flac_opens')
+    with profiling.stage('open'):
+        audio_file = mutagen.flac.FLAC(file_path)
+    # Record the original state of the file before anything is changed
+    if journal is not None:
+        with profiling.stage('journal'):
+            journal.plan(file_path, new_file_path, audio_file, target_tags)
+    with profiling.stage('set_tags'):
+        # Delete all FLAC tags and images, in memory, so that the file is written once
+        audio_file.clear_pictures()
+        if audio_file.tags is None:
+            audio_file.add_tags()
+        else:
+            audio_file.tags.clear()
+        # Add new ones, and the title
+        for tag, value in target_tags.items():
+            audio_file[tag] = value
+
+    # Save results, deleting all ID3 tags. The metadata is written in place if it fits in the
+    # space of the old metadata and padding, so that the audio is not moved
+    profiling.count('file_writes')
+    with profiling.stage('save'):
+        in_place = flacmeta.save_flac(audio_file, padding_reserve, deleteid3=True)
+    profiling.count('inplace_saves' if in_place else 'full_rewrites')
+
+    # Check that the comment block on disk is the one which was written
+    if verify:
+        with profiling.stage('verify'):
+            profiling.count('bytes_read', flacmeta.verify_vorbis_comment(file_path, audio_file))
+
+    # Update DataManager object, with the tags which were just written
+    if data_mgr:
+        with profiling.stage('data_manager'):
+            data_mgr.save_updated_tags(file_path, dict(audio_file.tags))
+
+    # Rename the track
+    profiling.count('renames')
+    with profiling.stage('rename'):
+        os.rename(file_path, new_file_path)
+    if journal is not None:
+        with profiling.stage('journal'):
+            journal.complete(file_path)
+    return True
+
+def iter_update_tags(rows, data_mgr = None, profiler = None, total = None, skip_unchanged = False,
+                     compare_columns = None, padding_reserve = flacmeta.DEFAULT_PADDING_RESERVE,
+                     workers = 1, worker_type = 'process', verify = False, journal = None):
+    """
+    Update tags file by file, from rows which are read as they are needed.
+
+    Ctrl+C stops the updates once the file being written is done, see InterruptHandler, and
+    then raises KeyboardInterrupt.
+
+    Args:
+        rows (iterable): Yields (file_path, row), e.g., excel.ExcelReader, so that the whole
+            table does not have to be held in memory.
+        data_mgr (DataManager): Optional. Archive the updated tags of each file.
+        profiler (profiling.Profiler): Optional. Record the time spent in each stage, and counts of
+            file opens, writes, renames and commits.
+        total (int): Optional. Number of rows, for the progress bar.
+        skip_unchanged (bool): Leave files which would not change as they are, see is_file_unchanged.
+        compare_columns (list): Optional. With skip_unchanged, only compare these tags.
+        padding_reserve (int): Bytes of padding to add to files which have to be rewritten.
+        workers (int): Number of workers. With more than one, albums are updated in parallel,
+            see iter_update_tags_parallel.
+        worker_type (str): 'process' or 'thread'.
+        verify (bool): Check the comment block of each saved file, see update_file_tags.
+        journal (journal.WriteJournal): Optional. Journal of the run, see update_file_tags.
+
+    Yields:
+        tuple: (file_path, row, updated, error), where updated is False for a file skipped as
+            unchanged, and error is the exception raised for the file, or None on success.
+
+    Raises:
+        KeyboardInterrupt: If the updates were stopped with Ctrl+C.
+    """
+    with profiling.profile(profiler):
+        if workers > 1:
+            yield from iter_update_tags_parallel(rows, workers, worker_type, data_mgr, total, skip_unchanged,
+                                                 compare_columns, padding_reserve, verify, journal)
+            return
+        with InterruptHandler() as interrupt:
+            for file_path, row in tqdm(rows, total=total, desc="Writing tags"):
+                profiling.count('tracks')
+                try:
+                    updated = update_file_tags(file_path, row, data_mgr, skip_unchanged, compare_columns,
+                                               padding_reserve, verify, journal)
+                except Exception as e:
+                    print(e)
+                    if journal is not None:
+                        journal.fail(file_path, e)
+                    yield file_path, row, False, e
+                else:
+                    yield file_path, row, updated, None
+                if interrupt.interrupted:
+                    break
+        if interrupt.interrupted:
+            raise KeyboardInterrupt
+
+# Set by init_worker_process in the worker processes of the parallel write mode
+_in_worker_process = False
+_worker_journal = None
+
+def init_worker_process(profile=False, journal_file=None):
+    """
+    Set up a worker process of the parallel write mode.
+
+    Args:
+        profile (bool): Record stage times and counters, returned by update_album_tags.
+        journal_file (str): Optional. Path to the journal of the run, opened by each worker.
+
+    Returns:
+        None
+    """
+    global _in_worker_process, _worker_journal
+    _in_worker_process = True
+    read.init_worker_logging()
+    # Ctrl+C is handled by the parent, which stops once the albums in progress are done
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if journal_file is not None:
+        import journal
+        _worker_journal = journal.WriteJournal(journal_file)
+    # A forked worker inherits the profiler of the parent; start from zero instead
+    profiling.activate(profiling.Profiler() if profile else None)
+
+def update_album_tags(rows, store_tags = False, skip_unchanged = False, compare_columns = None,
+                      padding_reserve = flacmeta.DEFAULT_PADDING_RESERVE, verify = False, journal = None):
+    """
+    Update the tags of the tracks of one album. Runs in a worker of the parallel write mode.
+
+    Errors are caught per track, so that one bad file does not fail the whole album.
+
+    Args:
+        rows (list): (file_path, row) for each track of the album.
+        store_tags (bool): Return the updated tags of each file, for DataManager.
+        skip_unchanged (bool): Leave files which would not change as they are, see is_file_unchanged.
+        compare_columns (list): Optional. With skip_unchanged, only compare these tags.
+        padding_reserve (int): Bytes of padding to add to files which have to be rewritten.
+        verify (bool): Check the comment block of each saved file, see update_file_tags.
+        journal (journal.WriteJournal): Optional. Journal of the run, shared by worker threads.
+            Worker processes use the journal opened by init_worker_process instead.
+
+    Returns:
+        tuple: (results, updated_tags, profile_update), where
+            results is a list of (updated, error) tuples, one per row, and error is the exception
+            raised for the file, or None on success.
+            updated_tags is a list of (file_path, tags) for DataManager, empty unless store_tags.
+            profile_update is a snapshot of the profiler of a worker process, to be merged
+            into the profiler of the parent, or None.
+    """
+    recorder = TagRecorder() if store_tags else None
+    if journal is None and _in_worker_process:
+        journal = _worker_journal
+    results = []
+    for file_path, row in rows:
+        profiling.count('tracks')
+        try:
+            results.append((update_file_tags(file_path, row, recorder, skip_unchanged, compare_columns,
+                                             padding_reserve, verify, journal), None))
+        except Exception as e:
+            if journal is not None:
+                journal.fail(file_path, e)
+            results.append((False, e))
+    profile_update = None
+    # Worker threads record into the profiler of the parent directly
+    if _in_worker_process and profiling.get_active() is not None:
+        profile_update = profiling.get_active().snapshot(reset=True)
+    return results, recorder.records if recorder else [], profile_update
+
+def iter_update_tags_parallel(rows, workers, worker_type = 'process', data_mgr = None, total = None,
+                              skip_unchanged = False, compare_columns = None,
+                              padding_reserve = flacmeta.DEFAULT_PADDING_RESERVE, verify = False, journal = None):
+    """
+    Update tags with a pool of workers, album by album.
+
+    Rows are grouped by album folder (read.get_album_directory), and all the saves and renames
+    of an album are made by a single worker, so two workers never write to the same folder.
+    The rows of an album are expected to be next to each other, as in the tables written by
+    read mode. If an album comes up again later, its rows wait until the earlier ones are done.
+    Results are yielded in the order of the rows, and at most two albums per worker are held
+    in memory. Ctrl+C stops the updates once the albums which were submitted are done.
+
+    Args:
+        rows (iterable): Yields (file_path, row), e.g., excel.ExcelReader.
+        workers (int): Number of workers.
+        worker_type (str): 'process' or 'thread'.
+        data_mgr (DataManager): Optional. Archive the updated tags of each file, from the
+            parent, as they are returned by the workers.
+        total (int): Optional. Number of rows, for the progress bar.
+        skip_unchanged (bool): Leave files which would not change as they are, see is_file_unchanged.
+        compare_columns (list): Optional. With skip_unchanged, only compare these tags.
+        padding_reserve (int): Bytes of padding to add to files which have to be rewritten.
+        verify (bool): Check the comment block of each saved file, see update_file_tags.
+        journal (journal.WriteJournal): Optional. Journal of the run, shared by worker threads,
+            and opened again by each worker process.
+
+    Yields:
+        tuple: (file_path, row, updated, error), as iter_update_tags.
+
+    Raises:
+        ValueError: If the worker type is invalid.
+        KeyboardInterrupt: If the updates were stopped with Ctrl+C.
+    """
+    if worker_type == 'process':
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker_process,
+            initargs=(profiling.get_active() is not None, journal.db_file if journal is not None else None))
+        # The SQLite connection cannot be shared with worker processes
+        shared_journal = None
+    elif worker_type == 'thread':
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        shared_journal = journal
+    else:
+        raise ValueError("Invalid worker type. Choose 'process' or 'thread'.")
+
+    def iter_album_results(album_rows, future):
+        try:
+            results, updated_tags, profile_update = future.result()
+            if profile_update is not None and profiling.get_active() is not None:
+                profiling.get_active().merge(profile_update)
+        # If the worker itself died, every track of the album failed
+        except Exception as e:
+            results = [(False, e)] * len(album_rows)
+            updated_tags = []
+        if data_mgr:
+            with profiling.stage('archive_tags'):
+                for file_path, tags in updated_tags:
+                    data_mgr.save_updated_tags(file_path, tags)
+        progress.update(len(album_rows))
+        for (file_path, row), (updated, error) in zip(album_rows, results):
+            if error is not None:
+                print(error)
+            yield file_path, row, updated, error
+
+    # Albums submitted to the workers, in order: (album, rows, future)
+    pending = collections.deque()
+    with InterruptHandler() as interrupt, executor, tqdm(total=total, desc="Writing tags") as progress:
+        for album, album_rows in itertools.groupby(rows, key=lambda file_row: read.get_album_directory(file_row[0])):
+            if interrupt.interrupted:
+                break
+            album_rows = list(album_rows)
+            # Wait for any earlier rows of the same album
+            concurrent.futures.wait([future for pending_album, _, future in pending if pending_album == album])
+            future = executor.submit(update_album_tags, album_rows, data_mgr is not None, skip_unchanged,
+                                     compare_columns, padding_reserve, verify, shared_journal)
+            pending.append((album, album_rows, future))
+            while len(pending) > 2 * workers:
+                _, album_rows, future = pending.popleft()
+                yield from iter_album_results(album_rows, future)
+        while pending:
+            _, album_rows, future = pending.popleft()
+            yield from iter_album_results(album_rows, future)
+    if interrupt.interrupted:
+        raise KeyboardInterrupt
+
+def update_tags(tags_df, data_mgr = None, profiler = None, skip_unchanged = False, compare_columns = None,
+                padding_reserve = flacmeta.DEFAULT_PADDING_RESERVE, workers = 1, worker_type = 'process',
+                verify = False, journal = None):
     """
     Update tags by reading from an Excel file.
 
     Args:
         tags_df (pd.DataFrame): DataFrame with track paths as index and columns for tags.
+        data_mgr (DataManager): Optional. Archive the updated tags of each file.
+        profiler (profiling.Profiler): Optional. Record the time spent in each stage, and counts of
+            file opens, writes, renames and commits.
+        skip_unchanged (bool): Leave files which would not change as they are, see is_file_unchanged.
+        compare_columns (list): Optional. With skip_unchanged, only compare these tags.
+        padding_reserve (int): Bytes of padding to add to files which have to be rewritten.
+        workers (int): Number of workers, each updating whole albums, see iter_update_tags_parallel.
+        worker_type (str): 'process' or 'thread'.
+        verify (bool): Check the comment block of each saved file, see update_file_tags.
+        journal (journal.WriteJournal): Optional. Journal of the run, see update_file_tags.
 
     Returns:
         tuple: (successful_df, failed_df) containing the entries which were successfully processed and those which failed.
+            Files skipped as unchanged are successful.
+
+    Raises:
+        ValueError: If compare_columns has a column which is not in tags_df.
     """
+    if compare_columns is not None:
+        validate_compare_columns(compare_columns, tags_df.columns)
 
     # Initialize tracking dataframes
     successful_paths = []
     failed_paths = []
+    skipped_count = 0
 
     # Iterator
     total_files = len(tags_df)
     print(f"Updating {total_files} files...") 
 
-    for file_path in tqdm(tags_df.index, total=total_files, desc="Writing tags"):
-
-        # Delete all ID3 tags
-        try:
-            audio_file = mutagen.easyid3.EasyID3(file_path)
-            audio_file.delete()
-        # ID3 tags may not exist
-        except:
-            pass
-
-        # Update FLAC tags
-        try:
-            # Delete all FLAC tags and images
-            audio_file = mutagen.flac.FLAC(file_path)
-            audio_file.delete()
-            audio_file.clear_pictures()
-            # Add new ones
-            row = tags_df.loc[file_path]
-            for tag, value in row.items():
-                # Check for missing values
-                if pd.notna(value) and value != '':
-                    audio_file[tag] = value
-
-            # Create Title tag
-            # General logic: Start with the work as the initial part of the title.
-            # Append each piece of metadata to the title_parts list if it is not empty.
-            # Join all parts with spaces to form the final title.
-            # Get all the metadata
-            work = row.get('Work', '')
-            work_number = row.get('Work Number', '')
-            catalog_number = row.get('Catalog #', '')
-            opus = row.get('Opus', '')
-            opus_number = row.get('Opus Number', '')
-            initial_key = row.get('InitialKey', '')
-            epithet = row.get('Epithet', '')
-            movement = row.get('Movement', '')
-            title_parts = [work]
-            if work_number:
-                title_parts.append(f", {work_number}")
-            if catalog_number:
-                title_parts.append(f", {catalog_number}")
-            if opus:
-                title_parts.append(f", {opus}")
-            if opus_number:
-                title_parts.append(f", {opus_number}")
-            if initial_key:
-                title_parts.append(f", in {initial_key}")
-            if epithet:
-                title_parts.append(f", '{epithet}'")
-            if movement:
-                title_parts.append(f" - {movement}")
-
-            title = ''.join(title_parts)
-            audio_file['Title'] = title
-
-           # Save results
-            audio_file.save()
-
-            # Update tracking and DataManager object
+    rows = ((file_path, tags_df.loc[file_path]) for file_path in tags_df.index)
+    for file_path, row, updated, error in iter_update_tags(rows, data_mgr, profiler, total_files, skip_unchanged,
+                                                           compare_columns, padding_reserve, workers, worker_type,
+                                                           verify, journal):
+        if error is None:
             successful_paths.append(file_path)
-            if data_mgr:
-                audio_file = mutagen.flac.FLAC(file_path)
-                all_tags = dict(audio_file.tags)
-                data_mgr.save_updated_tags(file_path, all_tags)
-
-            # Rename the track
-            track_number = row.get('TrackNumber', '')
-            track_number = track_number.zfill(2)  # Pad the track number to two digits
-            # Sanitize the title
-            safe_title = re.sub(r'[\\/:*?"<>|]', '_', title)
-            new_file_name = f"{track_number} - {safe_title}.flac"
-            new_file_path = os.path.join(os.path.dirname(file_path), new_file_name)
-            os.rename(file_path, new_file_path)
-
-        except Exception as e:
+            skipped_count += not updated
+        else:
             failed_paths.append(file_path)
-            print(e)
     
     # Create success/failure dataframes
     successful_df = tags_df.loc[successful_paths]
     failed_df = tags_df.loc[failed_paths]
 
-    print(f"Completed!")
-    print(f"Successfully processed: {len(successful_df)} files")
-    print(f"Failed: {len(failed_df)} files")
+    report_update_counts(len(successful_df), len(failed_df), skipped_count if skip_unchanged else None)
+
+    return successful_df, failed_df
+
+def update_tags_from_rows(rows, failed_writer, data_mgr = None, profiler = None, total = None, skip_unchanged = False,
+                          compare_columns = None, padding_reserve = flacmeta.DEFAULT_PADDING_RESERVE,
+                          workers = 1, worker_type = 'process', verify = False, journal = None):
+    """
+    Update tags from rows which are read as they are needed, writing the rows which failed
+    as they occur. Neither the input nor the failures are held in memory.
+
+    If the run is stopped with Ctrl+C, the counts so far are reported before KeyboardInterrupt
+    is raised again.
+
+    Args:
+        rows (iterable): Yields (file_path, row), e.g., excel.ExcelReader.
+        failed_writer (stream.StreamWriter): Writer for the rows which failed, e.g., excel.ExcelStreamWriter.
+        data_mgr (DataManager): Optional. Archive the updated tags of each file.
+        profiler (profiling.Profiler): Optional. Record the time spent in each stage, and counts of
+            file opens, writes, renames and commits.
+        total (int): Optional. Number of rows, for the progress bar.
+        skip_unchanged (bool): Leave files which would not change as they are, see is_file_unchanged.
+        compare_columns (list): Optional. With skip_unchanged, only compare these tags.
+        padding_reserve (int): Bytes of padding to add to files which have to be rewritten.
+        workers (int): Number of workers, each updating whole albums, see iter_update_tags_parallel.
+        worker_type (str): 'process' or 'thread'.
+        verify (bool): Check the comment block of each saved file, see update_file_tags.
+        journal (journal.WriteJournal): Optional. Journal of the run, see update_file_tags.
+
+    Returns:
+        tuple: (successful_count, failed_count, skipped_count). Files skipped as unchanged are
+            also counted as successful.
+    """
+    if total is not None:
+        print(f"Updating {total} files...")
+    successful_count = 0
+    failed_count = 0
+    skipped_count = 0
+    try:
+        for file_path, row, updated, error in iter_update_tags(rows, data_mgr, profiler, total, skip_unchanged,
+                                                               compare_columns, padding_reserve, workers, worker_type,
+                                                               verify, journal):
+            if error is None:
+                successful_count += 1
+                skipped_count += not updated
+            else:
+                failed_writer.write(file_path, row)
+                failed_count += 1
+    # Report the files written so far. The failed writer is flushed when it is closed
+    except KeyboardInterrupt:
+        report_update_counts(successful_count, failed_count, skipped_count if skip_unchanged else None)
+        print(f"Interrupted after {successful_count + failed_count} files")
+        raise
+    report_update_counts(successful_count, failed_count, skipped_count if skip_unchanged else None)
+    return successful_count, failed_count, skipped_count
 
-    return successful_df, failed_df
\ No newline at end of file
+def report_update_counts(successful_count, failed_count, skipped_count = None):
+    """
+    Print the number of files which were updated and which failed.
+
+    Args:
+        successful_count (int): Number of files processed without errors.
+        failed_count (int): Number of files which failed.
+        skipped_count (int): Optional. Number of successful files which were left as they are,
+            as their tags were unchanged.
+
+    Returns:
+        None
+    """
+    print(f"Completed!")
+    print(f"Successfully processed: {successful_count} files")
+    if skipped_count is not None:
+        print(f"Skipped, tags unchanged: {skipped_count} files")
+    print(f"Failed: {failed_count} files")
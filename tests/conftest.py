@@ -0,0 +1,36 @@
+################################################################################
+### conftest.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import pytest
+from benchmarks.synthetic_library import generate_library
+
+################################################################################
+### Options
+################################################################################
+
+def pytest_addoption(parser):
+    parser.addoption('--library_size', type=int, default=60,
+                     help="Number of tracks in the synthetic_library fixture (default: 60). "
+                          "Raise it, e.g., to 100000, to run the tests which use it at scale")
+
+################################################################################
+### Fixtures
+################################################################################
+
+@pytest.fixture
+def synthetic_library(tmp_path, request):
+    """
+    Synthetic FLAC library, see benchmarks/synthetic_library.py.
+
+    Options of generate_library can be given with indirect parametrization, e.g.,
+    @pytest.mark.parametrize('synthetic_library', [{'nonconforming_share': 1}], indirect=True)
+    Returns the list of SyntheticTrack; the library is in tmp_path / 'library'.
+    """
+    options = {'tracks': request.config.getoption('library_size')}
+    options.update(getattr(request, 'param', {}))
+    return generate_library(str(tmp_path / 'library'), **options)
@@ -0,0 +1,97 @@
+################################################################################
+### test_excel.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import tracemalloc
+import pandas as pd
+import pytest
+import xlsxwriter
+from src.excel import ExcelReader, ExcelStreamWriter, cell_to_text, write_excel
+
+################################################################################
+### Tests
+################################################################################
+
+COLUMNS = ['Composer', 'Work', 'TrackNumber', 'Movement']
+
+RECORDS = [
+    ("/path/to/01 - Track.flac", {'Composer': 'Dvořák, Antonín', 'Work': 'Symphony', 'TrackNumber': '01',
+                                  'Movement': 'I. Adagio'}),
+    ("/path/to/02 - Track.flac", {'Composer': 'Dvořák, Antonín', 'Work': '=Symphony', 'TrackNumber': '02',
+                                  'Movement': None}),
+    ("/path/to/03 - Track.flac", {'Composer': 'https://example.com', 'Work': None}),
+]
+
+def test_write_excel_read_with_pandas(tmp_path):
+    path = str(tmp_path / "tags.xlsx")
+    assert write_excel(iter(RECORDS), path, COLUMNS, batch_size=2) == 3
+    # Read back as write mode did before, with pandas
+    tags_df = pd.read_excel(path, dtype=str, index_col=0).fillna('')
+    assert tags_df.index.tolist() == [track_path for track_path, _ in RECORDS]
+    assert tags_df.columns.tolist() == COLUMNS
+    assert tags_df.to_dict('index') == {track_path: {column: tags.get(column) or '' for column in COLUMNS}
+                                        for track_path, tags in RECORDS}
+    # Text is kept as text: leading zeros, and no formulas (DataFrame.to_excel writes '=Symphony' as a formula)
+    assert tags_df.loc["/path/to/01 - Track.flac", 'TrackNumber'] == '01'
+    assert tags_df.loc["/path/to/02 - Track.flac", 'Work'] == '=Symphony'
+
+def test_excel_reader_round_trip(tmp_path):
+    path = str(tmp_path / "tags.xlsx")
+    write_excel(RECORDS, path, COLUMNS)
+    with ExcelReader(path) as reader:
+        assert reader.columns == COLUMNS
+        assert reader.row_count == 3
+        rows = list(reader)
+    assert rows == [(track_path, {column: tags.get(column) or '' for column in COLUMNS})
+                    for track_path, tags in RECORDS]
+
+def test_excel_reader_edited_file(tmp_path):
+    # A file saved by hand: numbers typed into cells, a column without a header, an empty row
+    path = str(tmp_path / "tags.xlsx")
+    workbook = xlsxwriter.Workbook(path)
+    worksheet = workbook.add_worksheet()
+    worksheet.write_row(0, 1, ['Work', None, 'TrackNumber', 'Year Recorded'])
+    worksheet.write_row(1, 0, ["/path/to/01 - Track.flac", 'Symphony', 'note', 1, 1990.5])
+    worksheet.write_row(3, 0, ["/path/to/02 - Track.flac", 'Symphony', None, 2.0])
+    workbook.close()
+    with ExcelReader(path) as reader:
+        assert reader.columns == ['Work', 'TrackNumber', 'Year Recorded']
+        rows = list(reader)
+    assert rows == [("/path/to/01 - Track.flac", {'Work': 'Symphony', 'TrackNumber': '1', 'Year Recorded': '1990.5'}),
+                    ("/path/to/02 - Track.flac", {'Work': 'Symphony', 'TrackNumber': '2', 'Year Recorded': ''})]
+    # Same values as pandas gives
+    tags_df = pd.read_excel(path, dtype=str, index_col=0).fillna('')
+    assert tags_df.loc["/path/to/01 - Track.flac", 'TrackNumber'] == '1'
+    assert tags_df.loc["/path/to/01 - Track.flac", 'Year Recorded'] == '1990.5'
+
+@pytest.mark.parametrize('value, text', [(None, ''), ('Symphony', 'Symphony'), (3, '3'), (3.0, '3'), (3.5, '3.5')])
+def test_cell_to_text(value, text):
+    assert cell_to_text(value) == text
+
+def test_excel_writer_row_limit(tmp_path, mocker):
+    mocker.patch('src.excel.EXCEL_MAX_ROWS', 2)
+    with pytest.raises(ValueError, match="More than 2 rows do not fit in an Excel sheet."):
+        write_excel(RECORDS, str(tmp_path / "tags.xlsx"), COLUMNS, batch_size=1)
+
+def test_excel_memory_does_not_grow(tmp_path):
+    def records(count):
+        for i in range(count):
+            yield f"/path/to/{i:05d} - Track.flac", {column: f"{column} {i}" for column in COLUMNS}
+
+    peaks = []
+    for count in [100, 1000]:
+        path = str(tmp_path / f"tags_{count}.xlsx")
+        tracemalloc.start()
+        try:
+            write_excel(records(count), path, COLUMNS, batch_size=100)
+            with ExcelReader(path) as reader:
+                assert sum(1 for _ in reader) == count
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    # Ten times the rows, without ten times the memory
+    assert peaks[1] < 2 * peaks[0]
@@ -0,0 +1,173 @@
+################################################################################
+### test_flacmeta.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import struct
+import mutagen.flac
+import pytest
+from src.flacmeta import (
+                    FLACHeaderError, parse_streaminfo, parse_vorbis_comment,
+                    read_flac_metadata, read_vorbis_tags, save_flac, verify_vorbis_comment
+                    )
+
+################################################################################
+### Helper functions
+################################################################################
+
+def make_block(block_type, data, last=False):
+    """Build a metadata block: 1 byte flag/type, 3 bytes length, body"""
+    return bytes([block_type | (0x80 if last else 0)]) + len(data).to_bytes(3, 'big') + data
+
+def make_streaminfo(sample_rate=44100, channels=2, bits_per_sample=16, total_samples=0):
+    packed = (sample_rate << 44) | ((channels - 1) << 41) | ((bits_per_sample - 1) << 36) | total_samples
+    return struct.pack('>HH', 4096, 4096) + (0).to_bytes(3, 'big') * 2 + packed.to_bytes(8, 'big') + bytes(16)
+
+def make_vorbis_comment(comments, vendor='test'):
+    data = struct.pack('<I', len(vendor)) + vendor.encode()
+    data += struct.pack('<I', len(comments))
+    for comment in comments:
+        encoded = comment.encode('utf-8')
+        data += struct.pack('<I', len(encoded)) + encoded
+    return data
+
+def make_flac(comments, picture_size=0, padding=0):
+    blocks = [make_block(0, make_streaminfo())]
+    if picture_size:
+        blocks.append(make_block(6, b'\xff' * picture_size))
+    blocks.append(make_block(4, make_vorbis_comment(comments)))
+    blocks.append(make_block(1, bytes(padding), last=True))
+    # Follow the metadata with the start of an audio frame
+    return b'fLaC' + b''.join(blocks) + b'\xff\xf8\x69\x08'
+
+@pytest.fixture
+def flac_file(tmp_path):
+    path = tmp_path / "01 - Track.flac"
+    path.write_bytes(make_flac(['TITLE=Symphony No 41', 'Composer=Mozart', 'GENRE=Classical', 'genre=Symphony'],
+                               picture_size=5000, padding=1024))
+    return str(path)
+
+################################################################################
+### Tests
+################################################################################
+
+def test_parse_streaminfo():
+    info = parse_streaminfo(make_streaminfo(96000, 2, 24, 123456))
+    assert info['sample_rate'] == 96000
+    assert info['channels'] == 2
+    assert info['bits_per_sample'] == 24
+    assert info['total_samples'] == 123456
+
+def test_parse_vorbis_comment():
+    vendor, tags = parse_vorbis_comment(make_vorbis_comment(['TITLE=Symphony', 'EMPTY=']))
+    assert vendor == 'test'
+    assert tags == {'title': ['Symphony'], 'empty': ['']}
+
+def test_parse_vorbis_comment_truncated():
+    with pytest.raises(FLACHeaderError):
+        parse_vorbis_comment(make_vorbis_comment(['TITLE=Symphony'])[:-3])
+
+@pytest.mark.parametrize('use_mmap', [True, False])
+def test_read_flac_metadata(flac_file, use_mmap):
+    metadata = read_flac_metadata(flac_file, use_mmap=use_mmap)
+    assert metadata['streaminfo']['sample_rate'] == 44100
+    assert metadata['tags'] == {'title': ['Symphony No 41'], 'composer': ['Mozart'],
+                                'genre': ['Classical', 'Symphony']}
+    assert metadata['padding'] == 1024
+    assert metadata['pictures'] == 1
+    assert not metadata['id3']
+    with open(flac_file, 'rb') as f:
+        assert f.read()[metadata['audio_offset']:] == b'\xff\xf8\x69\x08'
+    # Everything up to the first audio frame is read, except the picture and the padding,
+    # plus the 10 bytes checked for an ID3 header
+    assert metadata['bytes_read'] == metadata['audio_offset'] - 5000 - metadata['padding'] + 10
+
+def test_read_flac_metadata_matches_mutagen(tmp_path):
+    path = tmp_path / "01 - Track.flac"
+    path.write_bytes(make_flac(['TITLE=Symphony No 41', 'GENRE=Classical', 'genre=Symphony'], padding=1024))
+    tags = read_flac_metadata(str(path))['tags']
+    audio_file = mutagen.flac.FLAC(str(path))
+    assert tags == dict(audio_file.tags)
+
+def test_read_flac_metadata_with_id3(tmp_path):
+    path = tmp_path / "01 - Track.flac"
+    id3 = b'ID3\x03\x00\x00' + bytes([0, 0, 0, 20]) + bytes(20)
+    path.write_bytes(id3 + make_flac(['TITLE=Symphony']))
+    metadata = read_flac_metadata(str(path))
+    assert metadata['tags'] == {'title': ['Symphony']}
+    assert metadata['id3']
+
+def test_read_flac_metadata_not_flac(tmp_path):
+    path = tmp_path / "01 - Track.flac"
+    path.write_bytes(b'RIFF' + bytes(100))
+    with pytest.raises(FLACHeaderError, match="Not a FLAC file."):
+        read_flac_metadata(str(path))
+
+def test_read_flac_metadata_truncated(tmp_path):
+    path = tmp_path / "01 - Track.flac"
+    path.write_bytes(make_flac(['TITLE=Symphony'], picture_size=5000)[:2000])
+    with pytest.raises(FLACHeaderError):
+        read_flac_metadata(str(path))
+
+def test_read_vorbis_tags_falls_back_to_mutagen(tmp_path, mocker):
+    path = tmp_path / "01 - Track.flac"
+    path.write_bytes(b'RIFF' + bytes(100))
+    mock_flac = mocker.MagicMock()
+    mock_flac.tags = {'title': ['Symphony']}
+    mock_open = mocker.patch('mutagen.flac.FLAC', return_value=mock_flac)
+    assert read_vorbis_tags(str(path)) == {'title': ['Symphony']}
+    mock_open.assert_called_once_with(str(path))
+
+def test_save_flac_in_place(tmp_path):
+    path = tmp_path / "01 - Track.flac"
+    # Much more padding than mutagen's default policy keeps
+    path.write_bytes(make_flac(['TITLE=Symphony No 41', 'GENRE=Classical'], padding=100000))
+    size = path.stat().st_size
+    audio_file = mutagen.flac.FLAC(str(path))
+    audio_file.tags.clear()
+    audio_file['title'] = 'Symphony No 41 in C major'
+    assert save_flac(audio_file)
+    # The audio has not moved, and the tags which grew took their space from the padding
+    assert path.stat().st_size == size
+    assert path.read_bytes().endswith(b'\xff\xf8\x69\x08')
+    metadata = read_flac_metadata(str(path))
+    assert metadata['tags'] == {'title': ['Symphony No 41 in C major']}
+    assert metadata['padding'] > 99000
+
+def test_save_flac_rewrite_adds_padding_reserve(tmp_path):
+    path = tmp_path / "01 - Track.flac"
+    path.write_bytes(make_flac(['TITLE=Symphony'], padding=10))
+    audio_file = mutagen.flac.FLAC(str(path))
+    audio_file['comment'] = 'x' * 1000
+    assert not save_flac(audio_file, padding_reserve=4096)
+    metadata = read_flac_metadata(str(path))
+    assert metadata['tags']['comment'] == ['x' * 1000]
+    assert metadata['padding'] == 4096
+
+def test_save_flac_reuses_id3_space(tmp_path):
+    path = tmp_path / "01 - Track.flac"
+    id3 = b'ID3\x03\x00\x00' + bytes([0, 0, 0, 100]) + bytes(100)
+    path.write_bytes(id3 + make_flac(['TITLE=Symphony']))
+    size = path.stat().st_size
+    audio_file = mutagen.flac.FLAC(str(path))
+    audio_file['genre'] = 'Classical'
+    assert save_flac(audio_file, deleteid3=True)
+    assert path.stat().st_size == size
+    metadata = read_flac_metadata(str(path))
+    assert not metadata['id3']
+    assert metadata['tags'] == {'title': ['Symphony'], 'genre': ['Classical']}
+
+def test_verify_vorbis_comment(tmp_path):
+    path = tmp_path / "01 - Track.flac"
+    path.write_bytes(make_flac(['TITLE=Symphony'], padding=1024))
+    audio_file = mutagen.flac.FLAC(str(path))
+    audio_file['genre'] = 'Classical'
+    save_flac(audio_file)
+    assert verify_vorbis_comment(str(path), audio_file) > 0
+    # A comment block which was not written as expected is detected
+    audio_file['genre'] = 'Symphony'
+    with pytest.raises(FLACHeaderError, match="does not match"):
+        verify_vorbis_comment(str(path), audio_file)
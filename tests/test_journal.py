@@ -0,0 +1,118 @@
+################################################################################
+### test_journal.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import os
+import signal
+import mutagen.flac
+import pandas as pd
+import pytest
+from src.journal import DONE, FAILED, PLANNED, ROLLED_BACK, WriteJournal, rollback
+from src.profiling import Profiler
+from src.write import build_title, get_new_file_path, get_target_tags, iter_update_tags, update_tags
+
+################################################################################
+### Tests
+################################################################################
+
+ROW = {'Composer': 'Mozart, Wolfgang Amadeus', 'Work': 'Symphony No. 41', 'Movement': 'I. Allegro vivace'}
+
+def make_rows(synthetic_library):
+    """Rows for the tracks of the synthetic library, as read from a tag table."""
+    return [(track.path, {**ROW, 'TrackNumber': str(number)}) for number, track in enumerate(synthetic_library, 1)]
+
+def get_state(file_path):
+    """Vorbis comments and pictures of a file."""
+    audio_file = mutagen.flac.FLAC(file_path)
+    return list(audio_file.tags), [picture.write() for picture in audio_file.pictures]
+
+def test_plan_and_complete(synthetic_library, tmp_path):
+    file_path = synthetic_library[0].path
+    with WriteJournal(str(tmp_path / 'journal.db')) as journal:
+        journal.plan(file_path, file_path + '.new', mutagen.flac.FLAC(file_path), get_target_tags(ROW))
+        assert journal.get_counts() == {PLANNED: 1}
+        assert not journal.is_done(file_path)
+        journal.fail(file_path, OSError("Disk full"))
+        assert journal.get_counts() == {FAILED: 1}
+        # Planning the file again keeps its original state
+        journal.plan(file_path, file_path + '.new', mutagen.flac.FLAC(file_path), {'Title': 'Other'})
+        [(planned_path, new_file_path, original_tags, pictures)] = journal.iter_operations()
+        assert planned_path == os.path.abspath(file_path)
+        assert original_tags == list(mutagen.flac.FLAC(file_path).tags)
+        journal.complete(file_path)
+        assert journal.is_done(file_path)
+        assert journal.get_counts() == {DONE: 1}
+
+def test_is_done_renamed_file(synthetic_library, tmp_path):
+    file_path = synthetic_library[0].path
+    with WriteJournal(str(tmp_path / 'journal.db')) as journal:
+        journal.plan(file_path, file_path + '.new', mutagen.flac.FLAC(file_path), get_target_tags(ROW))
+        # The run stopped after the rename, before the file was marked as done
+        os.rename(file_path, file_path + '.new')
+        assert journal.is_done(file_path)
+        assert journal.get_counts() == {DONE: 1}
+
+@pytest.mark.parametrize('synthetic_library', [{'picture_size': 2000}], indirect=True)
+def test_rollback(synthetic_library, tmp_path):
+    states = {track.path: get_state(track.path) for track in synthetic_library}
+    rows = make_rows(synthetic_library)
+    tags_df = pd.DataFrame([row for _, row in rows], index=[file_path for file_path, _ in rows])
+    with WriteJournal(str(tmp_path / 'journal.db')) as journal:
+        successful_df, failed_df = update_tags(tags_df, journal=journal)
+        assert len(successful_df) == len(synthetic_library)
+        assert not any(os.path.exists(track.path) for track in synthetic_library)
+        assert journal.get_counts() == {DONE: len(synthetic_library)}
+        # The tracks share the same cover, which is stored once
+        assert journal.cursor.execute('SELECT COUNT(*) FROM pictures').fetchone()[0] == 1
+
+        assert rollback(journal) == (len(synthetic_library), 0)
+        assert {track.path: get_state(track.path) for track in synthetic_library} == states
+        assert journal.get_counts() == {ROLLED_BACK: len(synthetic_library)}
+        # Rolled back files are not restored again
+        assert rollback(journal) == (0, 0)
+
+@pytest.mark.parametrize('worker_type', ['process', 'thread'])
+def test_journal_workers(synthetic_library, tmp_path, worker_type):
+    states = {track.path: get_state(track.path) for track in synthetic_library}
+    rows = make_rows(synthetic_library)
+    with WriteJournal(str(tmp_path / 'journal.db')) as journal:
+        results = list(iter_update_tags(rows, journal=journal, workers=2, worker_type=worker_type))
+        assert all(updated for _, _, updated, _ in results)
+        assert journal.get_counts() == {DONE: len(rows)}
+        rollback(journal)
+    assert {track.path: get_state(track.path) for track in synthetic_library} == states
+
+def test_resume(synthetic_library, tmp_path):
+    rows = make_rows(synthetic_library)
+    with WriteJournal(str(tmp_path / 'journal.db')) as journal:
+        # The first run stops after a few files
+        results = iter_update_tags(rows, journal=journal)
+        for _ in range(5):
+            next(results)
+        results.close()
+        profiler = Profiler()
+        results = list(iter_update_tags(rows, profiler=profiler, journal=journal))
+        assert all(error is None for _, _, _, error in results)
+        assert [updated for _, _, updated, _ in results] == [False] * 5 + [True] * (len(rows) - 5)
+        assert profiler.counters['resumed_files'] == 5
+        assert journal.get_counts() == {DONE: len(rows)}
+    for file_path, row in rows:
+        assert os.path.exists(get_new_file_path(file_path, row, build_title(row)))
+
+def test_interrupt_stops_after_current_file(synthetic_library, tmp_path):
+    rows = make_rows(synthetic_library)
+    results = []
+    with WriteJournal(str(tmp_path / 'journal.db')) as journal:
+        with pytest.raises(KeyboardInterrupt):
+            for result in iter_update_tags(rows, journal=journal):
+                results.append(result)
+                os.kill(os.getpid(), signal.SIGINT)
+        assert len(results) == 1
+        assert journal.get_counts() == {DONE: 1}
+    # The handler of the test run is restored
+    assert signal.getsignal(signal.SIGINT) is signal.default_int_handler
+    assert os.path.exists(rows[1][0])
@@ -0,0 +1,37 @@
+################################################################################
+### test_memory.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import sys
+import tracemalloc
+import pytest
+from src.memory import format_memory_report, get_peak_rss, get_rss
+
+################################################################################
+### Tests
+################################################################################
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="RSS is not measured on Windows")
+def test_rss():
+    rss = get_rss()
+    peak_rss = get_peak_rss()
+    assert rss > 0 and peak_rss > 0
+    # Filling a large buffer raises the resident memory and its high-water mark
+    buffer = b'x' * (64 * 1024 * 1024)
+    assert get_rss() > rss + 32 * 1024 * 1024
+    assert get_peak_rss() >= rss + 32 * 1024 * 1024
+    del buffer
+
+def test_format_memory_report():
+    assert format_memory_report().startswith("Peak memory (RSS): ")
+    assert 'tracemalloc' not in format_memory_report()
+    tracemalloc.start()
+    try:
+        data = [str(i) for i in range(10000)]
+        assert format_memory_report().splitlines()[1].startswith("Peak memory (tracemalloc): ")
+    finally:
+        tracemalloc.stop()
@@ -0,0 +1,118 @@
+################################################################################
+### test_profiling.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import pandas as pd
+import pytest
+from src.profiling import Profiler, count, get_active, profile, stage
+from src.predict import DataManager
+from src.read import get_tags, get_tracks_create_dataframe, iter_tags
+from src.write import update_tags
+
+################################################################################
+### Tests
+################################################################################
+
+def test_profiler_stages_and_counters():
+    profiler = Profiler()
+    for _ in range(3):
+        with profiler.stage('open'):
+            pass
+    profiler.count('flac_opens', 3)
+    profiler.count('bytes_read', 100)
+    assert profiler.calls['open'] == 3
+    assert profiler.times['open'] >= 0
+    assert profiler.counters == {'flac_opens': 3, 'bytes_read': 100}
+
+def test_stage_and_count_without_active_profiler():
+    assert get_active() is None
+    with stage('open'):
+        count('flac_opens')
+    assert get_active() is None
+
+def test_profile_activates_and_restores():
+    outer, inner = Profiler(), Profiler()
+    with profile(outer):
+        # None leaves the active profiler in place, so optional profilers can be nested
+        with profile(None):
+            count('tracks')
+        with profile(inner):
+            with stage('parse_title'):
+                count('tracks')
+        assert get_active() is outer
+    assert get_active() is None
+    assert outer.counters == {'tracks': 1}
+    assert inner.counters == {'tracks': 1}
+    assert inner.calls == {'parse_title': 1}
+
+def test_snapshot_and_merge():
+    worker, parent = Profiler(), Profiler()
+    worker.add_time('open', 0.5, calls=2)
+    worker.count('flac_opens', 2)
+    snapshot = worker.snapshot(reset=True)
+    assert not worker.counters and not worker.times
+    parent.merge(snapshot)
+    parent.merge(snapshot)
+    assert parent.times['open'] == pytest.approx(1.0)
+    assert parent.calls['open'] == 4
+    assert parent.counters['flac_opens'] == 4
+
+def test_format_report():
+    profiler = Profiler()
+    profiler.add_time('open', 0.002, calls=4)
+    profiler.count('tracks', 4)
+    profiler.count('flac_opens', 8)
+    profiler.count('custom', 1)
+    lines = profiler.format_report().splitlines()
+    assert lines[0].split() == ['Stage', 'Calls', 'Time', '(s)', 'Per', 'call', '(ms)', 'Share']
+    assert lines[1].split()[:4] == ['open', '4', '0.002', '0.500']
+    assert any(line.startswith('Total (wall)') for line in lines)
+    counter_lines = lines[lines.index('') + 2:]
+    # Known counters in a fixed order, then the others
+    assert [line.split()[0] for line in counter_lines] == ['tracks', 'flac_opens', 'custom']
+    assert counter_lines[1].split()[:3] == ['flac_opens', '8', '2.00']
+
+@pytest.mark.parametrize('workers, worker_type', [(1, 'process'), (2, 'process'), (2, 'thread')])
+def test_get_tags_profile(synthetic_library, tmp_path, workers, worker_type):
+    profiler = Profiler()
+    data_mgr = DataManager(str(tmp_path / 'tags.db'))
+    tags_df = get_tracks_create_dataframe(str(tmp_path / 'library'))
+    get_tags(tags_df, data_mgr, workers, worker_type, profiler=profiler)
+    data_mgr.close()
+    tracks = len(synthetic_library)
+    assert profiler.counters['tracks'] == tracks
+    # Each track is opened once, also in worker processes
+    assert profiler.counters['flac_opens'] == tracks
+    assert profiler.counters['bytes_read'] > 0
+    assert profiler.counters['sqlite_commits'] >= tracks
+    for name in ['open', 'parse_album', 'parse_title', 'parse_tags', 'data_manager']:
+        assert profiler.calls[name] == tracks
+    assert profiler.calls['fill_dataframe'] == 1
+    assert get_active() is None
+
+def test_iter_tags_profile_title_batches(synthetic_library, tmp_path):
+    profiler = Profiler()
+    track_paths = [track.path for track in synthetic_library]
+    records = list(iter_tags(track_paths, title_batch_size=25, profiler=profiler))
+    assert len(records) == len(track_paths)
+    batches = -(-len(track_paths) // 25)
+    assert profiler.calls['parse_title'] == len(track_paths) + batches
+
+def test_update_tags_profile(synthetic_library, tmp_path):
+    profiler = Profiler()
+    tags_df = pd.DataFrame({'Work': 'Symphony', 'TrackNumber': [str(i) for i in range(len(synthetic_library))]},
+                           index=[track.path for track in synthetic_library])
+    successful_df, failed_df = update_tags(tags_df, profiler=profiler)
+    tracks = len(synthetic_library)
+    assert len(successful_df) == tracks
+    assert profiler.counters['flac_opens'] == tracks
+    # The old tags are deleted in memory, so each file is written once
+    assert profiler.counters['file_writes'] == tracks
+    assert profiler.counters['inplace_saves'] + profiler.counters['full_rewrites'] == tracks
+    assert profiler.counters['renames'] == tracks
+    for name in ['open', 'set_tags', 'save', 'rename']:
+        assert profiler.calls[name] == tracks
@@ -6,17 +6,21 @@
 ################################################################################
 ### Import packages
 ################################################################################
+import logging
 import os
 import pandas as pd
 import pytest
 from src.read import (
+                    # Read track metadata
+                    TrackMetadata, get_track_metadata,
                     # Create dataframe to store tags
                     get_flac_files, create_tags_dataframe, get_tracks_create_dataframe,
+                    TAG_COLUMNS, fill_tags_dataframe,
                     # Process track path: get album string, disc number from track path
                     get_album_string_from_track_path, get_disc_number_from_track_path,
                     parse_performer_string, parse_fields_from_matching_album_string,
                     get_tags_from_file_with_unmatched_album_string, 
-                    get_album_fields_from_track_path,
+                    get_album_fields_from_track_path, AlbumFieldCache,
                     # Process track string:
                     parse_movement_from_title, parse_epithet_from_title,
                     parse_opus_opusnumber_worknumber_from_title, parse_catalog_from_title,
@@ -25,9 +29,16 @@ from src.read import (
                     # Read remaining tags: composer, genre
                     get_genre_composer_tags_from_file,
                     # Final function
-                    get_tags
+                    get_tags, group_tracks_by_directory, read_tracks_parallel,
+                    iter_tracks_parallel, iter_tracks_serial, iter_tags,
+                    TitleCache, parse_work_fields, parse_work_fields_stepwise, parse_title_single_pass,
+                    parse_title_stepwise, parse_titles, TITLE_COLUMNS,
+                    # Read in chunks
+                    get_album_directory, iter_album_chunks
                     )
+import itertools
 import re
+from tests.test_flacmeta import make_flac
 
 ################################################################################
 ### Tests for functions associated with
@@ -62,6 +73,24 @@ def test_create_tags_dataframe(setup_test_dir):
     assert tags_df.index.tolist() == track_path_list
     assert 'Composer' in tags_df.columns
 
+# Test fill_tags_dataframe
+def test_fill_tags_dataframe():
+    track_path_list = ["/path/to/01 - Track.flac", "/path/to/02 - Track.flac"]
+    tags_df = create_tags_dataframe(track_path_list)
+    records = {"/path/to/01 - Track.flac": {'Album': 'Album', 'Year Recorded': '2024', 'Orchestra': 'Orchestra',
+                                            'Conductor': None, 'DiscNumber': None, 'TrackNumber': '01',
+                                            'Work': 'Symphony', 'Work Number': 'No 41', 'InitialKey': 'C',
+                                            'Catalog #': 'K 551', 'Opus': None, 'Opus Number': None,
+                                            'Epithet': 'Jupiter', 'Movement': 'I. Allegro vivace',
+                                            'Genre': 'Classical', 'Composer': 'Mozart'}}
+    tags_df = fill_tags_dataframe(tags_df, records)
+    assert tags_df.columns.tolist() == TAG_COLUMNS
+    assert tags_df.index.tolist() == track_path_list
+    assert tags_df.loc["/path/to/01 - Track.flac", 'Work'] == 'Symphony'
+    assert tags_df.loc["/path/to/01 - Track.flac", 'Conductor'] is None
+    # Tracks without a record are left empty
+    assert tags_df.loc["/path/to/02 - Track.flac", 'Work'] is None
+
 # Integration test: get_tracks_create_dataframe
 def test_get_tracks_create_dataframe(setup_test_dir):
     test_dir, test_file = setup_test_dir
@@ -69,6 +98,48 @@ def test_get_tracks_create_dataframe(setup_test_dir):
     assert tags_df.index.tolist() == [str(test_file)]
     assert 'Composer' in tags_df.columns
 
+################################################################################
+### Tests for functions associated with
+### Read track metadata: open each FLAC file once and share the result
+################################################################################
+
+def test_get_track_metadata_from_path(mocker):
+    # Use mocking because 1) test FLAC file doesn't exist, 2) don't want to test mutagen
+    mock_flac = mocker.MagicMock()
+    mock_flac.tags = {'title': ['Symphony']}
+    mock_flac.__getitem__.side_effect = lambda x: {'title': ['Symphony']}[x]
+    mocker.patch('mutagen.flac.FLAC', return_value=mock_flac)
+
+    path = "/path/to/Genre/Composer/Album/01 - Track.flac"
+    track = get_track_metadata(path)
+    assert track.track_path == path
+    assert track['title'] == ['Symphony']
+    assert 'title' in track
+    assert 'composer' not in track
+
+def test_get_track_metadata_header_only(tmp_path, mocker):
+    # A valid FLAC file is read by the header-only reader, without opening it in mutagen
+    path = tmp_path / "01 - Track.flac"
+    path.write_bytes(make_flac(['TITLE=Symphony', 'COMPOSER=Mozart']))
+    mock_open = mocker.patch('mutagen.flac.FLAC')
+
+    track = get_track_metadata(str(path))
+    assert track['title'] == ['Symphony']
+    assert 'composer' in track
+    assert track.all_tags() == {'title': ['Symphony'], 'composer': ['Mozart']}
+    mock_open.assert_not_called()
+
+def test_get_track_metadata_from_snapshot(mocker):
+    mock_flac = mocker.MagicMock()
+    track = TrackMetadata("/path/to/01 - Track.flac", mock_flac)
+    assert get_track_metadata(track) is track
+
+def test_get_track_metadata_no_tags(mocker):
+    mock_flac = mocker.MagicMock()
+    mock_flac.tags = None
+    track = TrackMetadata("/path/to/01 - Track.flac", mock_flac)
+    assert 'title' not in track
+
 ################################################################################
 ### Tests for functions associated with
 ### Process track path: get album string, disc number from track path
@@ -208,6 +279,33 @@ def test_get_album_fields_from_track_path_unmatched(mocker):
     assert conductor == "Conductor"
 
 
+# Test AlbumFieldCache
+def test_album_field_cache_reuses_folder():
+    cache = AlbumFieldCache()
+    album_dir = "/path/to/Genre/Composer/[2024] Album (Orchestra with Conductor)"
+    assert cache.get_album_fields(f"{album_dir}/Disc 1/01 - Track.flac") == ("Album", "2024", "Orchestra", "Conductor", "1")
+    assert cache.get_album_fields(f"{album_dir}/Disc 1/02 - Track.flac") == ("Album", "2024", "Orchestra", "Conductor", "1")
+    assert cache.get_album_fields(f"{album_dir}/Disc 2/01 - Track.flac") == ("Album", "2024", "Orchestra", "Conductor", "2")
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_album_field_cache_unmatched_opens_file_once(mocker):
+    # Use mocking because 1) test FLAC file doesn't exist, 2) don't want to test mutagen
+    mock_flac = mocker.MagicMock()
+    mock_flac.__getitem__.side_effect = lambda x: {
+        'album': ['Album'],
+        'year': ['2024'],
+        'orchestra': ['Orchestra'],
+        'conductor': ['Conductor']
+    }[x]
+    mock_open = mocker.patch('mutagen.flac.FLAC', return_value=mock_flac)
+
+    cache = AlbumFieldCache()
+    for track_number in range(1, 4):
+        result = cache.get_album_fields(f"/path/to/Genre/Composer/Album/0{track_number} - Track.flac")
+        assert result == ("Album", "2024", "Orchestra", "Conductor", None)
+    assert mock_open.call_count == 1
+    assert (cache.hits, cache.misses) == (2, 1)
+
 ################################################################################
 ### Tests for functions associated with
 ### Process track string
@@ -452,6 +550,80 @@ def test_parse_fields_from_title_tag4(mocker):
     assert epithet == "Eroica"
     assert movement == "I. Allegro con brio"
 
+def test_parse_fields_from_title_tag_single_pass_once(mocker):
+    # A title the single pass does not match is parsed step by step, without a second single pass
+    mock_flac = mocker.MagicMock()
+    mock_flac.__getitem__.side_effect = lambda x: {
+        'title': ["Symphony No 41 in C, 'Jupiter' - I. Allegro vivace"]
+    }[x]
+    mocker.patch('mutagen.flac.FLAC', return_value=mock_flac)
+    single_pass = mocker.patch('src.read.parse_title_single_pass', side_effect=parse_title_single_pass)
+
+    path = "/path/to/Genre/Composer/Album/01 - Track.flac"
+    fields = parse_fields_from_title_tag(path)
+    assert single_pass.call_count == 1
+    assert fields == parse_work_fields_stepwise("Symphony No 41 in C, 'Jupiter'") + ("I. Allegro vivace",)
+
+# Test parse_title_single_pass against the step-by-step parse
+# Every combination of the optional fields, with and without the commas
+TITLE_PARTS = [["Symphony", "Concerto for 2 Violins", "Te Deum"], ["", " No 5"],
+               ["", " in D", " in D minor", " in B-flat"], ["", " 'Eroica'", ", 'Eroica'"],
+               ["", ", Op 3", ", Op 27 No 2"], ["", ", BWV 1043", ", Hob.I:94"],
+               ["", " - I. Allegro", " - II. Allegro, ma non troppo - Presto"]]
+
+@pytest.mark.parametrize('title', [
+    "Concerto Grosso in G, Op 6 No 1, HWV 319 - I. A tempo giusto",
+    "String Quartet No 75 in G, Op 76 No 1, Hob.III:75 - I. Allegro con spirito",
+    "Symphony No 41 in C, 'Jupiter', K 551 - I. Allegro vivace",
+    "Symphony No 3 in E-flat, 'Eroica', Op 55 - I. Allegro con brio",
+    "Symphony No 41 in C, 'Jupiter', K 551",
+    "Symphony No 9 in C, 'Great', D 944 - I. Andante - Allegro ma non troppo",
+    "Mass in B minor, BWV 232 - I. Kyrie eleison",
+    "Cello Suite No 1 in G, BWV 1007",
+])
+def test_parse_title_single_pass(title):
+    assert parse_title_single_pass(title) == parse_title_stepwise(title)
+
+@pytest.mark.parametrize('title', [
+    # The step-by-step parse keeps a trailing epithet in the work
+    "Symphony No 41 in C, 'Jupiter' - I. Allegro vivace",
+    # ... and drops a major key followed by a work number and an opus
+    "Symphony No 3 in E, Op 55 - I. Allegro con brio",
+    # ... and does not recognise minor keys with accidentals
+    "Piano Sonata No 14 in C-sharp minor, 'Moonlight', Op 27 No 2 - I. Adagio sostenuto",
+    # ... and splits at the last movement
+    "Quartet - I. Allegro - II. Adagio",
+])
+def test_parse_title_single_pass_leaves_other_layouts(title):
+    assert parse_title_single_pass(title) is None
+    work, movement = parse_movement_from_title(title)
+    assert parse_work_fields(work) == parse_work_fields_stepwise(work)
+
+def test_parse_title_single_pass_matches_stepwise_parse():
+    matched = 0
+    for title in map(''.join, itertools.product(*TITLE_PARTS)):
+        fields = parse_title_single_pass(title)
+        if fields is not None:
+            assert fields == parse_title_stepwise(title), title
+            matched += 1
+    assert matched > 1500
+
+# Test parse_titles
+def test_parse_titles_matches_per_track_parse():
+    titles = pd.Series([''.join(parts) for parts in itertools.product(*TITLE_PARTS)])
+    fields = parse_titles(titles)
+    assert list(fields.columns) == TITLE_COLUMNS
+    assert list(fields.itertuples(index=False, name=None)) == [parse_title_stepwise(title) for title in titles]
+
+def test_parse_titles_missing_titles():
+    titles = pd.Series([None, "Symphony No 41 in C, 'Jupiter', K 551 - I. Allegro vivace", float('nan')],
+                       index=['a.flac', 'b.flac', 'c.flac'])
+    fields = parse_titles(titles)
+    assert list(fields.index) == ['a.flac', 'b.flac', 'c.flac']
+    assert fields.loc['a.flac'].tolist() == [None] * 8
+    assert fields.loc['b.flac', 'Epithet'] == 'Jupiter'
+    assert fields.loc['c.flac'].tolist() == [None] * 8
+
 # Test get_tags_from_file_without_title_tag
 def test_get_tags_from_file_without_title_tag(mocker):
     # Use mocking because 1) test FLAC file doesn't exist, 2) don't want to test mutagen
@@ -735,4 +907,193 @@ def test_get_tags_4(mocker):
     assert df.loc[path, 'Orchestra'] == 'Berlin'
     assert df.loc[path, 'Conductor'] == 'Karajan'
     assert df.loc[path, 'Genre'] == 'Classical'
-    assert df.loc[path, 'Composer'] == 'Beethoven, Ludwig van'
\ No newline at end of file
+    assert df.loc[path, 'Composer'] == 'Beethoven, Ludwig van'
+
+def test_get_tags_opens_file_once(mocker):
+    # Mock FLAC file without album info in the path, so every helper needs the file tags
+    mock_flac = mocker.MagicMock()
+    mock_flac.tags = {'title': ["Symphony No 41 in C, 'Jupiter', K 551 - I. Allegro vivace"]}
+    mock_flac.__getitem__.side_effect = lambda x: {
+        'title': ["Symphony No 41 in C, 'Jupiter', K 551 - I. Allegro vivace"],
+        'tracknumber': ['01'],
+        'album': ['Symphonies Nos 35 & 41'],
+        'year': ['1960'],
+        'genre': ['Classical'],
+        'composer': ['Mozart, Wolfgang Amadeus']
+    }[x]
+
+    # Mock mutagen.flac.FLAC
+    mock_open = mocker.patch('mutagen.flac.FLAC', return_value=mock_flac)
+    mock_data_mgr = mocker.MagicMock()
+
+    path = "/path/to/02 - Classical/Mozart, Wolfgang Amadeus/Symphonies/Symphonies/01 - Symphony.flac"
+    df = pd.DataFrame(index=[path])
+    df = get_tags(df, mock_data_mgr)
+
+    assert mock_open.call_count == 1
+    mock_data_mgr.save_original_tags.assert_called_once()
+    assert df.loc[path, 'Album'] == 'Symphonies Nos 35 & 41'
+    assert df.loc[path, 'Work'] == 'Symphony'
+    assert df.loc[path, 'Composer'] == 'Mozart, Wolfgang Amadeus'
+
+################################################################################
+### Tests for parallel read mode
+################################################################################
+
+@pytest.fixture
+def flac_library(tmp_path):
+    # Two albums following the naming convention, one with two discs
+    titles = ["Symphony No 41 in C, 'Jupiter', K 551 - I. Allegro vivace",
+              "Symphony No 41 in C, 'Jupiter', K 551 - II. Andante cantabile"]
+    album_dirs = [tmp_path / "[1960] Symphonies (Columbia SO with Bruno Walter)",
+                  tmp_path / "[1971] Concerti Grossi (Munchener Bach-Orchester with Karl Richter)" / "Disc 1",
+                  tmp_path / "[1971] Concerti Grossi (Munchener Bach-Orchester with Karl Richter)" / "Disc 2"]
+    track_path_list = []
+    for album_dir in album_dirs:
+        album_dir.mkdir(parents=True)
+        for track_number, title in enumerate(titles, start=1):
+            path = album_dir / f"0{track_number} - Track.flac"
+            path.write_bytes(make_flac([f'TITLE={title}', f'TRACKNUMBER=0{track_number}', 'COMPOSER=Mozart']))
+            track_path_list.append(str(path))
+    return sorted(track_path_list)
+
+def test_group_tracks_by_directory():
+    paths = ["/a/Disc 1/01.flac", "/a/Disc 1/02.flac", "/a/Disc 2/01.flac", "/b/01.flac"]
+    assert group_tracks_by_directory(paths) == [paths[:2], [paths[2]], [paths[3]]]
+
+@pytest.mark.parametrize('worker_type', ['process', 'thread'])
+def test_get_tags_parallel_matches_serial(flac_library, worker_type):
+    serial_df = get_tags(create_tags_dataframe(flac_library))
+    parallel_df = get_tags(create_tags_dataframe(flac_library), workers=2, worker_type=worker_type)
+    assert parallel_df.index.tolist() == flac_library
+    assert parallel_df.columns.tolist() == serial_df.columns.tolist()
+    pd.testing.assert_frame_equal(parallel_df, serial_df)
+
+def test_read_tracks_parallel_reports_failures(flac_library, tmp_path):
+    corrupt_path = tmp_path / "[1960] Symphonies (Columbia SO with Bruno Walter)" / "03 - Corrupt.flac"
+    corrupt_path.write_bytes(b'RIFF' + bytes(100))
+    results, failures, worker_counts, cache_counts = read_tracks_parallel(flac_library + [str(corrupt_path)], 2, 'thread')
+    assert set(results) == set(flac_library)
+    assert list(failures) == [str(corrupt_path)]
+    assert sum(failed for _, failed in worker_counts.values()) == 1
+    assert sum(read for read, _ in worker_counts.values()) == len(flac_library)
+    assert cache_counts == (3, 3)
+
+def test_parse_path_counts_serial(flac_library, caplog):
+    caplog.set_level(logging.INFO, logger='src.read')
+    list(iter_tracks_serial(flac_library))
+    assert "Parsing: 3 album folders following the convention" in caplog.messages
+    assert "Parsing: 6 tracks parsed from the title tag" in caplog.messages
+    assert "Parsing: 0 tracks without a title tag, read from file tags" in caplog.messages
+    # Per-track messages are only logged at DEBUG level
+    assert not any(message.startswith(flac_library[0]) for message in caplog.messages)
+
+@pytest.mark.parametrize('worker_type', ['process', 'thread'])
+def test_parse_path_counts_parallel(flac_library, worker_type):
+    summary = {}
+    list(iter_tracks_parallel(flac_library, 2, worker_type, summary=summary))
+    assert summary['parse_path_counts'] == {'album_from_path': 3, 'title_parsed': 6}
+
+def test_per_track_messages_at_debug_level(flac_library, caplog):
+    caplog.set_level(logging.DEBUG, logger='src.read')
+    list(iter_tracks_serial(flac_library[:1]))
+    assert f"{flac_library[0]}: Track tag exists. Attempting to extract fields from title tag." in caplog.messages
+
+def test_title_cache_matches_uncached_parse():
+    title_cache = TitleCache()
+    work = "Symphony No 41 in C, 'Jupiter', K 551"
+    assert title_cache.parse(work) == parse_work_fields(work)
+    assert title_cache.parse(work) == parse_work_fields(work)
+    assert (title_cache.hits, title_cache.misses) == (1, 1)
+
+def test_title_cache_evicts_least_recently_used():
+    title_cache = TitleCache(maxsize=2)
+    title_cache.parse("Symphony No 40 in G minor, K 550")
+    title_cache.parse("Symphony No 41 in C, K 551")
+    title_cache.parse("Symphony No 40 in G minor, K 550")
+    title_cache.parse("Symphony No 39 in E-flat, K 543")
+    assert list(title_cache.entries) == ["Symphony No 40 in G minor, K 550", "Symphony No 39 in E-flat, K 543"]
+
+def test_title_cache_save_load(tmp_path):
+    cache_file = str(tmp_path / "title_cache.json")
+    title_cache = TitleCache()
+    title_cache.parse("Symphony No 41 in C, K 551")
+    title_cache.save(cache_file)
+    loaded_cache = TitleCache()
+    assert loaded_cache.load(cache_file) == 1
+    assert loaded_cache.entries == title_cache.entries
+    loaded_cache.parse("Symphony No 41 in C, K 551")
+    assert (loaded_cache.hits, loaded_cache.misses) == (1, 0)
+
+def test_title_cache_load_other_version(tmp_path, mocker):
+    cache_file = str(tmp_path / "title_cache.json")
+    TitleCache().save(cache_file)
+    mocker.patch('src.read.TITLE_CACHE_VERSION', -1)
+    assert TitleCache().load(cache_file) == 0
+    assert TitleCache().load(str(tmp_path / "missing.json")) == 0
+
+@pytest.mark.parametrize('workers, worker_type', [(1, 'process'), (2, 'process'), (2, 'thread')])
+def test_iter_tags_title_cache(flac_library, workers, worker_type):
+    title_cache = TitleCache()
+    list(iter_tags(flac_library, workers=workers, worker_type=worker_type, title_cache=title_cache))
+    # Both movements of the symphony share the title before the movement, in all three folders
+    assert list(title_cache.entries) == ["Symphony No 41 in C, 'Jupiter', K 551"]
+    assert title_cache.hits + title_cache.misses == len(flac_library)
+    # Workers may each parse the title once before they see the entries of the others
+    assert title_cache.misses == 1 if workers == 1 else title_cache.misses <= 3
+
+@pytest.mark.parametrize('workers, worker_type', [(1, 'process'), (2, 'process'), (2, 'thread')])
+@pytest.mark.parametrize('title_batch_size', [1, 4])
+def test_iter_tags_title_batches_match_per_track_parse(flac_library, tmp_path, workers, worker_type,
+                                                       title_batch_size):
+    # A track without a title tag takes its fields from the other tags
+    untitled_path = tmp_path / "[1960] Symphonies (Columbia SO with Bruno Walter)" / "03 - Track.flac"
+    untitled_path.write_bytes(make_flac(['WORK=Symphony', 'MOVEMENT=III. Menuetto', 'TRACKNUMBER=03']))
+    track_path_list = sorted(flac_library + [str(untitled_path)])
+    per_track = list(iter_tags(track_path_list))
+    batched = list(iter_tags(track_path_list, workers=workers, worker_type=worker_type,
+                             title_batch_size=title_batch_size))
+    assert batched == per_track
+
+################################################################################
+### Tests for functions associated with
+### Read in chunks
+################################################################################
+
+@pytest.mark.parametrize('track_path, album_directory', [
+    ('/music/Mozart/[1990] Symphonies/01 - Track.flac', '/music/Mozart/[1990] Symphonies'),
+    ('/music/Mozart/[1990] Symphonies/Disc 2/01 - Track.flac', '/music/Mozart/[1990] Symphonies'),
+    ('/music/Mozart/[1990] Symphonies/CD1/01 - Track.flac', '/music/Mozart/[1990] Symphonies')])
+def test_get_album_directory(track_path, album_directory):
+    assert get_album_directory(track_path) == album_directory
+
+# Albums of 3, 2 (on two discs) and 4 tracks
+CHUNK_RECORDS = [(f"/music/A/{i:02d}.flac", {}) for i in range(3)] + \
+                [(f"/music/B/Disc {disc}/01.flac", {}) for disc in (1, 2)] + \
+                [(f"/music/C/{i:02d}.flac", {}) for i in range(4)]
+
+def chunk_lengths(chunks):
+    return [len(chunk) for chunk in chunks]
+
+@pytest.mark.parametrize('chunk_size, lengths', [(None, [9]), (1, [3, 2, 4]), (4, [5, 4]), (5, [5, 4]),
+                                                 (6, [9])])
+def test_iter_album_chunks(chunk_size, lengths):
+    chunks = list(iter_album_chunks(iter(CHUNK_RECORDS), chunk_size))
+    assert chunk_lengths(chunks) == lengths
+    assert [record for chunk in chunks for record in chunk] == CHUNK_RECORDS
+
+def test_iter_album_chunks_max_rows():
+    # Albums are split only if they do not fit in a chunk on their own
+    assert chunk_lengths(iter_album_chunks(CHUNK_RECORDS, chunk_size=1, max_rows=3)) == [3, 2, 3, 1]
+
+def test_iter_album_chunks_max_memory(mocker):
+    # Each track read adds 1 MB
+    rss = [0]
+    def records():
+        for record in CHUNK_RECORDS:
+            rss[0] += 1024 * 1024
+            yield record
+    mocker.patch('src.read.memory.get_rss', side_effect=lambda: rss[0])
+    assert chunk_lengths(iter_album_chunks(records(), max_memory=1024 * 1024)) == [3, 2, 4]
+    rss[0] = 0
+    assert chunk_lengths(iter_album_chunks(records(), max_memory=3 * 1024 * 1024)) == [3, 6]
@@ -0,0 +1,85 @@
+################################################################################
+### test_scan.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import os
+import pytest
+from src.scan import group_by_directory, group_by_extension, scan_files
+
+################################################################################
+### Fixtures
+################################################################################
+
+@pytest.fixture
+def library(tmp_path):
+    files = ["[1960] Symphonies (Columbia SO with Bruno Walter)/01 - Track.flac",
+             "[1960] Symphonies (Columbia SO with Bruno Walter)/02 - Track.FLAC",
+             "[1960] Symphonies (Columbia SO with Bruno Walter)/Album.cue",
+             "[1971] Concerti Grossi (Munchener Bach-Orchester with Karl Richter)/Scans.pdf",
+             "[1971] Concerti Grossi (Munchener Bach-Orchester with Karl Richter)/Disc 1/01 - Track.flac",
+             "[1971] Concerti Grossi (Munchener Bach-Orchester with Karl Richter)/Disc 1/Album.log",
+             "[1971] Concerti Grossi (Munchener Bach-Orchester with Karl Richter)/Disc 2/01 - Track.flac",
+             "README.txt"]
+    for file in files:
+        path = tmp_path / file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x' * len(file))
+    return tmp_path
+
+def walk_files(search_dir, extensions=None):
+    """Reference implementation with os.walk"""
+    paths = []
+    for root, _, files in os.walk(search_dir):
+        for file in files:
+            if extensions is None or os.path.splitext(file)[1].lower() in extensions:
+                paths.append(os.path.join(root, file))
+    return sorted(paths)
+
+################################################################################
+### Tests
+################################################################################
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_scan_files_matches_os_walk(library, workers):
+    entries = scan_files(str(library), workers=workers)
+    assert sorted(entry.path for entry in entries) == walk_files(str(library))
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_scan_files_by_extension(library, workers):
+    entries = scan_files(str(library), {'.FLAC'}, workers=workers)
+    assert sorted(entry.path for entry in entries) == walk_files(str(library), {'.flac'})
+    assert {entry.ext for entry in entries} == {'.flac'}
+
+def test_scan_files_order(library):
+    entries = scan_files(str(library), workers=4)
+    assert entries == scan_files(str(library))
+    # Files in a directory come before the files in its subdirectories
+    names = [entry.name for entry in entries]
+    assert names.index('Scans.pdf') < names.index('Album.log')
+    assert entries[0].path == os.path.join(str(library), 'README.txt')
+
+def test_scan_files_stat(library):
+    for entry in scan_files(str(library), with_stat=True):
+        assert entry.stat.st_size == os.stat(entry.path).st_size
+    assert all(entry.stat is None for entry in scan_files(str(library)))
+
+def test_scan_files_skips_directory_links(library, tmp_path):
+    os.symlink(str(library / "[1960] Symphonies (Columbia SO with Bruno Walter)"), str(library / "Link"))
+    assert len(scan_files(str(library))) == 8
+
+def test_scan_files_missing_directory(tmp_path):
+    assert scan_files(str(tmp_path / "missing")) == []
+
+def test_group_by_extension(library):
+    groups = group_by_extension(scan_files(str(library)))
+    assert {ext: len(entries) for ext, entries in groups.items()} == {'.txt': 1, '.flac': 4, '.cue': 1,
+                                                                      '.pdf': 1, '.log': 1}
+
+def test_group_by_directory(library):
+    groups = group_by_directory(scan_files(str(library), {'.flac'}))
+    assert [len(entries) for entries in groups.values()] == [2, 1, 1]
+    assert list(groups)[0] == str(library / "[1960] Symphonies (Columbia SO with Bruno Walter)")
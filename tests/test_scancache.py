@@ -0,0 +1,151 @@
+################################################################################
+### test_scancache.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import os
+import sqlite3
+import pytest
+import src.scancache
+from src.read import get_track_tags, iter_tags
+from src.scancache import ScanCache
+from tests.test_flacmeta import make_flac
+
+################################################################################
+### Fixtures
+################################################################################
+
+@pytest.fixture
+def album_dir(tmp_path):
+    album_dir = tmp_path / "[1960] Symphonies (Columbia SO with Bruno Walter)"
+    album_dir.mkdir()
+    for track_number in [1, 2]:
+        path = album_dir / f"0{track_number} - Track.flac"
+        path.write_bytes(make_flac([f'TITLE=Symphony No 41 in C, K 551 - {track_number}. Allegro',
+                                    f'TRACKNUMBER=0{track_number}', 'COMPOSER=Mozart']))
+    return album_dir
+
+@pytest.fixture
+def track_path_list(album_dir):
+    return sorted(str(path) for path in album_dir.iterdir())
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ScanCache(str(tmp_path / "scan_cache.db"))
+    yield cache
+    cache.close()
+
+def fill_cache(cache, track_path_list):
+    for track_path in track_path_list:
+        cache.save(track_path, {'Work': os.path.basename(track_path)}, {'title': ['Symphony']})
+    cache.save_directories({os.path.dirname(track_path) for track_path in track_path_list})
+
+def touch_file(track_path, data=None):
+    """Change a file and move its mtime forward, so the change is seen on coarse clocks"""
+    if data is not None:
+        with open(track_path, 'wb') as f:
+            f.write(data)
+    stat = os.stat(track_path)
+    os.utime(track_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+################################################################################
+### Tests
+################################################################################
+
+def test_lookup_empty_cache(cache, track_path_list):
+    assert cache.lookup(track_path_list) == {}
+    assert (cache.hits, cache.misses) == (0, 2)
+
+def test_lookup_unchanged_files(cache, track_path_list):
+    fill_cache(cache, track_path_list)
+    cached = cache.lookup(track_path_list)
+    assert list(cached) == track_path_list
+    assert cached[track_path_list[0]] == ({'Work': '01 - Track.flac'}, {'title': ['Symphony']})
+    assert (cache.hits, cache.misses) == (2, 0)
+
+def test_lookup_changed_file(cache, track_path_list):
+    fill_cache(cache, track_path_list)
+    touch_file(track_path_list[0], make_flac(['TITLE=Symphony No 40']))
+    # Adding a file changes the directory mtime, so each file is checked
+    cover_path = os.path.join(os.path.dirname(track_path_list[0]), 'cover.jpg')
+    open(cover_path, 'wb').close()
+    touch_file(os.path.dirname(track_path_list[0]))
+    assert list(cache.lookup(track_path_list)) == [track_path_list[1]]
+
+def test_lookup_trusts_unchanged_directory(tmp_path, track_path_list):
+    cache = ScanCache(str(tmp_path / "scan_cache.db"), verify_files=False)
+    fill_cache(cache, track_path_list)
+    # An edit in place leaves the directory mtime unchanged, and is missed
+    touch_file(track_path_list[0])
+    assert list(cache.lookup(track_path_list)) == track_path_list
+    cache.close()
+
+def test_lookup_verify_files(cache, track_path_list):
+    fill_cache(cache, track_path_list)
+    # By default, every file is checked, so an edit in place is seen
+    touch_file(track_path_list[0])
+    assert list(cache.lookup(track_path_list)) == [track_path_list[1]]
+
+def test_cache_persists(tmp_path, track_path_list):
+    cache = ScanCache(str(tmp_path / "scan_cache.db"))
+    fill_cache(cache, track_path_list)
+    cache.close()
+    cache = ScanCache(str(tmp_path / "scan_cache.db"))
+    assert list(cache.lookup(track_path_list)) == track_path_list
+    cache.close()
+
+def test_version_change_clears_cache(tmp_path, track_path_list, mocker):
+    cache = ScanCache(str(tmp_path / "scan_cache.db"))
+    fill_cache(cache, track_path_list)
+    cache.close()
+    mocker.patch.object(src.scancache, 'SCAN_CACHE_VERSION', src.scancache.SCAN_CACHE_VERSION + 1)
+    cache = ScanCache(str(tmp_path / "scan_cache.db"))
+    assert cache.lookup(track_path_list) == {}
+    cache.close()
+
+def test_invalidate_all(cache, track_path_list):
+    fill_cache(cache, track_path_list)
+    assert cache.invalidate() == 2
+    assert cache.lookup(track_path_list) == {}
+
+def test_invalidate_directory(cache, track_path_list, tmp_path):
+    fill_cache(cache, track_path_list)
+    # A sibling directory sharing the prefix, with LIKE wildcards in its name, is kept
+    other_dir = tmp_path / "[1960] Symphonies (Columbia SO with Bruno Walter)_2"
+    other_dir.mkdir()
+    other_path = other_dir / "01 - Track.flac"
+    other_path.write_bytes(make_flac(['TITLE=Symphony']))
+    fill_cache(cache, [str(other_path)])
+    assert cache.invalidate(os.path.dirname(track_path_list[0])) == 2
+    assert list(cache.lookup(track_path_list + [str(other_path)])) == [str(other_path)]
+
+def test_iter_tags_uses_cache(cache, track_path_list, mocker):
+    first_run = list(iter_tags(track_path_list, scan_cache=cache))
+    mock_get_track_tags = mocker.patch('src.read.get_track_tags')
+    second_run = list(iter_tags(track_path_list, scan_cache=cache))
+    mock_get_track_tags.assert_not_called()
+    assert second_run == first_run
+
+def test_iter_tags_reads_changed_file(cache, track_path_list):
+    first_run = dict(iter_tags(track_path_list, scan_cache=cache))
+    touch_file(track_path_list[1], make_flac(['TITLE=Symphony No 40 in G minor, K 550 - 1. Molto allegro',
+                                              'TRACKNUMBER=02', 'COMPOSER=Mozart']))
+    records = dict(iter_tags(track_path_list, scan_cache=cache))
+    assert records[track_path_list[0]] == first_run[track_path_list[0]]
+    assert records[track_path_list[1]] == get_track_tags(track_path_list[1])
+    assert records[track_path_list[1]] != first_run[track_path_list[1]]
+
+def test_database_tables(cache):
+    cursor = sqlite3.connect(cache.db_file).cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    assert {row[0] for row in cursor.fetchall()} == {'meta', 'files', 'directories'}
+
+def test_iter_tags_title_batches_cache_parsed_fields(cache, track_path_list):
+    # Titles are parsed before the tracks are stored in the cache
+    first_run = list(iter_tags(track_path_list, scan_cache=cache, title_batch_size=2))
+    assert first_run == list(iter_tags(track_path_list))
+    assert list(iter_tags(track_path_list, scan_cache=cache, title_batch_size=2)) == first_run
+    assert [tags for tags, _ in cache.lookup(track_path_list).values()] == [tags for _, tags in first_run]
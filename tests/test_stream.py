@@ -0,0 +1,104 @@
+################################################################################
+### test_stream.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import os
+import subprocess
+import sys
+import pytest
+from src.stream import (
+                    PATH_COLUMN, get_stream_format, open_stream_writer,
+                    write_stream, read_stream, iter_stream
+                    )
+
+################################################################################
+### Tests
+################################################################################
+
+COLUMNS = ['Composer', 'Work', 'Movement']
+
+RECORDS = [
+    ("/path/to/01 - Track.flac", {'Composer': 'Dvořák, Antonín', 'Work': 'Symphony', 'Movement': 'I. Adagio'}),
+    ("/path/to/02 - Track.flac", {'Composer': 'Dvořák, Antonín', 'Work': 'Symphony', 'Movement': None}),
+    ("/path/to/03 - Track.flac", {'Composer': 'Dvořák, Antonín', 'Work': None}),
+]
+
+def test_get_stream_format():
+    assert get_stream_format("tags.JSONL") == '.jsonl'
+    with pytest.raises(ValueError, match="Invalid stream file extension '.xlsx'"):
+        get_stream_format("tags.xlsx")
+
+@pytest.mark.parametrize('ext', ['.csv', '.jsonl', '.parquet', '.feather'])
+def test_write_read_stream(tmp_path, ext):
+    if ext in ['.parquet', '.feather']:
+        pytest.importorskip('pyarrow')
+    path = str(tmp_path / f"tags{ext}")
+    assert write_stream(iter(RECORDS), path, COLUMNS, batch_size=2) == 3
+
+    tags_df = read_stream(path)
+    assert tags_df.index.tolist() == [track_path for track_path, _ in RECORDS]
+    assert tags_df.columns.tolist() == COLUMNS
+    assert tags_df.loc["/path/to/01 - Track.flac", 'Composer'] == 'Dvořák, Antonín'
+    assert tags_df.loc["/path/to/02 - Track.flac", 'Movement'] is None
+    assert tags_df.loc["/path/to/03 - Track.flac", 'Movement'] is None
+
+@pytest.mark.parametrize('ext', ['.csv', '.jsonl', '.parquet', '.feather'])
+def test_iter_stream(tmp_path, ext):
+    if ext in ['.parquet', '.feather']:
+        pytest.importorskip('pyarrow')
+    path = str(tmp_path / f"tags{ext}")
+    write_stream(iter(RECORDS), path, COLUMNS)
+    records = list(iter_stream(path, batch_size=2))
+    assert records == [(track_path, {column: tags.get(column) for column in COLUMNS})
+                       for track_path, tags in RECORDS]
+
+def test_stream_writer_flushes_batches(tmp_path):
+    path = tmp_path / "tags.jsonl"
+    writer = open_stream_writer(str(path), COLUMNS, batch_size=2)
+    for track_path, tags in RECORDS:
+        writer.write(track_path, tags)
+    # The first batch is on disk before the writer is closed
+    assert writer.records_written == 2
+    assert len(path.read_text(encoding='utf-8').splitlines()) == 2
+    writer.close()
+    assert len(path.read_text(encoding='utf-8').splitlines()) == 3
+
+def test_write_stream_keeps_batches_on_failure(tmp_path):
+    path = str(tmp_path / "tags.csv")
+
+    def failing_records():
+        yield from RECORDS[:2]
+        raise RuntimeError("Interrupted")
+
+    with pytest.raises(RuntimeError):
+        write_stream(failing_records(), path, COLUMNS, batch_size=1)
+    tags_df = read_stream(path)
+    assert tags_df.index.tolist() == [RECORDS[0][0], RECORDS[1][0]]
+    assert PATH_COLUMN not in tags_df.columns
+
+@pytest.mark.parametrize('ext, survives', [('.csv', True), ('.jsonl', True), ('.parquet', False), ('.feather', False)])
+def test_stream_writer_killed(tmp_path, ext, survives):
+    if ext in ['.parquet', '.feather']:
+        pytest.importorskip('pyarrow')
+    path = str(tmp_path / f"tags{ext}")
+    # The process dies after the batches are flushed, without closing the writer
+    code = ("import os, sys\n"
+            "from src.stream import open_stream_writer\n"
+            f"writer = open_stream_writer({path!r}, ['Work'], batch_size=10)\n"
+            "for number in range(95):\n"
+            "    writer.write(f'/path/to/{number:02d} - Track.flac', {'Work': 'Symphony'})\n"
+            "writer.flush()\n"
+            "os._exit(0)")
+    result = subprocess.run([sys.executable, '-c', code], cwd=os.path.join(os.path.dirname(__file__), '..'),
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    if survives:
+        assert len(read_stream(path)) == 95
+    else:
+        # Only CSV and JSONL files are readable without the footer written by close
+        with pytest.raises(Exception):
+            read_stream(path)
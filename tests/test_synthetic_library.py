@@ -0,0 +1,76 @@
+################################################################################
+### test_synthetic_library.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import os
+import mutagen.flac
+import pytest
+from benchmarks.synthetic_library import crc8, crc16, encode_frame_number, generate_library
+from src.flacmeta import read_flac_metadata
+from src.read import get_flac_files, get_track_tags, iter_tags
+
+################################################################################
+### Tests
+################################################################################
+
+def test_crc_check_values():
+    # Check values of CRC-8 and CRC-16/UMTS for the string 123456789
+    assert crc8(b'123456789') == 0xF4
+    assert crc16(b'123456789') == 0xFEE8
+
+@pytest.mark.parametrize('number, encoded', [(0, b'\x00'), (0x7F, b'\x7f'), (0x80, b'\xc2\x80'),
+                                             (0x800, b'\xe0\xa0\x80')])
+def test_encode_frame_number(number, encoded):
+    assert encode_frame_number(number) == encoded
+
+def test_files_are_valid_flac(synthetic_library):
+    for track in synthetic_library[:10]:
+        audio_file = mutagen.flac.FLAC(track.path)
+        assert audio_file.info.sample_rate == 44100
+        assert audio_file.info.length == pytest.approx(0.1, abs=1e-4)
+        metadata = read_flac_metadata(track.path)
+        assert metadata['padding'] == 1024
+        assert sum(len(values) for values in metadata['tags'].values()) == len(track.comments)
+        with open(track.path, 'rb') as f:
+            data = f.read()
+        # Two frames follow the metadata: 4096 samples, then the rest
+        frames = data[metadata['audio_offset']:]
+        first_frame_length = len(frames) // 2
+        assert frames[:2] == b'\xff\xf8'
+        assert crc8(frames[:7]) == frames[7]
+        frame_crc = frames[first_frame_length - 2:first_frame_length]
+        assert crc16(frames[:first_frame_length - 2]) == int.from_bytes(frame_crc, 'big')
+
+def test_layout(synthetic_library, tmp_path, pytestconfig):
+    paths = [track.path for track in synthetic_library]
+    assert len(paths) == pytestconfig.getoption('library_size')
+    assert get_flac_files(str(tmp_path / 'library')) == paths
+    for path in paths:
+        album_folder = os.path.relpath(path, tmp_path / 'library').split(os.sep)[1]
+        assert album_folder.startswith('[') or ' - ' in album_folder
+
+def test_same_seed_same_library(tmp_path):
+    first = generate_library(str(tmp_path / 'first'), 30, seed=3)
+    second = generate_library(str(tmp_path / 'second'), 30, seed=3)
+    assert [track.comments for track in first] == [track.comments for track in second]
+    assert [os.path.relpath(track.path, tmp_path / 'first') for track in first] == \
+        [os.path.relpath(track.path, tmp_path / 'second') for track in second]
+
+def test_read_matches_expected_tags(synthetic_library):
+    for track in synthetic_library:
+        assert get_track_tags(track.path) == track.expected
+
+@pytest.mark.parametrize('synthetic_library', [{'nonconforming_share': 1, 'missing_title_share': 1,
+                                                'multi_disc_share': 1, 'picture_size': 5000}], indirect=True)
+def test_options(synthetic_library):
+    records = dict(iter_tags([track.path for track in synthetic_library]))
+    for track in synthetic_library:
+        assert '[' not in track.path
+        assert os.path.basename(os.path.dirname(track.path)).startswith('Disc ')
+        assert not any(comment.startswith('TITLE=') for comment in track.comments)
+        assert records[track.path] == track.expected
+    assert mutagen.flac.FLAC(synthetic_library[0].path).pictures[0].type == 3
@@ -0,0 +1,91 @@
+################################################################################
+### test_tables.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import pandas as pd
+import pytest
+from src.tables import get_table_format, open_table_reader, open_table_writer, write_table
+
+################################################################################
+### Tests
+################################################################################
+
+COLUMNS = ['Composer', 'Title', 'Work', 'TrackNumber']
+
+RECORDS = [
+    ("/path/to/01 - Track.flac", {'Composer': 'Dvořák, Antonín', 'Title': 'Symphony - I.', 'Work': 'Symphony',
+                                  'TrackNumber': '01'}),
+    ("/path/to/02 - Track.flac", {'Composer': 'Dvořák, Antonín', 'Work': None, 'TrackNumber': '02'}),
+]
+
+def test_get_table_format():
+    assert get_table_format("tags.Parquet") == '.parquet'
+    assert get_table_format("tags.xlsx") == '.xlsx'
+    with pytest.raises(ValueError, match="Invalid file extension '.xls'"):
+        get_table_format("tags.xls")
+
+@pytest.mark.parametrize('ext', ['.xlsx', '.csv', '.parquet', '.feather'])
+def test_write_read_table(tmp_path, ext):
+    if ext in ['.parquet', '.feather']:
+        pytest.importorskip('pyarrow')
+    path = str(tmp_path / f"tags{ext}")
+    assert write_table(iter(RECORDS), path, COLUMNS, batch_size=1) == 2
+    with open_table_reader(path) as reader:
+        assert reader.columns == COLUMNS
+        rows = list(reader)
+    # Text is kept as text, and missing tags are read as ''
+    assert rows == [(track_path, {column: tags.get(column) or '' for column in COLUMNS})
+                    for track_path, tags in RECORDS]
+
+@pytest.mark.parametrize('ext', ['.xlsx', '.csv', '.parquet', '.feather'])
+def test_read_table_skip_columns(tmp_path, ext):
+    if ext in ['.parquet', '.feather']:
+        pytest.importorskip('pyarrow')
+    path = str(tmp_path / f"tags{ext}")
+    write_table(RECORDS, path, COLUMNS)
+    with open_table_reader(path, skip_columns=['Title']) as reader:
+        assert reader.columns == ['Composer', 'Work', 'TrackNumber']
+        assert list(reader)[0] == (RECORDS[0][0], {'Composer': 'Dvořák, Antonín', 'Work': 'Symphony',
+                                                   'TrackNumber': '01'})
+
+@pytest.mark.parametrize('ext', ['.csv', '.parquet', '.feather'])
+def test_read_table_edited_with_pandas(tmp_path, ext):
+    if ext in ['.parquet', '.feather']:
+        pytest.importorskip('pyarrow')
+    # A scripted edit: integer track numbers, missing values, a column moved before the paths
+    tags_df = pd.DataFrame({'Work': ['Symphony', None], 'TrackNumber': [1, 2],
+                            'Path': [track_path for track_path, _ in RECORDS]})
+    path = str(tmp_path / f"tags{ext}")
+    if ext == '.csv':
+        tags_df.to_csv(path, index=False)
+    elif ext == '.parquet':
+        tags_df.to_parquet(path)
+    else:
+        tags_df.to_feather(path)
+    with open_table_reader(path) as reader:
+        assert reader.columns == ['Work', 'TrackNumber']
+        assert reader.row_count == (None if ext == '.csv' else 2)
+        rows = list(reader)
+    assert rows == [(RECORDS[0][0], {'Work': 'Symphony', 'TrackNumber': '1'}),
+                    (RECORDS[1][0], {'Work': '', 'TrackNumber': '2'})]
+
+def test_read_parquet_with_pandas_index(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / "tags.parquet")
+    pd.DataFrame({'Path': [RECORDS[0][0]], 'Work': ['Symphony']}, index=[5]).to_parquet(path)
+    with open_table_reader(path) as reader:
+        assert reader.columns == ['Work']
+
+def test_read_table_without_path_column(tmp_path):
+    path = tmp_path / "tags.csv"
+    path.write_text("Work,TrackNumber\nSymphony,01\n", encoding='utf-8')
+    with pytest.raises(ValueError, match="has no 'Path' column"):
+        open_table_reader(str(path))
+
+def test_open_table_writer_invalid_extension(tmp_path):
+    with pytest.raises(ValueError, match="Invalid file extension '.jsonl'"):
+        open_table_writer(str(tmp_path / "tags.jsonl"), COLUMNS)
@@ -6,10 +6,14 @@
 ################################################################################
 ### Import packages
 ################################################################################
+import argparse
 import pytest
 import os
+import re
+import subprocess
+import sys
 from argparse import Namespace
-from src.tagger import validate_inputs
+from src.tagger import validate_inputs, positive_int, non_negative_int, positive_float, get_shard_path
 
 ################################################################################
 ### Tests
@@ -93,4 +97,320 @@ def test_validate_inputs_write_mode_missing_output(setup_directories_and_files):
     _, input_excel, _ = setup_directories_and_files
     args = Namespace(mode='write', dir=None, excel_in=str(input_excel), excel_out=None)
     with pytest.raises(ValueError, match="Invalid or missing file path for writing failed tags."):
-        validate_inputs(args)
\ No newline at end of file
+        validate_inputs(args)
+
+def test_validate_inputs_read_mode_stream_without_excel(setup_directories_and_files):
+    valid_dir, _, output_excel = setup_directories_and_files
+    args = Namespace(mode='read', dir=str(valid_dir), excel_in=None, excel_out=None,
+                     stream_out=str(output_excel.parent / "tags.jsonl"))
+    validate_inputs(args)
+
+def test_validate_inputs_read_mode_stream_invalid_extension(setup_directories_and_files):
+    valid_dir, _, output_excel = setup_directories_and_files
+    args = Namespace(mode='read', dir=str(valid_dir), excel_in=None, excel_out=None,
+                     stream_out=str(output_excel.parent / "tags.txt"))
+    with pytest.raises(ValueError, match="Invalid stream file extension"):
+        validate_inputs(args)
+
+def test_validate_inputs_read_mode_stream_invalid_output(setup_directories_and_files):
+    valid_dir, _, output_excel = setup_directories_and_files
+    args = Namespace(mode='read', dir=str(valid_dir), excel_in=None, excel_out=str(output_excel),
+                     stream_out='invalid_path/tags.csv')
+    with pytest.raises(ValueError, match="Invalid or missing file path for streaming tag information."):
+        validate_inputs(args)
+
+# Test cases for positive_int
+@pytest.mark.parametrize('chunk_options', [{'chunk_size': 100}, {'max_memory': 500}])
+def test_validate_inputs_read_mode_chunks_with_stream(setup_directories_and_files, chunk_options):
+    valid_dir, _, output_excel = setup_directories_and_files
+    args = Namespace(mode='read', dir=str(valid_dir), excel_in=None, excel_out=str(output_excel),
+                     stream_out=str(output_excel.parent / "tags.csv"), **chunk_options)
+    with pytest.raises(ValueError, match="Chunked reading writes Excel files"):
+        validate_inputs(args)
+
+@pytest.mark.parametrize('mode, option', [('read', 'excel_out'), ('write', 'excel_in'), ('write', 'excel_out')])
+def test_validate_inputs_invalid_table_extension(setup_directories_and_files, mode, option):
+    valid_dir, input_excel, output_excel = setup_directories_and_files
+    input_xls = input_excel.with_suffix('.xls')
+    input_xls.touch()
+    paths = {'excel_in': str(input_excel), 'excel_out': str(output_excel)}
+    paths[option] = str(input_xls) if option == 'excel_in' else str(output_excel.with_suffix('.xls'))
+    args = Namespace(mode=mode, dir=str(valid_dir), **paths)
+    with pytest.raises(ValueError, match="Invalid file extension '.xls'"):
+        validate_inputs(args)
+
+def test_validate_inputs_watch_mode_valid(setup_directories_and_files):
+    valid_dir, _, output_excel = setup_directories_and_files
+    args = Namespace(mode='watch', dir=str(valid_dir), excel_in=None, excel_out=str(output_excel.with_suffix('.csv')))
+    validate_inputs(args)
+
+def test_validate_inputs_watch_mode_missing_output(setup_directories_and_files):
+    valid_dir, _, _ = setup_directories_and_files
+    args = Namespace(mode='watch', dir=str(valid_dir), excel_in=None, excel_out=None)
+    with pytest.raises(ValueError, match="Invalid or missing file path for writing tag information."):
+        validate_inputs(args)
+
+def test_validate_inputs_watch_mode_with_stream(setup_directories_and_files):
+    valid_dir, _, output_excel = setup_directories_and_files
+    args = Namespace(mode='watch', dir=str(valid_dir), excel_in=None, excel_out=str(output_excel),
+                     stream_out=str(output_excel.parent / "tags.csv"))
+    with pytest.raises(ValueError, match="Watch mode keeps a single table up to date"):
+        validate_inputs(args)
+
+def test_validate_inputs_profile_out_invalid(setup_directories_and_files):
+    valid_dir, _, output_excel = setup_directories_and_files
+    args = Namespace(mode='read', dir=str(valid_dir), excel_in=None, excel_out=str(output_excel),
+                     profile_out='invalid_dir/profile.prof')
+    with pytest.raises(ValueError, match="Invalid file path for saving profile statistics."):
+        validate_inputs(args)
+
+def test_get_shard_path():
+    assert get_shard_path('out/tags.xlsx', 1) == 'out/tags_001.xlsx'
+    assert get_shard_path('tags.xlsx', 12) == 'tags_012.xlsx'
+
+def test_positive_int_valid():
+    assert positive_int('4') == 4
+
+@pytest.mark.parametrize('value', ['0', '-1', 'four'])
+def test_positive_int_invalid(value):
+    with pytest.raises(argparse.ArgumentTypeError, match="Must be a positive integer."):
+        positive_int(value)
+
+def test_validate_inputs_journal(tmp_path):
+    input_table = tmp_path / 'tags.csv'
+    input_table.write_text('Path\n')
+    args = Namespace(mode='write', dir=None, excel_in=str(input_table), excel_out=str(tmp_path / 'failed.csv'),
+                     journal=str(tmp_path / 'journal.db'), resume=True)
+    with pytest.raises(ValueError, match="journal file of the run to resume"):
+        validate_inputs(args)
+    args = Namespace(mode='rollback', journal=str(tmp_path / 'journal.db'))
+    with pytest.raises(ValueError, match="journal file of the run to roll back"):
+        validate_inputs(args)
+    (tmp_path / 'journal.db').write_bytes(b'')
+    validate_inputs(args)
+
+def test_non_negative_int():
+    assert non_negative_int('0') == 0
+    assert non_negative_int('8192') == 8192
+    for value in ['-1', 'abc']:
+        with pytest.raises(argparse.ArgumentTypeError, match="Must be zero or a positive integer."):
+            non_negative_int(value)
+
+def test_positive_float():
+    assert positive_float('0.5') == 0.5
+    for value in ['0', '-1', 'nan', 'two']:
+        with pytest.raises(argparse.ArgumentTypeError, match="Must be a positive number."):
+            positive_float(value)
+
+# Startup: --help and argument errors do not load pandas or mutagen, and do not write logs
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+def run_tagger(arguments, cwd):
+    code = ("import sys, runpy; sys.argv = ['tagger.py'] + sys.argv[1:]\n"
+            f"try:\n    runpy.run_path({os.path.join(SRC_DIR, 'tagger.py')!r}, run_name='__main__')\n"
+            "finally:\n    print(sorted(m for m in ('pandas', 'mutagen', 'read') if m in sys.modules))")
+    return subprocess.run([sys.executable, '-c', code] + arguments, cwd=cwd, capture_output=True, text=True,
+                          env={**os.environ, 'PYTHONPATH': SRC_DIR})
+
+@pytest.mark.parametrize('arguments, returncode', [
+    (['--help'], 0),
+    (['read', '--dir', 'missing_directory', '--excel_out', 'tags.xlsx'], 1)])
+def test_startup_is_lazy(tmp_path, arguments, returncode):
+    result = run_tagger(arguments, tmp_path)
+    assert result.returncode == returncode
+    assert result.stdout.strip().splitlines()[-1] == '[]'
+    assert not (tmp_path / 'logs').exists()
+
+def test_profile(synthetic_library, tmp_path):
+    result = run_tagger(['read', '--dir', str(tmp_path / 'library'), '--excel_out', 'tags.xlsx', '--no_cache',
+                         '--profile_out', 'run.prof'], tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert 'Stage' in result.stdout
+    assert f"flac_opens {len(synthetic_library):>12}" in result.stdout.replace('  ', ' ')
+    assert (tmp_path / 'run.prof').exists()
+
+def test_read_in_chunks(synthetic_library, tmp_path):
+    import pandas as pd
+    from src.read import get_album_directory
+    result = run_tagger(['read', '--dir', str(tmp_path / 'library'), '--excel_out', 'tags.xlsx', '--no_cache',
+                         '--chunk_size', '20'], tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert 'Peak memory (RSS)' in result.stdout
+    shards = sorted(tmp_path.glob('tags_*.xlsx'))
+    assert len(shards) > 1
+    track_paths = []
+    albums = set()
+    for shard in shards:
+        shard_paths = list(pd.read_excel(shard, index_col=0).index)
+        assert len(shard_paths) >= 20 or shard == shards[-1]
+        # Each album is in a single file
+        shard_albums = {get_album_directory(track_path) for track_path in shard_paths}
+        assert not shard_albums & albums
+        albums |= shard_albums
+        track_paths += shard_paths
+    assert track_paths == [track.path for track in synthetic_library]
+
+def test_read_write_round_trip(synthetic_library, tmp_path):
+    from src.excel import ExcelReader, write_excel
+    result = run_tagger(['read', '--dir', str(tmp_path / 'library'), '--excel_out', 'tags.xlsx', '--no_cache'],
+                        tmp_path)
+    assert result.returncode == 0, result.stderr
+    with ExcelReader(str(tmp_path / 'tags.xlsx')) as reader:
+        columns = reader.columns
+        rows = list(reader)
+    assert [track_path for track_path, _ in rows] == [track.path for track in synthetic_library]
+    # A file which no longer exists fails, and is written to the failed tags
+    missing_path = str(tmp_path / 'library' / 'missing.flac')
+    write_excel(rows[:5] + [(missing_path, rows[0][1])], str(tmp_path / 'updated.xlsx'), columns)
+    result = run_tagger(['write', '--excel_in', 'updated.xlsx', '--excel_out', 'failed.xlsx'], tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert 'Successfully processed: 5 files' in result.stdout
+    # The title is built from the other tags, and is not read
+    used_columns = [column for column in columns if column != 'Title']
+    with ExcelReader(str(tmp_path / 'failed.xlsx')) as reader:
+        assert reader.columns == used_columns
+        assert list(reader) == [(missing_path, {column: rows[0][1][column] for column in used_columns})]
+
+@pytest.mark.parametrize('ext', ['.parquet', '.feather', '.csv'])
+def test_read_write_columnar_round_trip(synthetic_library, tmp_path, ext):
+    if ext in ['.parquet', '.feather']:
+        pytest.importorskip('pyarrow')
+    import pandas as pd
+    result = run_tagger(['read', '--dir', str(tmp_path / 'library'), '--excel_out', f'tags{ext}', '--no_cache'],
+                        tmp_path)
+    assert result.returncode == 0, result.stderr
+    # A scripted edit, without Excel
+    readers = {'.parquet': pd.read_parquet, '.feather': pd.read_feather,
+               '.csv': lambda path: pd.read_csv(path, dtype=str, keep_default_na=False)}
+    tags_df = readers[ext](str(tmp_path / f'tags{ext}'))
+    assert tags_df['Path'].tolist() == [track.path for track in synthetic_library]
+    tags_df = tags_df.head(3)
+    tags_df['Work'] = 'Edited'
+    if ext == '.csv':
+        tags_df.to_csv(tmp_path / 'updated.csv', index=False)
+    else:
+        getattr(tags_df, f'to_{ext[1:]}')(tmp_path / f'updated{ext}')
+    result = run_tagger(['write', '--excel_in', f'updated{ext}', '--excel_out', f'failed{ext}'], tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert 'Successfully processed: 3 files' in result.stdout
+    renamed = sorted(path.name for path in (tmp_path / 'library').rglob('*Edited*.flac'))
+    assert len(renamed) == 3
+
+def test_watch(synthetic_library, tmp_path):
+    import shutil
+    import signal
+    import time
+    from src.read import get_album_directory
+    from src.tables import open_table_reader
+    code = f"import sys, runpy; sys.argv = ['tagger.py'] + sys.argv[1:]\nrunpy.run_path({os.path.join(SRC_DIR, 'tagger.py')!r}, run_name='__main__')"
+    process = subprocess.Popen([sys.executable, '-c', code, 'watch', '--dir', str(tmp_path / 'library'),
+                                '--excel_out', 'tags.csv', '--debounce', '0.2', '--poll_interval', '0.2'],
+                               cwd=tmp_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                               env={**os.environ, 'PYTHONPATH': SRC_DIR})
+
+    def wait_for_tracks(count):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and process.poll() is None:
+            if (tmp_path / 'tags.csv').exists():
+                with open_table_reader(str(tmp_path / 'tags.csv')) as reader:
+                    if len(list(reader)) == count:
+                        return
+            time.sleep(0.1)
+        pytest.fail("The table was not updated")
+
+    try:
+        wait_for_tracks(len(synthetic_library))
+        album = get_album_directory(synthetic_library[0].path)
+        shutil.rmtree(album)
+        removed = sum(track.path.startswith(album + os.sep) for track in synthetic_library)
+        wait_for_tracks(len(synthetic_library) - removed)
+    finally:
+        process.send_signal(signal.SIGINT)
+        stdout, stderr = process.communicate(timeout=30)
+    assert process.returncode == 0, stderr
+    assert 'Stopped watching' in stdout
+
+def test_write_skip_unchanged(synthetic_library, tmp_path):
+    from src.tables import open_table_reader, write_table
+    from src.write import UNUSED_COLUMNS, build_title, get_new_file_path
+    result = run_tagger(['read', '--dir', str(tmp_path / 'library'), '--excel_out', 'tags.csv', '--no_cache'],
+                        tmp_path)
+    assert result.returncode == 0, result.stderr
+    with open_table_reader(str(tmp_path / 'tags.csv'), UNUSED_COLUMNS) as reader:
+        columns = reader.columns
+        rows = list(reader)
+    result = run_tagger(['write', '--excel_in', 'tags.csv', '--excel_out', 'failed.csv', '--skip_unchanged'], tmp_path)
+    assert result.returncode == 0, result.stderr
+    # The same rows again, with the files under their new names
+    renamed_rows = [(get_new_file_path(file_path, row, build_title(row)), row) for file_path, row in rows]
+    renamed_rows[0][1]['Genre'] = 'Edited'
+    write_table(renamed_rows, str(tmp_path / 'updated.csv'), columns)
+    result = run_tagger(['write', '--excel_in', 'updated.csv', '--excel_out', 'failed.csv', '--skip_unchanged'],
+                        tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert f'Successfully processed: {len(rows)} files' in result.stdout
+    assert f'Skipped, tags unchanged: {len(rows) - 1} files' in result.stdout
+    # Only the Work and Title tags are compared: the edited genre is ignored
+    renamed_rows[0][1]['Genre'] = 'Edited again'
+    write_table(renamed_rows, str(tmp_path / 'updated.csv'), columns)
+    result = run_tagger(['write', '--excel_in', 'updated.csv', '--excel_out', 'failed.csv',
+                         '--compare_columns', 'Work', 'Title'], tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert f'Skipped, tags unchanged: {len(rows)} files' in result.stdout
+    # A misspelled column is refused before any file is written
+    result = run_tagger(['write', '--excel_in', 'updated.csv', '--excel_out', 'failed.csv',
+                         '--compare_columns', 'Genr'], tmp_path)
+    assert result.returncode == 1
+    assert 'not in the tag table: Genr' in result.stderr
+
+def test_read_after_write_in_place(synthetic_library, tmp_path):
+    from src.tables import open_table_reader, write_table
+    from src.write import UNUSED_COLUMNS
+    def read_rows():
+        result = run_tagger(['read', '--dir', str(tmp_path / 'library'), '--excel_out', 'tags.csv'], tmp_path)
+        assert result.returncode == 0, result.stderr
+        with open_table_reader(str(tmp_path / 'tags.csv'), UNUSED_COLUMNS) as reader:
+            return reader.columns, list(reader)
+    # The first write gives the files their new names, the second keeps them
+    for genre in ['First', 'Second']:
+        columns, rows = read_rows()
+        write_table([(file_path, {**row, 'Genre': genre}) for file_path, row in rows],
+                    str(tmp_path / 'updated.csv'), columns)
+        result = run_tagger(['write', '--excel_in', 'updated.csv', '--excel_out', 'failed.csv'], tmp_path)
+        assert result.returncode == 0, result.stderr
+    # The files were edited in place, and are read again from the cache
+    _, rows = read_rows()
+    assert [row['Genre'] for _, row in rows] == ['Second'] * len(synthetic_library)
+
+def test_write_workers(synthetic_library, tmp_path):
+    result = run_tagger(['read', '--dir', str(tmp_path / 'library'), '--excel_out', 'tags.csv', '--no_cache'],
+                        tmp_path)
+    assert result.returncode == 0, result.stderr
+    result = run_tagger(['write', '--excel_in', 'tags.csv', '--excel_out', 'failed.csv', '--workers', '2',
+                         '--profile'], tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert f'Successfully processed: {len(synthetic_library)} files' in result.stdout
+    # The counts of the worker processes are in the profile
+    assert re.search(rf'^renames\s+{len(synthetic_library)}\s', result.stdout, re.MULTILINE)
+
+def test_write_journal_rollback(synthetic_library, tmp_path):
+    result = run_tagger(['read', '--dir', str(tmp_path / 'library'), '--excel_out', 'tags.csv', '--no_cache'],
+                        tmp_path)
+    assert result.returncode == 0, result.stderr
+    names = sorted(path.name for path in (tmp_path / 'library').rglob('*.flac'))
+    result = run_tagger(['write', '--excel_in', 'tags.csv', '--excel_out', 'failed.csv', '--journal', 'journal.db'],
+                        tmp_path)
+    assert result.returncode == 0, result.stderr
+    # A journal holds one run
+    result = run_tagger(['write', '--excel_in', 'tags.csv', '--excel_out', 'failed.csv', '--journal', 'journal.db'],
+                        tmp_path)
+    assert result.returncode == 1
+    assert 'already holds a run' in result.stderr
+    result = run_tagger(['write', '--excel_in', 'tags.csv', '--excel_out', 'failed.csv', '--journal', 'journal.db',
+                         '--resume'], tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert f'Resuming: {len(synthetic_library)} files already done' in result.stdout
+    result = run_tagger(['rollback', '--journal', 'journal.db'], tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert f'Restored: {len(synthetic_library)} files' in result.stdout
+    assert sorted(path.name for path in (tmp_path / 'library').rglob('*.flac')) == names
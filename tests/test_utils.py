@@ -0,0 +1,79 @@
+################################################################################
+### test_utils.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import csv
+import logging
+import logging.handlers
+import mutagen.flac
+import pytest
+from src.flacmeta import read_flac_metadata
+from src.utils import remove_empty_tags, setup_logging
+
+################################################################################
+### Fixtures
+################################################################################
+
+@pytest.fixture
+def root_logger():
+    # Remove the handler added by setup_logging after the test
+    root_logger = logging.getLogger()
+    level = root_logger.level
+    yield root_logger
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            root_logger.removeHandler(handler)
+    root_logger.setLevel(level)
+
+################################################################################
+### Tests
+################################################################################
+
+def test_setup_logging_writes_from_queue(tmp_path, root_logger, mocker):
+    listeners = []
+    mocker.patch('atexit.register', side_effect=listeners.append)
+    setup_logging(str(tmp_path), 'WARNING')
+    assert any(isinstance(handler, logging.handlers.QueueHandler) for handler in root_logger.handlers)
+    logging.getLogger('read').info("%s: not written", 'track.flac')
+    logging.getLogger('read').warning("%s: written", 'track.flac')
+    # Stopping the listener writes the remaining records
+    for stop in listeners:
+        stop()
+    log_files = list((tmp_path / 'logs').iterdir())
+    assert len(log_files) == 1
+    assert log_files[0].read_text().splitlines()[-1].endswith("WARNING: track.flac: written")
+    assert "not written" not in log_files[0].read_text()
+
+def test_setup_logging_twice(tmp_path, root_logger, mocker):
+    listeners = []
+    mocker.patch('atexit.register', side_effect=listeners.append)
+    setup_logging(str(tmp_path))
+    setup_logging(str(tmp_path))
+    # A second call neither adds a handler nor starts another listener
+    assert sum(isinstance(handler, logging.handlers.QueueHandler) for handler in root_logger.handlers) == 1
+    assert len(listeners) == 1
+    logging.getLogger('read').info("%s: written once", 'track.flac')
+    listeners[0]()
+    [log_file] = (tmp_path / 'logs').iterdir()
+    assert log_file.read_text().count("written once") == 1
+
+def test_remove_empty_tags(synthetic_library, tmp_path, monkeypatch, capsys):
+    file_path = synthetic_library[0].path
+    audio_file = mutagen.flac.FLAC(file_path)
+    audio_file['conductor'] = ''
+    audio_file.save(padding=lambda info: 4096)
+    audio_offset = read_flac_metadata(file_path)['audio_offset']
+    monkeypatch.chdir(tmp_path)
+    with open('empty_tags.csv', 'w', newline='') as csvfile:
+        csv.writer(csvfile).writerow([file_path])
+    remove_empty_tags()
+    assert 'Saved in place: 1 files, rewritten: 0 files' in capsys.readouterr().out
+    # The smaller comment block was written in place, without moving the audio
+    assert 'conductor' not in mutagen.flac.FLAC(file_path)
+    assert read_flac_metadata(file_path)['audio_offset'] == audio_offset
+    with open('success.csv', newline='') as csvfile:
+        assert len(list(csv.reader(csvfile))) == 1
@@ -0,0 +1,188 @@
+################################################################################
+### test_watch.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import os
+import shutil
+import threading
+import time
+import pytest
+from src.read import get_album_directory as get_track_album_directory, iter_tags
+from src.tables import open_table_reader
+from src.watch import (
+                    Debouncer, InotifyWatcher, PollingWatcher, TagTableUpdater,
+                    get_album_directory, is_below, watch_library
+                    )
+
+################################################################################
+### Tests
+################################################################################
+
+def get_albums(synthetic_library):
+    """Album folders of the synthetic library, in order."""
+    return sorted({get_track_album_directory(track.path) for track in synthetic_library})
+
+def read_table(path):
+    """Track paths and tags of an exported table."""
+    with open_table_reader(str(path)) as reader:
+        return dict(reader)
+
+def wait_for(condition, timeout=10):
+    """Wait until condition() is true, or fail after timeout seconds."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            pytest.fail("Timed out waiting for the watcher")
+        time.sleep(0.05)
+
+def open_inotify_watcher(root):
+    try:
+        return InotifyWatcher(root)
+    except (OSError, AttributeError) as e:
+        pytest.skip(f"inotify is not available: {e}")
+
+def test_debouncer():
+    debouncer = Debouncer(quiet_period=2)
+    assert debouncer.get_timeout(now=0) is None
+    debouncer.add(['Album A', 'Album B'], now=0)
+    debouncer.add(['Album B'], now=1.5)
+    assert debouncer.get_timeout(now=1) == 1
+    assert debouncer.pop_ready(now=1) == []
+    # A burst of changes keeps postponing the album
+    assert debouncer.pop_ready(now=2) == ['Album A']
+    assert debouncer.get_timeout(now=2) == pytest.approx(1.5)
+    assert debouncer.pop_ready(now=3.5) == ['Album B']
+    assert len(debouncer) == 0
+
+def test_get_album_directory():
+    root = os.path.join('library')
+    album = os.path.join(root, 'Bach', '[1990] Album (Orchestra)')
+    assert get_album_directory(album, root) == album
+    assert get_album_directory(os.path.join(album, 'Disc 2'), root) == album
+    assert get_album_directory(root, root) == root
+
+def test_is_below():
+    assert is_below(os.path.join('library', 'Album', 'a.flac'), 'library')
+    assert is_below('library', 'library')
+    assert not is_below('library 2', 'library')
+
+def test_polling_watcher(synthetic_library, tmp_path):
+    root = str(tmp_path / 'library')
+    watcher = PollingWatcher(root, interval=0.01)
+    assert watcher.get_changes(timeout=1) == set()
+    track = synthetic_library[0]
+    with open(track.path, 'ab') as f:
+        f.write(b'\0')
+    os.remove(synthetic_library[-1].path)
+    assert watcher.get_changes(timeout=1) == {os.path.dirname(track.path), os.path.dirname(synthetic_library[-1].path)}
+    # Changes are only reported once
+    assert watcher.get_changes(timeout=1) == set()
+
+def test_inotify_watcher(synthetic_library, tmp_path):
+    root = str(tmp_path / 'library')
+    watcher = open_inotify_watcher(root)
+    try:
+        assert watcher.get_changes(timeout=0) == set()
+        track = synthetic_library[0]
+        with open(track.path, 'ab') as f:
+            f.write(b'\0')
+        # Other files, such as covers, are not reported
+        (tmp_path / 'library' / 'cover.jpg').write_bytes(b'\0')
+        assert watcher.get_changes(timeout=1) == {os.path.dirname(track.path)}
+        # A new album folder is watched as soon as it appears
+        album = os.path.join(root, 'New Composer', '[2000] New Album (Orchestra)')
+        os.makedirs(album)
+        assert watcher.get_changes(timeout=1) == {os.path.join(root, 'New Composer')}
+        shutil.copy(track.path, os.path.join(album, '01 - Track.flac'))
+        assert album in watcher.get_changes(timeout=1)
+    finally:
+        watcher.close()
+
+def test_tag_table_updater(synthetic_library, tmp_path):
+    root = str(tmp_path / 'library')
+    output_path = tmp_path / 'tags.csv'
+    read_paths = []
+
+    def read_tags(track_path_list):
+        read_paths.extend(track_path_list)
+        return iter_tags(track_path_list)
+
+    updater = TagTableUpdater(root, str(output_path), read_tags)
+    updater.read_all()
+    assert list(read_table(output_path)) == [track.path for track in synthetic_library]
+
+    # Remove one album, and copy another one in under a new name
+    albums = get_albums(synthetic_library)
+    shutil.rmtree(albums[0])
+    new_album = albums[1] + ' (copy)'
+    shutil.copytree(albums[1], new_album)
+    read_paths.clear()
+    updater.update([albums[0], new_album, os.path.join(new_album, 'Disc 1')])
+    # Only the new album was read
+    assert read_paths and all(is_below(track_path, new_album) for track_path in read_paths)
+    tags = read_table(output_path)
+    expected_paths = sorted([track.path for track in synthetic_library if not is_below(track.path, albums[0])] +
+                            read_paths)
+    assert list(tags) == expected_paths
+    assert not os.path.exists(tmp_path / 'tags.partial.csv')
+
+def test_tag_table_updater_keeps_album_on_error(synthetic_library, tmp_path):
+    root = str(tmp_path / 'library')
+    updater = TagTableUpdater(root, str(tmp_path / 'tags.csv'), iter_tags)
+    updater.read_all()
+    album = get_albums(synthetic_library)[0]
+    tracks = {track_path: tags for track_path, tags in updater.tags.items() if is_below(track_path, album)}
+
+    def failing_read_tags(track_path_list):
+        raise ValueError("File is still being copied")
+
+    updater.read_tags = failing_read_tags
+    assert updater.update([album]) == 0
+    assert {track_path: updater.tags[track_path] for track_path in tracks} == tracks
+
+def test_tag_table_updater_keeps_album_with_failed_track(synthetic_library, tmp_path):
+    root = str(tmp_path / 'library')
+    updater = TagTableUpdater(root, str(tmp_path / 'tags.csv'), iter_tags)
+    updater.read_all()
+    tags = dict(updater.tags)
+    albums = get_albums(synthetic_library)
+    failed_path = next(track.path for track in synthetic_library if is_below(track.path, albums[0]))
+    shutil.rmtree(albums[1])
+
+    def read_tags_dropping_failed(track_path_list):
+        # As read.iter_tags does with several workers
+        return ((track_path, tags) for track_path, tags in iter_tags(track_path_list) if track_path != failed_path)
+
+    updater.read_tags = read_tags_dropping_failed
+    updater.update([root])
+    # The album with the failed track keeps all of its tracks, the others are updated
+    assert {track_path: updater.tags.get(track_path) for track_path in tags if is_below(track_path, albums[0])} == \
+        {track_path: track_tags for track_path, track_tags in tags.items() if is_below(track_path, albums[0])}
+    assert not any(is_below(track_path, albums[1]) for track_path in updater.tags)
+
+@pytest.mark.parametrize('use_inotify', [True, False])
+def test_watch_library(synthetic_library, tmp_path, use_inotify):
+    root = str(tmp_path / 'library')
+    output_path = tmp_path / 'tags.parquet'
+    pytest.importorskip('pyarrow')
+    watcher = open_inotify_watcher(root) if use_inotify else PollingWatcher(root, interval=0.05)
+    updater = TagTableUpdater(root, str(output_path), iter_tags)
+    updater.read_all()
+    stop_event = threading.Event()
+    thread = threading.Thread(target=watch_library, args=(watcher, updater, 0.2, stop_event))
+    thread.start()
+    try:
+        album = get_albums(synthetic_library)[0]
+        shutil.copytree(album, album + ' (copy)')
+        copied_paths = [track.path.replace(album, album + ' (copy)', 1) for track in synthetic_library
+                        if is_below(track.path, album)]
+        wait_for(lambda: set(copied_paths) <= set(read_table(output_path)))
+        assert len(read_table(output_path)) == len(synthetic_library) + len(copied_paths)
+    finally:
+        stop_event.set()
+        thread.join()
+        watcher.close()
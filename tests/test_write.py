@@ -0,0 +1,156 @@
+################################################################################
+### test_write.py
+### Copyright (c) 2025, Joshua J Hamilton
+################################################################################
+
+################################################################################
+### Import packages
+################################################################################
+import os
+import mutagen.flac
+import pandas as pd
+import pytest
+from src.profiling import Profiler
+from src.write import (
+                    build_title, get_new_file_path, get_target_tags, is_file_unchanged,
+                    iter_update_tags, update_file_tags, update_tags, validate_compare_columns
+                    )
+
+################################################################################
+### Tests
+################################################################################
+
+ROW = {'Composer': 'Mozart, Wolfgang Amadeus', 'Work': 'Symphony No. 41', 'Catalog #': 'K. 551',
+       'InitialKey': 'C major', 'Epithet': 'Jupiter', 'Movement': 'I. Allegro vivace', 'TrackNumber': '1',
+       'Title': 'Old title', 'Genre': ''}
+
+TITLE = "Symphony No. 41, K. 551, in C major, 'Jupiter' - I. Allegro vivace"
+
+def make_tags_df(synthetic_library, **tags):
+    """Rows for the tracks of the synthetic library, as read back by tagger.py."""
+    rows = [{**ROW, 'TrackNumber': str(number), **tags} for number in range(1, len(synthetic_library) + 1)]
+    return pd.DataFrame(rows, index=[track.path for track in synthetic_library])
+
+def test_build_title():
+    assert build_title(ROW) == TITLE
+    assert build_title({'Work': 'Sonata', 'Movement': 'II. Adagio'}) == "Sonata - II. Adagio"
+
+def test_get_target_tags():
+    target_tags = get_target_tags(ROW)
+    # Empty tags are skipped, and the built title comes last
+    assert list(target_tags) == ['Composer', 'Work', 'Catalog #', 'InitialKey', 'Epithet', 'Movement',
+                                 'TrackNumber', 'Title']
+    assert target_tags['Title'] == TITLE
+
+def test_get_new_file_path():
+    assert get_new_file_path(os.path.join('album', 'old.flac'), ROW, 'Symphony: I/II') == \
+        os.path.join('album', '01 - Symphony_ I_II.flac')
+
+def test_update_file_tags_skips_unchanged(synthetic_library):
+    file_path = synthetic_library[0].path
+    assert update_file_tags(file_path, ROW)
+    new_file_path = get_new_file_path(file_path, ROW, TITLE)
+    audio_file = mutagen.flac.FLAC(new_file_path)
+    assert dict(audio_file.tags) == {tag.lower(): [value] for tag, value in get_target_tags(ROW).items()}
+    mtime_ns = os.stat(new_file_path).st_mtime_ns
+
+    # Writing the same row again leaves the file as it is
+    assert is_file_unchanged(new_file_path, get_target_tags(ROW), new_file_path)
+    assert not update_file_tags(new_file_path, ROW, skip_unchanged=True)
+    assert os.stat(new_file_path).st_mtime_ns == mtime_ns
+
+    # A changed tag is written
+    row = {**ROW, 'Genre': 'Classical'}
+    assert not is_file_unchanged(new_file_path, get_target_tags(row), new_file_path)
+    assert update_file_tags(new_file_path, row, skip_unchanged=True)
+    assert mutagen.flac.FLAC(new_file_path)['genre'] == ['Classical']
+
+def test_is_file_unchanged_extra_tags_pictures_and_name(synthetic_library):
+    file_path = synthetic_library[0].path
+    update_file_tags(file_path, ROW)
+    new_file_path = get_new_file_path(file_path, ROW, TITLE)
+    target_tags = get_target_tags(ROW)
+    # A file which would be renamed is changed
+    assert not is_file_unchanged(new_file_path, target_tags, new_file_path + '.renamed')
+    audio_file = mutagen.flac.FLAC(new_file_path)
+    audio_file['encoder'] = 'flac 1.4'
+    audio_file.save()
+    # The tags which a full update removes count as changes, unless only some columns are compared
+    assert not is_file_unchanged(new_file_path, target_tags, new_file_path)
+    assert is_file_unchanged(new_file_path, target_tags, new_file_path, compare_columns=['Work', 'Title'])
+    assert not is_file_unchanged(new_file_path, {**target_tags, 'Work': 'Symphony No. 40'}, new_file_path,
+                                 compare_columns=['Work', 'Title'])
+    del audio_file['encoder']
+    audio_file.add_picture(mutagen.flac.Picture())
+    audio_file.save()
+    assert not is_file_unchanged(new_file_path, target_tags, new_file_path)
+    audio_file.clear_pictures()
+    audio_file.save()
+    assert is_file_unchanged(new_file_path, target_tags, new_file_path)
+    # An ID3v1 tag at the end of the file is deleted by a full update
+    with open(new_file_path, 'ab') as f:
+        f.write(b'TAG' + bytes(125))
+    assert not is_file_unchanged(new_file_path, target_tags, new_file_path)
+
+def test_validate_compare_columns():
+    validate_compare_columns(['Work', 'title', 'GENRE'], ['Composer', 'Work', 'Genre'])
+    # A misspelled column would compare equal for every file
+    with pytest.raises(ValueError, match="not in the tag table: Genr"):
+        validate_compare_columns(['Work', 'Genr'], ['Composer', 'Work', 'Genre'])
+
+def test_update_tags_skip_unchanged(synthetic_library, capsys):
+    tags_df = make_tags_df(synthetic_library)
+    successful_df, failed_df = update_tags(tags_df)
+    assert len(successful_df) == len(synthetic_library) and failed_df.empty
+    # The files have been renamed after their titles
+    tags_df.index = [get_new_file_path(file_path, row, build_title(row)) for file_path, row in tags_df.iterrows()]
+    tags_df.loc[tags_df.index[0], 'Genre'] = 'Classical'
+    profiler = Profiler()
+    successful_df, failed_df = update_tags(tags_df, profiler=profiler, skip_unchanged=True)
+    assert len(successful_df) == len(synthetic_library) and failed_df.empty
+    assert "Skipped, tags unchanged: {} files".format(len(synthetic_library) - 1) in capsys.readouterr().out
+    assert profiler.counters['unchanged_files'] == len(synthetic_library) - 1
+    assert profiler.counters['file_writes'] == 1
+    assert profiler.counters['flac_opens'] == 1
+    # The new genre fits in the padding left by the first update
+    assert profiler.counters['inplace_saves'] == 1 and profiler.counters['full_rewrites'] == 0
+
+@pytest.mark.parametrize('worker_type', ['process', 'thread'])
+def test_update_tags_parallel(synthetic_library, worker_type, capsys):
+    tags_df = make_tags_df(synthetic_library)
+    # A missing file fails on its own, without failing the rest of its album
+    tags_df.loc[synthetic_library[0].path + '.missing'] = tags_df.iloc[0]
+    profiler = Profiler()
+    successful_df, failed_df = update_tags(tags_df, profiler=profiler, workers=3, worker_type=worker_type)
+    assert list(successful_df.index) == [track.path for track in synthetic_library]
+    assert list(failed_df.index) == [synthetic_library[0].path + '.missing']
+    assert "Successfully processed: {} files".format(len(synthetic_library)) in capsys.readouterr().out
+    for file_path, row in successful_df.iterrows():
+        new_file_path = get_new_file_path(file_path, row, build_title(row))
+        assert is_file_unchanged(new_file_path, get_target_tags(row), new_file_path)
+    # The counts of the workers are added to the profiler
+    assert profiler.counters['tracks'] == len(tags_df)
+    assert profiler.counters['renames'] == len(synthetic_library)
+
+def test_iter_update_tags_parallel_album_order(synthetic_library, mocker):
+    # The rows of an album which comes up twice are not written by two workers at once
+    rows = [(track.path, {**ROW, 'TrackNumber': str(number)}) for number, track in enumerate(synthetic_library, 1)]
+    rows = rows[1:] + rows[:1]
+    data_mgr = mocker.MagicMock()
+    results = list(iter_update_tags(rows, data_mgr, workers=2, worker_type='thread'))
+    assert [file_path for file_path, row, updated, error in results] == [file_path for file_path, row in rows]
+    assert all(updated and error is None for file_path, row, updated, error in results)
+    # The updated tags are archived by the parent
+    assert data_mgr.save_updated_tags.call_count == len(rows)
+
+def test_update_file_tags_data_manager(synthetic_library, mocker):
+    file_path = synthetic_library[0].path
+    data_mgr = mocker.MagicMock()
+    profiler = Profiler()
+    [(_, _, updated, error)] = iter_update_tags([(file_path, ROW)], data_mgr, profiler, verify=True)
+    assert updated and error is None
+    # The archived tags are those which were written, without opening the file again
+    new_file_path = get_new_file_path(file_path, ROW, TITLE)
+    data_mgr.save_updated_tags.assert_called_once_with(file_path, dict(mutagen.flac.FLAC(new_file_path).tags))
+    assert profiler.counters['flac_opens'] == 1
+    assert profiler.calls['verify'] == 1
@@ -15,27 +15,33 @@
 import csv
 import os
 import argparse
+import sys
 from tqdm import tqdm
 
+## Temporary fix while developing. Will be removed when the project is made into a package.
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.scan import group_by_directory, scan_files
+
 ################################################################################
 ### Define functions
 ################################################################################
 
-def get_files_to_process(directory):
+def get_files_to_process(directory, entries=None):
     print('Scanning directory for files to process...')
     files_to_rename = []
     files_to_delete = []
     valid_extensions = {'.flac', '.log', '.cue', '.pdf'}
     valid_files = {'README.txt', 'Setlist Info.txt'}
-    for root, _, files in os.walk(directory):
-        for file in files:
-            file_path = os.path.join(root, file)
-            ext = os.path.splitext(file)[1]
-            if (ext.lower() in valid_extensions) or (file in valid_files):
-                if ext != ext.lower():
-                    files_to_rename.append(file_path)
-            else:
-                files_to_delete.append(file_path)
+    if entries is None:
+        entries = scan_files(directory)
+    for entry in entries:
+        if (entry.ext in valid_extensions) or (entry.name in valid_files):
+            # The scanner lowercases extensions, so compare with the extension in the file name
+            if os.path.splitext(entry.name)[1] != entry.ext:
+                files_to_rename.append(entry.path)
+        else:
+            files_to_delete.append(entry.path)
     return files_to_rename, files_to_delete
 
 def rename_files(files):
@@ -88,14 +94,16 @@ def generate_report(files_to_rename, files_to_delete, busy_files_rename, busy_fi
         for file in busy_files_delete:
             busy_file.write(f"{file}\n")
 
-def generate_missing_files_report(directory, output_dir):
+def generate_missing_files_report(directory, output_dir, entries=None):
     print('Generating missing files report...')
     report_data = []
-    for root, _, files in os.walk(directory):
-        has_flac = any(file.lower().endswith('.flac') for file in files)
-        if has_flac:
-            has_log = any(file.lower().endswith('.log') for file in files)
-            has_cue = any(file.lower().endswith('.cue') for file in files)
+    if entries is None:
+        entries = scan_files(directory, {'.flac', '.log', '.cue'})
+    for root, files in group_by_directory(entries).items():
+        extensions = {entry.ext for entry in files}
+        if '.flac' in extensions:
+            has_log = '.log' in extensions
+            has_cue = '.cue' in extensions
             if not has_log or not has_cue:
                 report_data.append([root, 'Yes' if has_log else 'No', 'Yes' if has_cue else 'No'])
 
@@ -118,7 +126,10 @@ def main():
         print(f"Error: The directory '{args.dir}' does not exist.")
         return
 
-    files_to_rename, files_to_delete = get_files_to_process(args.dir)
+    # Scan once. Renaming and deleting files does not change which folders have flac, log and cue files,
+    # so the same scan is used for the missing files report.
+    entries = scan_files(args.dir)
+    files_to_rename, files_to_delete = get_files_to_process(args.dir, entries)
 
     if args.dry_run:
         generate_report(files_to_rename, files_to_delete, [], [], args.dir)
@@ -129,7 +140,7 @@ def main():
         generate_report(files_to_rename, files_to_delete, busy_files_rename, busy_files_delete, args.dir)
         print(f"Operation complete. {len(files_to_rename)} files renamed, {len(files_to_delete)} files deleted, and {len(busy_files_rename) + len(busy_files_delete)} files could not be processed due to being busy.")
 
-    generate_missing_files_report(args.dir, args.dir)
+    generate_missing_files_report(args.dir, args.dir, entries)
     print("Missing files report generated.")
     
 if __name__ == "__main__":
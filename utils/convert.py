@@ -16,9 +16,15 @@ import argparse
 import csv
 import os
 import subprocess
+import sys
 from mutagen.flac import FLAC
 from tqdm import tqdm
 
+## Temporary fix while developing. Will be removed when the project is made into a package.
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.scan import scan_files
+
 ################################################################################
 ### Define functions
 ################################################################################
@@ -33,12 +39,7 @@ def get_flac_files(search_dir):
     Returns:
         list: List of FLAC file paths.
     """
-    flac_files = []
-    for dirpath, _, filenames in os.walk(search_dir):
-        for file in filenames:
-            if file.endswith('.flac'):
-                flac_files.append(os.path.join(dirpath, file))
-    return flac_files
+    return [entry.path for entry in scan_files(search_dir, {'.flac'})]
 
 def read_file_list(file_list_path):
     """
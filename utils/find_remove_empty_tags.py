@@ -14,11 +14,18 @@
 
 import argparse
 import os
+import sys
 import mutagen
 import mutagen.flac
 from tqdm import tqdm
 import csv
 
+## Temporary fix while developing. Will be removed when the project is made into a package.
+# Add the project root directory to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.flacmeta import DEFAULT_PADDING_RESERVE, read_vorbis_tags, save_flac
+from src.scan import scan_files
+
 ################################################################################
 ### Function definitions
 ################################################################################
@@ -26,21 +33,18 @@ import csv
 def find_files_with_empty_tags(search_dir):
     empty_tag_files = []
     corrupt_files = []
-    flac_files = []
 
     # First, obtain the list of all FLAC files
-    for root, _, files in os.walk(search_dir):
-        for file in files:
-            if file.endswith('.flac'):
-                flac_files.append(os.path.join(root, file))
+    flac_files = [entry.path for entry in scan_files(search_dir, {'.flac'})]
 
     print(f"Scanning {len(flac_files)} FLAC files...")
 
     # Iterate over the list of FLAC files with a single progress bar
     for file_path in tqdm(flac_files):
         try:
-            audio_file = mutagen.flac.FLAC(file_path)
-            if any(tag_value == [''] for tag_value in audio_file.tags.values()):
+            # Only the comment block is needed, so use the header-only reader
+            tags = read_vorbis_tags(file_path)
+            if any(tag_value == [''] for tag_value in tags.values()):
                 empty_tag_files.append(file_path)
         except mutagen.flac.error as e:
             print(f"Corrupt file: {file_path} - {e}")
@@ -64,9 +68,11 @@ def find_files_with_empty_tags(search_dir):
 
     return
 
-def remove_empty_tags(files):
+def remove_empty_tags(files, padding_reserve=DEFAULT_PADDING_RESERVE):
     successful_paths = []
     failed_paths = []
+    inplace_saves = 0
+    full_rewrites = 0
 
     print(f"Removing empty tags from {len(files)} files...")
 
@@ -75,12 +81,16 @@ def remove_empty_tags(files):
             audio_file = mutagen.flac.FLAC(file_path[0])
             # Extract the comment block
             tags_to_keep = {tag: value for tag, value in audio_file.tags.items() if value != ['']}
-            # Delete all tags
-            audio_file.delete()
-            # Write new comment block with non-empty tags
+            # Delete all tags, in memory, so that the file is only written once
+            audio_file.tags.clear()
+            # Write new comment block with non-empty tags. It is smaller than the old one,
+            # so it is written in place, and the space it frees becomes padding
             for tag, value in tags_to_keep.items():
                 audio_file[tag] = value
-            audio_file.save()
+            if save_flac(audio_file, padding_reserve):
+                inplace_saves += 1
+            else:
+                full_rewrites += 1
             successful_paths.append(file_path)
         except Exception as e:
             failed_paths.append(file_path)
@@ -88,6 +98,7 @@ def remove_empty_tags(files):
     print(f"Completed!")
     print(f"Successfully processed: {len(successful_paths)} files")
     print(f"Failed: {len(failed_paths)} files")
+    print(f"Saved in place: {inplace_saves} files, rewritten: {full_rewrites} files")
 
     with open('success.csv', 'w', newline='') as csvfile:
         writer = csv.writer(csvfile)
@@ -103,9 +114,11 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Find and remove empty tags from FLAC files")
     parser.add_argument('dir', help="Directory to search for FLAC files")
     parser.add_argument('--dry-run', action='store_true', help="Generate a report without making changes")
+    parser.add_argument('--padding-reserve', type=int, default=DEFAULT_PADDING_RESERVE,
+                        help="Bytes of padding to leave when a file has to be rewritten (default: 8192)")
     args = parser.parse_args()
 
     empty_tag_files = find_files_with_empty_tags(args.dir)
 
     if not args.dry_run:
-        remove_empty_tags(empty_tag_files)
\ No newline at end of file
+        remove_empty_tags(empty_tag_files, args.padding_reserve)
\ No newline at end of file
@@ -35,6 +35,7 @@ from tqdm import tqdm
 ## Temporary fix while developing. Will be removed when the project is made into a package.
 # Add the project root directory to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.scan import scan_files
 from src.utils import setup_logging
 
 ################################################################################
@@ -55,15 +56,11 @@ def collect_files(directory, valid_extensions):
     image_files = []
     pdf_files = []
 
-    for root, _, files in os.walk(directory):
-        for file in sorted(files):
-            ext = os.path.splitext(file)[1].lower()
-            if ext in valid_extensions:
-                file_path = os.path.join(root, file)
-                if ext == '.pdf':
-                    pdf_files.append(file_path)
-                else:
-                    image_files.append(file_path)
+    for entry in scan_files(directory, valid_extensions):
+        if entry.ext == '.pdf':
+            pdf_files.append(entry.path)
+        else:
+            image_files.append(entry.path)
 
     return image_files, pdf_files
 
@@ -288,21 +285,21 @@ def cleanup_directory(subdirectory_path, dry_run, writer, logger):
     # Define the set of file extensions to keep
     files_to_keep = {".pdf", ".log", ".cue", ".flac", ".ape", ".wv", ".wav"}
 
-    # Remove miscellaneous files
-    for root, _, files in os.walk(subdirectory_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            if not any(file.lower().endswith(ext) for ext in files_to_keep):
-                if dry_run:
-                    logger.info(f"Dry run: Would delete {file_path}")
+    # Remove miscellaneous files. Compare the end of the name, not entry.ext, so that files
+    # named only by their extension, e.g., '.cue', are kept too
+    for entry in scan_files(subdirectory_path):
+        file_path = entry.path
+        if not entry.name.lower().endswith(tuple(files_to_keep)):
+            if dry_run:
+                logger.info(f"Dry run: Would delete {file_path}")
+                writer.writerow([file_path])
+            else:
+                try:
+                    os.remove(file_path)
+                    logger.info(f"Deleted: {file_path}")
                     writer.writerow([file_path])
-                else:
-                    try:
-                        os.remove(file_path)
-                        logger.info(f"Deleted: {file_path}")
-                        writer.writerow([file_path])
-                    except Exception as e:
-                        logger.error(f"Error deleting file {file_path}: {e}")
+                except Exception as e:
+                    logger.error(f"Error deleting file {file_path}: {e}")
 
     # Remove empty directories
     for root, dirs, _ in os.walk(subdirectory_path, topdown=False):  # Process subdirectories first